@@ -0,0 +1,257 @@
+"""End-of-day Parquet archive for snapshot_data.db (and the final market_data state).
+
+    python archive.py                       # archive every completed day not archived yet
+    python archive.py --date 2025-07-11     # (re)archive one day, even the current one
+    python archive.py --prune               # also delete archived days from snapshot_data.db
+    python archive.py --market-data         # also save market_data as of its newest row
+
+Files are date-partitioned and zstd-compressed:
+
+    archive/oi_snapshot/date=YYYY-MM-DD/part-0.parquet
+    archive/market_data/date=YYYY-MM-DD/part-0.parquet
+
+oi_snapshot rows are denormalized (instrument fields inlined) and sorted by
+(root, expiry, snapshot_time), so each row group covers few chains and its min/max
+statistics let a symbol/expiry filter skip the rest. Readers memory-map the file.
+"""
+import argparse
+import os
+import sqlite3
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from db_schema import SCHEMA_VERSION, ensure_snapshot_schema, schema_version, session_date
+from snapshot_queries import day_bounds_for, snapshot_days
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = os.path.join(current_dir, "archive")
+snapshot_db_name = os.path.join(current_dir, "snapshot_data.db")
+market_db_name = os.path.join(current_dir, "market_data.db")
+
+COMPRESSION = "zstd"
+# Small row groups keep symbol/expiry pruning fine-grained
+ROW_GROUP_SIZE = 8192
+
+OI_SCHEMA = pa.schema([
+    ("snapshot_time", pa.int64()),   # epoch ms, see db_schema.py
+    ("trading_symbol", pa.string()),
+    ("root", pa.string()),
+    ("expiry", pa.string()),
+    ("strike", pa.int64()),
+    ("opt_type", pa.string()),
+    ("oi", pa.int64()),
+    ("oi_day_high", pa.int64()),
+    ("keyframe", pa.bool_()),        # see db_schema.py; older files lack it (all keyframes)
+])
+OI_SORT = [("root", "ascending"), ("expiry", "ascending"), ("snapshot_time", "ascending")]
+
+
+def archive_path(kind, day, archive_dir=ARCHIVE_DIR):
+    return os.path.join(archive_dir, kind, f"date={day.isoformat()}", "part-0.parquet")
+
+def archived_days(kind="oi_snapshot", archive_dir=ARCHIVE_DIR):
+    """Dates with an archive file, oldest first."""
+    root = os.path.join(archive_dir, kind)
+    if not os.path.isdir(root):
+        return []
+    days = []
+    for name in os.listdir(root):
+        if name.startswith("date=") and os.path.exists(os.path.join(root, name, "part-0.parquet")):
+            days.append(date.fromisoformat(name[len("date="):]))
+    return sorted(days)
+
+def archive_version(day, kind="oi_snapshot", archive_dir=ARCHIVE_DIR):
+    """Changes when the day is re-archived; use it as a cache key."""
+    st = os.stat(archive_path(kind, day, archive_dir))
+    return st.st_ino, st.st_mtime_ns
+
+def _write(table, path, sorting=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if sorting:
+        table = table.sort_by(sorting)
+    # Write next to the target and swap it in, so readers never see a partial file
+    tmp_path = path + ".tmp"
+    pq.write_table(table, tmp_path, compression=COMPRESSION, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp_path, path)
+    return table.num_rows
+
+def archive_snapshot_day(conn, day, archive_dir=ARCHIVE_DIR):
+    """Write one day of snapshot rows to Parquet. Returns the row count."""
+    cursor = conn.execute("""
+        SELECT s.snapshot_time, i.trading_symbol, i.root, i.expiry, i.strike, i.opt_type,
+               o.oi, o.oi_day_high, s.keyframe
+        FROM snapshots s
+        JOIN snapshot_oi o ON o.snapshot_id = s.snapshot_id
+        JOIN instruments i ON i.symbol_id = o.symbol_id
+        WHERE s.snapshot_time >= ? AND s.snapshot_time < ?
+    """, day_bounds_for(day))
+    columns = list(zip(*cursor.fetchall())) or [[] for _ in OI_SCHEMA]
+    # SQLite hands back the keyframe flag as 0/1, which pyarrow will not take as booleans
+    table = pa.Table.from_arrays(
+        [pa.array(c).cast(f.type) if f.type == pa.bool_() else pa.array(c, type=f.type)
+         for c, f in zip(columns, OI_SCHEMA)],
+        schema=OI_SCHEMA,
+    )
+    if not table.num_rows:
+        return 0
+    return _write(table, archive_path("oi_snapshot", day, archive_dir), OI_SORT)
+
+def archive_market_data(path=market_db_name, archive_dir=ARCHIVE_DIR, table_name="market_data"):
+    """Save market_data (or a rolled-over copy of it) as it stands, filed under its newest row's trading day.
+
+    Returns (day, rows), or (None, 0) when there is nothing to save.
+    """
+    if not os.path.exists(path):
+        return None, 0
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        if schema_version(conn) < SCHEMA_VERSION:
+            return None, 0
+        cursor = conn.execute(f"SELECT * FROM {table_name} ORDER BY token")
+        names = [d[0] for d in cursor.description]
+        rows = cursor.fetchall()
+    except sqlite3.OperationalError:
+        # No market_data table yet
+        return None, 0
+    finally:
+        conn.close()
+    if not rows:
+        return None, 0
+
+    table = pa.Table.from_pydict(dict(zip(names, map(list, zip(*rows)))))
+    newest = pc.max(table["timestamp"]).as_py()
+    day = session_date(newest)
+    return day, _write(table, archive_path("market_data", day, archive_dir))
+
+def prune_snapshot_day(conn, day):
+    """Delete one day's snapshots from the live database (call inside a transaction)."""
+    bounds = day_bounds_for(day)
+    conn.execute("""
+        DELETE FROM snapshot_oi WHERE snapshot_id IN (
+            SELECT snapshot_id FROM snapshots WHERE snapshot_time >= ? AND snapshot_time < ?
+        )
+    """, bounds)
+    conn.execute("""
+        DELETE FROM chain_strike_change WHERE snapshot_id IN (
+            SELECT snapshot_id FROM snapshots WHERE snapshot_time >= ? AND snapshot_time < ?
+        )
+    """, bounds)
+    conn.execute("""
+        DELETE FROM chain_stats WHERE snapshot_id IN (
+            SELECT snapshot_id FROM snapshots WHERE snapshot_time >= ? AND snapshot_time < ?
+        )
+    """, bounds)
+    conn.execute("DELETE FROM snapshots WHERE snapshot_time >= ? AND snapshot_time < ?", bounds)
+
+def archive_days(days, path=snapshot_db_name, archive_dir=ARCHIVE_DIR, prune=False):
+    """Archive the given days from a snapshot database, optionally pruning them after."""
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        # Keyframe flags and analytics tables are read/pruned below
+        conn.execute("BEGIN")
+        ensure_snapshot_schema(conn)
+        conn.execute("COMMIT")
+
+        archived = []
+        for day in days:
+            rows = archive_snapshot_day(conn, day, archive_dir)
+            print(f"📦 {day}: {rows} snapshot rows → {archive_path('oi_snapshot', day, archive_dir)}")
+            if rows:
+                archived.append(day)
+
+        if prune and archived:
+            conn.execute("BEGIN")
+            for day in archived:
+                prune_snapshot_day(conn, day)
+            conn.execute("COMMIT")
+            conn.execute("VACUUM")
+            print(f"🧹 Pruned {len(archived)} day(s) from {path}")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return archived
+
+def completed_days(path=snapshot_db_name, archive_dir=ARCHIVE_DIR):
+    """Days in the live database before the newest one that have no archive yet."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        days = snapshot_days(conn)
+    finally:
+        conn.close()
+    done = set(archived_days(archive_dir=archive_dir))
+    return [day for day in days[:-1] if day not in done]
+
+
+# ---- readers (dashboard) ----
+
+def _read(day, columns, filters=None, archive_dir=ARCHIVE_DIR):
+    return pq.read_table(
+        archive_path("oi_snapshot", day, archive_dir),
+        columns=columns, filters=filters, memory_map=True,
+    )
+
+def load_archived_catalog(day, archive_dir=ARCHIVE_DIR):
+    """Distinct (symbol, expiry) option chains in an archived day."""
+    table = _read(day, ["root", "expiry", "strike"], archive_dir=archive_dir)
+    df = table.filter(pc.is_valid(table["strike"])).select(["root", "expiry"]).to_pandas()
+    return df.dropna().drop_duplicates().rename(columns={"root": "symbol"}).reset_index(drop=True)
+
+def load_archived_chain(day, symbol, expiry, archive_dir=ARCHIVE_DIR):
+    """Same rows as snapshot_queries.load_chain_slice for one archived day."""
+    columns = ["snapshot_time", "trading_symbol", "strike", "opt_type", "oi"]
+    if "keyframe" in pq.read_schema(archive_path("oi_snapshot", day, archive_dir)).names:
+        columns.append("keyframe")
+    table = _read(
+        day,
+        columns,
+        [("root", "=", symbol), ("expiry", "=", expiry)],
+        archive_dir,
+    )
+    table = table.filter(pc.and_(pc.is_valid(table["strike"]), pc.is_valid(table["oi"])))
+    return table.to_pandas().rename(columns={"opt_type": "type"})
+
+def load_archived_chains(day, archive_dir=ARCHIVE_DIR):
+    """Same rows as snapshot_queries.load_chains_slice for one archived day."""
+    columns = ["snapshot_time", "trading_symbol", "root", "expiry", "strike", "opt_type", "oi"]
+    if "keyframe" in pq.read_schema(archive_path("oi_snapshot", day, archive_dir)).names:
+        columns.append("keyframe")
+    table = _read(day, columns, archive_dir=archive_dir)
+    valid = pc.and_(
+        pc.and_(pc.is_valid(table["root"]), pc.is_valid(table["expiry"])),
+        pc.and_(pc.is_valid(table["strike"]), pc.is_valid(table["oi"])),
+    )
+    table = table.filter(valid).sort_by([("snapshot_time", "ascending")])
+    return table.to_pandas().rename(columns={"opt_type": "type"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive snapshot days to date-partitioned Parquet.")
+    parser.add_argument("--snapshot-db", default=snapshot_db_name)
+    parser.add_argument("--market-db", default=market_db_name)
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--date", type=date.fromisoformat, action="append",
+                        help="day to archive (YYYY-MM-DD); repeatable. Default: every completed day")
+    parser.add_argument("--prune", action="store_true", help="delete archived days from the snapshot database")
+    parser.add_argument("--market-data", action="store_true", help="also archive the current market_data state")
+    args = parser.parse_args()
+
+    days = args.date or completed_days(args.snapshot_db, args.archive_dir)
+    if not days:
+        print("✅ Nothing to archive.")
+    else:
+        archive_days(days, args.snapshot_db, args.archive_dir, prune=args.prune)
+
+    if args.market_data:
+        day, rows = archive_market_data(args.market_db, args.archive_dir)
+        if day is not None:
+            print(f"📦 market_data {day}: {rows} rows → {archive_path('market_data', day, args.archive_dir)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Chart payload/serialization benchmark: six fixed traces vs the original per-strike go.Bar loop.
+
+Run from the repo root:  python -m benchmarks.bench_chart
+"""
+import random
+import time
+
+import plotly.graph_objects as go
+
+from chart_builder import build_oi_chart
+
+
+# Process data according to your exact conditions
+def process_oi_data(comparison_data):
+    """Process data according to exact conditions specified"""
+    chart_data = []
+    
+    for (strike, opt_type), (t1_oi, t2_oi) in comparison_data.items():
+        chart_data.append({
+            'strike': strike,
+            'type': opt_type,
+            't1_oi': t1_oi,
+            't2_oi': t2_oi,
+            'condition': 'decrease' if t1_oi >= t2_oi else 'increase'
+        })
+    
+    return sorted(chart_data, key=lambda x: x['strike'])
+
+
+# Reproduction of the original chart loop from main.py
+def legacy_chart(comparison):
+    chart_data = process_oi_data(comparison)
+
+    # Create Chart with exact conditions
+    fig = go.Figure()
+
+    # Color mapping
+    colors = {'CE': '#22c55e', 'PE': '#ef4444'}  # Green for CE, Red for PE
+
+    # Track legend items to avoid duplicates
+    legend_added = {
+        'call_filled': False,
+        'put_filled': False,
+        'call_striped': False,
+        'put_striped': False,
+        'call_hollow': False,
+        'put_hollow': False
+    }
+
+    for item in chart_data:
+        strike = item['strike']
+        opt_type = item['type']
+        t1_oi = item['t1_oi']
+        t2_oi = item['t2_oi']
+        color = colors[opt_type]
+
+        # Position for CE/PE side by side
+        x_pos = f"{strike}_{opt_type}"
+
+        # CONDITION 1: t1_oi >= t2_oi (OI Decrease)
+        if t1_oi >= t2_oi and t1_oi != 0 and t2_oi != 0:
+            # 1. Generate empty bar of t1_oi size (hollow with colored border)
+            fig.add_trace(go.Bar(
+                x=[x_pos],
+                y=[t1_oi],
+                name=f"{'Call' if opt_type == 'CE' else 'Put'} Decrease",
+                marker=dict(
+                    color='rgba(0,0,0,0)',  # Transparent fill
+                    line=dict(color=color, width=2)  # Colored border
+                ),
+                showlegend=not legend_added[f"{'call' if opt_type == 'CE' else 'put'}_hollow"],
+                hovertemplate=f"<b>{strike} {opt_type}</b><br>" +
+                             f"T1: {t1_oi}<br>" +
+                             f"T2: {t2_oi}<br>" +
+                             f"Decrease: -{t1_oi - t2_oi}<br>" +
+                             "<extra></extra>"
+            ))
+            legend_added[f"{'call' if opt_type == 'CE' else 'put'}_hollow"] = True
+
+            # 2. Fill the empty bar till t2_oi with striped pattern
+            if t2_oi > 0:
+                fig.add_trace(go.Bar(
+                x=[x_pos],
+                y=[t2_oi],
+                name=f"{'Call' if opt_type == 'CE' else 'Put'} OI",
+                marker_color=color,
+                showlegend=not legend_added[f"{'call' if opt_type == 'CE' else 'put'}_filled"],
+                hovertemplate=f"<b>{strike} {opt_type}</b><br>" +
+                             f"T1: {t1_oi}<br>" +
+                             f"T2: {t2_oi}<br>" +
+                             f"Base OI: {t2_oi}<br>" +
+                             "<extra></extra>"
+            ))
+            legend_added[f"{'call' if opt_type == 'CE' else 'put'}_filled"] = True
+
+        # CONDITION 2: t1_oi < t2_oi (OI Increase)
+        else:
+            # 1. Generate completely filled bar of t2_oi size
+            fig.add_trace(go.Bar(
+                x=[x_pos],
+                y=[t1_oi],
+                name=f"{'Call' if opt_type == 'CE' else 'Put'} OI",
+                marker_color=color,
+                showlegend=not legend_added[f"{'call' if opt_type == 'CE' else 'put'}_filled"],
+                hovertemplate=f"<b>{strike} {opt_type}</b><br>" +
+                             f"T1: {t1_oi}<br>" +
+                             f"T2: {t2_oi}<br>" +
+                             f"Base OI: {t2_oi}<br>" +
+                             "<extra></extra>"
+            ))
+            legend_added[f"{'call' if opt_type == 'CE' else 'put'}_filled"] = True
+
+            # 2. Add the difference (t2_oi - t1_oi) on top with striped pattern
+            diff = t2_oi - t1_oi
+            if diff > 0:
+                fig.add_trace(go.Bar(
+                    x=[x_pos],
+                    y=[diff],
+                    base=[t1_oi],  # Stack on top of the filled bar
+                    name=f"{'Call' if opt_type == 'CE' else 'Put'} Increase",
+                    marker=dict(
+                        color=color,
+                        pattern=dict(
+                            shape="/",  # Diagonal stripes
+                            bgcolor="rgba(255,255,255,0.3)",
+                            fgcolor=color,
+                            size=6
+                        )
+                    ),
+                    showlegend=not legend_added[f"{'call' if opt_type == 'CE' else 'put'}_striped"],
+                    hovertemplate=f"<b>{strike} {opt_type}</b><br>" +
+                                 f"Increase: +{diff}<br>" +
+                                 f"T1: {t1_oi} → T2: {t2_oi}<br>" +
+                                 "<extra></extra>"
+                ))
+                legend_added[f"{'call' if opt_type == 'CE' else 'put'}_striped"] = True
+    return fig
+
+
+def make_chain(n_strikes, seed=3):
+    rng = random.Random(seed)
+    comparison = {}
+    for k in range(n_strikes):
+        strike = 70000 + 100 * k
+        for opt_type in ('CE', 'PE'):
+            t1 = rng.choice([0, rng.randint(1, 50000)])
+            t2 = max(0, t1 + rng.randint(-20000, 20000))
+            comparison[(strike, opt_type)] = (t1, t2)
+    return comparison
+
+
+def bench(build, repeat=5):
+    best_build = best_json = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fig = build()
+        built = time.perf_counter()
+        payload = fig.to_json()
+        done = time.perf_counter()
+        best_build = min(best_build, built - start)
+        best_json = min(best_json, done - built)
+    return len(fig.data), len(payload), best_build, best_json
+
+
+def main():
+    print(f"{'strikes':>7} {'builder':<8} {'traces':>6} {'payload KiB':>11} {'build ms':>9} {'to_json ms':>10}")
+    for n_strikes in (50, 200, 600):
+        comparison = make_chain(n_strikes)
+        keys = list(comparison)
+        arrays = (
+            [k[0] for k in keys], [k[1] for k in keys],
+            [comparison[k][0] for k in keys], [comparison[k][1] for k in keys],
+        )
+        for name, build in (("legacy", lambda: legacy_chart(comparison)),
+                            ("fixed", lambda: build_oi_chart(*arrays))):
+            traces, size, build_s, json_s = bench(build)
+            print(f"{n_strikes:>7} {name:<8} {traces:>6} {size / 1024:>11.1f} {build_s * 1000:>9.1f} {json_s * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Micro-benchmark: ticks/sec of each TickDecoder backend vs the original inline parser.
+
+Run from the repo root:  python -m benchmarks.bench_decoder
+"""
+import json
+import random
+import time
+from datetime import datetime
+
+from db_schema import to_epoch_ms
+from tick_decoder import BACKENDS, TickDecoder
+
+
+def make_lines(n, seed=7):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n):
+        strike = 80000 + 100 * (i % 120)
+        opt_type = "CE" if i % 2 else "PE"
+        price = round(rng.uniform(1, 900), 2)
+        lines.append(json.dumps({
+            "exchange_token": 800000 + i,
+            "instrument_token": 200000000 + i,
+            "trading_symbol": f"SENSEX25805{strike}{opt_type}",
+            "last_price": price,
+            "last_trade_time": "2025-08-05 10:15:02",
+            "exchange_timestamp": "2025-08-05 10:15:03",
+            "volume": rng.randint(0, 10**7),
+            "oi": rng.randint(0, 10**6),
+            "oi_day_high": rng.randint(0, 10**6),
+            "oi_day_low": rng.randint(0, 10**6),
+            "bid_depth": [{"price": price - 0.05 * k, "quantity": rng.randint(1, 500), "orders": 1} for k in range(5)],
+            "ask_depth": [{"price": price + 0.05 * k, "quantity": rng.randint(1, 500), "orders": 1} for k in range(5)],
+        }))
+    return lines
+
+
+# Reproduction of the original per-line loop from insert2.py (minus print)
+def to_float_or_none(value):
+    try:
+        return float(value) if value is not None else None
+    except:
+        return None
+
+def to_int_or_none(value):
+    try:
+        return int(value) if value is not None else None
+    except:
+        return None
+
+def legacy_decode(tick):
+    parsed_batch = []
+    for line in tick:
+        try:
+            data = json.loads(line)
+            parsed_batch.append((
+                data.get("last_trade_time") or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                data.get("exchange_timestamp") or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                int(data["exchange_token"]),
+                int(data["instrument_token"]),
+                data.get("trading_symbol"),
+                to_float_or_none(data.get("last_price")),
+                to_float_or_none(data.get("bid_depth", [{}])[0].get("price")),
+                to_int_or_none(data.get("bid_depth", [{}])[0].get("quantity")),
+                to_float_or_none(data.get("ask_depth", [{}])[0].get("price")),
+                to_int_or_none(data.get("ask_depth", [{}])[0].get("quantity")),
+                to_float_or_none(data.get("volume")),
+                to_int_or_none(data.get("oi")),
+                to_int_or_none(data.get("oi_day_high")),
+                to_int_or_none(data.get("oi_day_low"))
+            ))
+        except Exception as e:
+            pass
+    return parsed_batch
+
+
+def bench(fn, messages, repeat=5):
+    total = sum(len(m) for m in messages)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for msg in messages:
+            fn(msg)
+        best = min(best, time.perf_counter() - start)
+    return total / best
+
+
+def main(n_messages=500, lines_per_message=40):
+    lines = make_lines(n_messages * lines_per_message)
+    messages = [lines[i:i + lines_per_message] for i in range(0, len(lines), lines_per_message)]
+
+    # Sanity check: every backend must produce the same rows as the original code
+    # (apart from timestamps, which are now epoch ms)
+    expected = [(to_epoch_ms(r[0]), to_epoch_ms(r[1])) + r[2:] for r in legacy_decode(messages[0])]
+    results = [("legacy (json, per-line)", bench(legacy_decode, messages))]
+    for backend in BACKENDS:
+        decoder = TickDecoder(backend)
+        assert decoder.decode(messages[0])[0] == expected, backend
+        results.append((f"TickDecoder[{backend}]", bench(decoder.decode, messages)))
+
+    baseline = results[0][1]
+    print(f"{len(lines)} ticks in {len(messages)} messages")
+    for name, rate in results:
+        print(f"{name:<26} {rate:>12,.0f} ticks/sec  {rate / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""End-to-end benchmarks on synthetic data, written to a JSON file for comparing versions.
+
+Run from the repo root:
+    python -m benchmarks.bench_e2e                          # everything, results to bench_results.json
+    python -m benchmarks.bench_e2e --only dashboard --out after.json --compare before.json
+
+  ingest     ticks/sec through extract_ltp_from_stream_to_db and its commit latency,
+             fed by a local publisher (TCP_pipe mode="pub")
+  snapshot   fetch_and_snapshot duration vs the number of instruments in market_data
+  dashboard  the dashboard's per-chain compute vs the size of the snapshot tables
+
+Everything runs against temporary databases; the files next to the scripts are untouched.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks.tick_generator import TickGenerator, make_instruments
+
+RESULTS_FORMAT = 1
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+def _quiet():
+    # The scripts under test print per call; keep the benchmark output readable
+    return contextlib.redirect_stdout(io.StringIO())
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---- ingest ----
+
+def bench_ingest(tmp, total_ticks=200000, lines_per_message=40, strikes_per_side=40, port=48011):
+    # insert2 reads its paths from the environment at import time
+    os.environ["INGEST_DB_PATH"] = os.path.join(tmp, "ingest.db")
+    os.environ["TICK_FEED_ADDRESS"] = f"tcp://127.0.0.1:{port}"
+    os.environ["INGEST_METRICS_PORT"] = "0"
+    with _quiet():
+        import insert2
+    import ingest_metrics as metrics
+    from tcp_pipe import TCP_pipe
+
+    commit_seconds = []
+    upsert = insert2.upsert_data_batch
+
+    def timed_upsert(conn, rows, *args):
+        start = time.perf_counter()
+        upsert(conn, rows, *args)
+        commit_seconds.append(time.perf_counter() - start)
+
+    insert2.upsert_data_batch = timed_upsert
+    generator = TickGenerator(make_instruments(strikes_per_side=strikes_per_side))
+    # Rendered up front so the publisher is not the bottleneck
+    messages = [
+        generator.message(min(lines_per_message, total_ticks - i)) for i in range(0, total_ticks, lines_per_message)
+    ]
+    pipe = TCP_pipe(f"tcp://*:{port}", mode="pub")
+    stop = threading.Event()
+    writer = threading.Thread(target=insert2.extract_ltp_from_stream_to_db, args=(stop,), daemon=True)
+    try:
+        with _quiet():
+            writer.start()
+            time.sleep(1.0)  # let the subscriber connect
+            lines_before = metrics.lines_total.value
+            start = time.perf_counter()
+            for message in messages:
+                pipe.send(message)
+            sent = time.perf_counter() - start
+
+            # Wait until the writer has decoded everything it is going to get
+            received, last_change = 0, time.perf_counter()
+            while received < total_ticks and time.perf_counter() - last_change < 2.0:
+                time.sleep(0.01)
+                now = metrics.lines_total.value - lines_before
+                if now != received:
+                    received, last_change = now, time.perf_counter()
+            elapsed = last_change - start
+            time.sleep(insert2.FLUSH_INTERVAL * 2)  # last flush
+            stop.set()
+            writer.join(timeout=10)
+    finally:
+        insert2.upsert_data_batch = upsert
+        pipe.close()
+
+    return {
+        "instruments": len(generator.instruments),
+        "lines_per_message": lines_per_message,
+        "ticks_sent": total_ticks,
+        "ticks_received": received,
+        "publish_ticks_per_sec": total_ticks / sent,
+        "ingest_ticks_per_sec": received / elapsed if elapsed > 0 else None,
+        "flushes": len(commit_seconds),
+        "commit_ms_p50": percentile(commit_seconds, 50) * 1000 if commit_seconds else None,
+        "commit_ms_p99": percentile(commit_seconds, 99) * 1000 if commit_seconds else None,
+        "commit_ms_max": max(commit_seconds) * 1000 if commit_seconds else None,
+    }
+
+
+# ---- snapshot ----
+
+def _market_rows(generator, now):
+    from tick_decoder import TickDecoder
+    return TickDecoder().decode(generator.lines(len(generator.instruments), now))[0]
+
+def bench_snapshot(tmp, sizes=(5, 20, 80), slots=5):
+    import new_db
+    from db_schema import ensure_market_schema
+
+    results = []
+    for strikes_per_side in sizes:
+        src = os.path.join(tmp, f"snap_src_{strikes_per_side}.db")
+        dst = os.path.join(tmp, f"snap_dst_{strikes_per_side}.db")
+        conn = sqlite3.connect(src, isolation_level=None)
+        ensure_market_schema(conn)
+        generator = TickGenerator(make_instruments(strikes_per_side=strikes_per_side))
+
+        slot = datetime(2025, 8, 5, 9, 15)
+        durations, inserted = [], 0
+        for _ in range(slots):
+            rows = _market_rows(generator, slot + timedelta(seconds=30))
+            conn.executemany(
+                "INSERT OR REPLACE INTO market_data VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            start = time.perf_counter()
+            with _quiet():
+                inserted = new_db.fetch_and_snapshot(slot, src, dst)
+            durations.append(time.perf_counter() - start)
+            slot += new_db.SNAPSHOT_INTERVAL
+        conn.close()
+
+        results.append({
+            "instruments": len(generator.instruments),
+            "rows_per_snapshot": inserted,
+            # The first slot also registers every instrument
+            "first_ms": durations[0] * 1000,
+            "median_ms": statistics.median(durations[1:]) * 1000,
+            "max_ms": max(durations[1:]) * 1000,
+        })
+    return results
+
+
+# ---- dashboard ----
+
+def _build_snapshot_db(path, instruments, n_snapshots, generator):
+    from db_schema import ensure_snapshot_schema, register_instruments, to_epoch_ms
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("BEGIN")
+    ensure_snapshot_schema(conn)
+    register_instruments(conn, [symbol for _, symbol in instruments])
+    symbol_ids = dict(conn.execute("SELECT trading_symbol, symbol_id FROM instruments"))
+    ids = [symbol_ids[symbol] for _, symbol in instruments]
+
+    # 125 three-minute snapshots per trading day, spread over as many days as needed
+    for k in range(n_snapshots):
+        day, slot = divmod(k, 125)
+        when = datetime(2025, 8, 5, 9, 15) + timedelta(days=day, minutes=3 * slot)
+        snapshot_id = conn.execute(
+            "INSERT INTO snapshots (snapshot_time) VALUES (?)", (to_epoch_ms(when.isoformat(" ")),)
+        ).lastrowid
+        for i in range(len(generator.oi)):
+            generator.oi[i] = max(0, generator.oi[i] + generator.rng.randint(-500, 600))
+        conn.executemany(
+            "INSERT INTO snapshot_oi (snapshot_id, symbol_id, oi, oi_day_high) VALUES (?, ?, ?, ?)",
+            [(snapshot_id, sid, oi, oi) for sid, oi in zip(ids, generator.oi)],
+        )
+    conn.execute("COMMIT")
+    conn.close()
+
+def bench_dashboard(tmp, snapshot_counts=(25, 125, 500), strikes_per_side=40, repeat=5):
+    from chart_builder import build_oi_chart
+    from oi_matrix import ChainMatrix
+    from snapshot_queries import connect_readonly, data_version, latest_day_bounds, load_catalog, load_chain_slice
+
+    instruments = make_instruments(strikes_per_side=strikes_per_side)
+    results = []
+    for n_snapshots in snapshot_counts:
+        path = os.path.join(tmp, f"dash_{n_snapshots}.db")
+        _build_snapshot_db(path, instruments, n_snapshots, TickGenerator(instruments))
+
+        stages = {"catalog": [], "chain": [], "compare_chart": []}
+        for _ in range(repeat):
+            conn = connect_readonly(path)
+            t0 = time.perf_counter()
+            data_version(conn, path)
+            day_bounds = latest_day_bounds(conn)
+            catalog = load_catalog(conn, day_bounds)
+            t1 = time.perf_counter()
+            symbol, expiry = catalog.iloc[0]
+            matrix = ChainMatrix.from_frame(load_chain_slice(conn, symbol, expiry, *day_bounds))
+            t2 = time.perf_counter()
+            i1 = matrix.nearest_index(matrix.times[0], find_min=True)
+            i2 = matrix.nearest_index(matrix.times[-1], find_min=False)
+            build_oi_chart(*matrix.compare(i1, i2)).to_json()
+            t3 = time.perf_counter()
+            conn.close()
+            stages["catalog"].append(t1 - t0)
+            stages["chain"].append(t2 - t1)
+            stages["compare_chart"].append(t3 - t2)
+
+        result = {
+            "snapshots": n_snapshots,
+            "table_rows": n_snapshots * len(instruments),
+            "chain_instruments": len(matrix.symbols),
+        }
+        for stage, values in stages.items():
+            result[f"{stage}_ms"] = statistics.median(values) * 1000
+        result["total_ms"] = sum(result[f"{stage}_ms"] for stage in stages)
+        results.append(result)
+    return results
+
+
+# ---- reporting ----
+
+def _print_rows(title, rows):
+    print(f"\n{title}")
+    if isinstance(rows, dict):
+        rows = [rows]
+    for row in rows:
+        print("  " + "  ".join(f"{k}={v:,.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in row.items()))
+
+def compare(current, previous):
+    """Print the ratio current/previous for every numeric field both runs have."""
+    print(f"\nvs {previous['meta'].get('git_revision')} ({previous['meta'].get('started')})")
+    for section, rows in current["results"].items():
+        old_rows = previous["results"].get(section)
+        if old_rows is None:
+            continue
+        rows, old_rows = (rows, old_rows) if isinstance(rows, list) else ([rows], [old_rows])
+        for row, old in zip(rows, old_rows):
+            changes = [
+                f"{k} {v / old[k]:.2f}x" for k, v in row.items()
+                if isinstance(v, float) and isinstance(old.get(k), (int, float)) and old[k]
+            ]
+            print(f"  {section}: " + ", ".join(changes))
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end ingest/snapshot/dashboard benchmarks.")
+    parser.add_argument("--only", nargs="+", choices=["ingest", "snapshot", "dashboard"],
+                        default=["ingest", "snapshot", "dashboard"])
+    parser.add_argument("--ticks", type=int, default=200000, help="ticks to publish for the ingest run")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    report = {
+        "format": RESULTS_FORMAT,
+        "meta": {
+            "started": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        if "ingest" in args.only:
+            report["results"]["ingest"] = bench_ingest(tmp, args.ticks)
+            _print_rows("ingest", report["results"]["ingest"])
+        if "snapshot" in args.only:
+            report["results"]["snapshot"] = bench_snapshot(tmp)
+            _print_rows("fetch_and_snapshot", report["results"]["snapshot"])
+        if "dashboard" in args.only:
+            report["results"]["dashboard"] = bench_dashboard(tmp)
+            _print_rows("dashboard compute", report["results"]["dashboard"])
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Local stand-in for the tick feed: publishes synthetic ticks through TCP_pipe(mode="pub").
+
+Run from the repo root:  python -m benchmarks.publisher --rate 20000
+and point the ingestor at it:  TICK_FEED_ADDRESS=tcp://127.0.0.1:4801 python insert2.py
+"""
+import argparse
+import time
+
+from tcp_pipe import TCP_pipe
+from benchmarks.tick_generator import UNDERLYINGS, TickGenerator, make_instruments
+
+LOCAL_ADDRESS = "tcp://127.0.0.1:4801"
+
+
+def publish(pipe, generator, total_ticks, lines_per_message=40, rate=None):
+    """Send total_ticks ticks; rate (ticks/sec) paces the sends, None sends flat out."""
+    sent = 0
+    start = time.perf_counter()
+    while sent < total_ticks:
+        n = min(lines_per_message, total_ticks - sent)
+        pipe.send(generator.message(n))
+        sent += n
+        if rate:
+            ahead = sent / rate - (time.perf_counter() - start)
+            if ahead > 0:
+                time.sleep(ahead)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish synthetic option-chain ticks.")
+    parser.add_argument("--address", default=LOCAL_ADDRESS)
+    parser.add_argument("--rate", type=float, default=5000, help="ticks per second (0 = as fast as possible)")
+    parser.add_argument("--lines", type=int, default=40, help="ticks per message")
+    parser.add_argument("--underlyings", nargs="+", default=list(UNDERLYINGS), choices=list(UNDERLYINGS))
+    parser.add_argument("--expiries", type=int, default=2)
+    parser.add_argument("--strikes-per-side", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=0, help="seconds to run (0 = until interrupted)")
+    args = parser.parse_args()
+
+    generator = TickGenerator(make_instruments(args.underlyings, args.expiries, args.strikes_per_side))
+    pipe = TCP_pipe(args.address, mode="pub")
+    print(f"📡 Publishing {len(generator.instruments)} instruments on {args.address} at {args.rate or 'max'} ticks/sec")
+    # Give subscribers time to connect before the first message (PUB drops until then)
+    time.sleep(0.5)
+
+    try:
+        rate = args.rate or None
+        chunk = int(rate or 10000)  # report roughly once a second
+        deadline = time.monotonic() + args.duration if args.duration else None
+        while deadline is None or time.monotonic() < deadline:
+            elapsed = publish(pipe, generator, chunk, args.lines, rate)
+            print(f"  {chunk / elapsed:,.0f} ticks/sec")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipe.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Synthetic option-chain ticks in the feed's JSON format.
+
+Symbols come in both formats symbols.extract_parts understands:
+
+    weekly:  SENSEX2580581000CE   (ROOT + YY + M + DD + STRIKE + CE/PE)
+    monthly: BANKEX25AUG62000PE   (ROOT + YY + MMM + STRIKE + CE/PE)
+
+Prices and OI follow a seeded random walk per instrument, so runs are repeatable.
+"""
+import json
+import random
+from datetime import date, datetime, timedelta
+
+# underlying -> (spot, strike step, expiry style)
+UNDERLYINGS = {
+    "SENSEX": (81000, 100, "weekly"),
+    "NIFTY": (24500, 50, "weekly"),
+    "BANKEX": (62000, 100, "monthly"),
+    "BANKNIFTY": (55000, 100, "monthly"),
+}
+
+_WEEKLY_MONTH_CODES = "123456789OND"
+
+
+def weekly_symbol(root, expiry, strike, opt_type):
+    return f"{root}{expiry:%y}{_WEEKLY_MONTH_CODES[expiry.month - 1]}{expiry:%d}{strike}{opt_type}"
+
+def monthly_symbol(root, expiry, strike, opt_type):
+    return f"{root}{expiry:%y}{expiry:%b}".upper() + f"{strike}{opt_type}"
+
+
+def make_instruments(underlyings=None, expiries=2, strikes_per_side=20, start=None):
+    """[(token, trading_symbol)] for every underlying × expiry × strike × CE/PE."""
+    start = start or date(2025, 8, 5)
+    instruments = []
+    token = 800000
+    for root in underlyings or UNDERLYINGS:
+        spot, step, style = UNDERLYINGS[root]
+        atm = spot - spot % step
+        for k in range(expiries):
+            if style == "weekly":
+                expiry = start + timedelta(weeks=k)
+                make = weekly_symbol
+            else:
+                expiry = date(start.year + (start.month + k - 1) // 12, (start.month + k - 1) % 12 + 1, 28)
+                make = monthly_symbol
+            for strike in range(atm - strikes_per_side * step, atm + (strikes_per_side + 1) * step, step):
+                for opt_type in ("CE", "PE"):
+                    instruments.append((token, make(root, expiry, strike, opt_type)))
+                    token += 1
+    return instruments
+
+
+class TickGenerator:
+    """Messages of newline-separated tick JSON, cycling through the instruments."""
+
+    def __init__(self, instruments=None, seed=7):
+        self.instruments = instruments or make_instruments()
+        self.rng = random.Random(seed)
+        self.price = [self.rng.uniform(5, 900) for _ in self.instruments]
+        self.oi = [self.rng.randint(1000, 500000) for _ in self.instruments]
+        self._next = 0
+
+    def tick(self, i, now):
+        rng = self.rng
+        token, symbol = self.instruments[i]
+        self.price[i] = max(0.05, self.price[i] * (1 + rng.gauss(0, 0.002)))
+        self.oi[i] = max(0, self.oi[i] + rng.randint(-500, 600))
+        price = round(self.price[i], 2)
+        ts = now.strftime("%Y-%m-%d %H:%M:%S")
+        return {
+            "exchange_token": token,
+            "instrument_token": 200000000 + token,
+            "trading_symbol": symbol,
+            "last_price": price,
+            "last_trade_time": ts,
+            "exchange_timestamp": ts,
+            "volume": rng.randint(0, 10**7),
+            "oi": self.oi[i],
+            "oi_day_high": self.oi[i] + 1000,
+            "oi_day_low": max(0, self.oi[i] - 1000),
+            "bid_depth": [{"price": round(price - 0.05 * k, 2), "quantity": rng.randint(1, 500), "orders": 1} for k in range(5)],
+            "ask_depth": [{"price": round(price + 0.05 * k, 2), "quantity": rng.randint(1, 500), "orders": 1} for k in range(5)],
+        }
+
+    def lines(self, n, now=None):
+        """The next n ticks as JSON lines."""
+        now = now or datetime.now()
+        count = len(self.instruments)
+        out = []
+        for _ in range(n):
+            out.append(json.dumps(self.tick(self._next, now)))
+            self._next = (self._next + 1) % count
+        return out
+
+    def message(self, n, now=None):
+        return "\n".join(self.lines(n, now))
@@ -0,0 +1,199 @@
+"""Per-snapshot option chain analytics, kept next to the snapshots in snapshot_data.db.
+
+    python chain_analytics.py                 # bring chain_stats up to date
+    python chain_analytics.py --rebuild       # recompute it from scratch
+
+fetch_and_snapshot() calls update_chain_stats() inside its own transaction, so the
+aggregates always match the committed snapshots. A snapshot only holds the instruments
+that ticked during its slot; chain_strike_state carries every strike's last known
+call/put OI forward within the trading day, and each snapshot is folded into it
+incrementally:
+
+    chain_strike_state   (root, expiry, strike) -> current call/put OI   (one row per strike)
+    chain_strike_change  strikes whose OI changed in a snapshot, with the change
+    chain_stats          per (root, expiry, snapshot): totals, PCR, max-OI strikes,
+                         max pain and the change in total OI since the previous snapshot
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+from db_schema import ensure_snapshot_schema
+from db_schema import session_start_ms
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+dst_db_name = os.path.join(current_dir, "snapshot_data.db")
+
+# Per-strike call/put OI of one snapshot, from the rows it stored
+_STRIKE_UPDATES_SQL = """
+    INSERT INTO temp.strike_updates (root, expiry, strike, call_oi, put_oi)
+    SELECT i.root, i.expiry, i.strike,
+           MAX(CASE WHEN i.opt_type = 'CE' THEN o.oi END),
+           MAX(CASE WHEN i.opt_type = 'PE' THEN o.oi END)
+    FROM snapshot_oi o
+    JOIN instruments i ON i.symbol_id = o.symbol_id
+    WHERE o.snapshot_id = ? AND o.oi IS NOT NULL
+      AND i.opt_type IN ('CE', 'PE') AND i.root IS NOT NULL AND i.expiry IS NOT NULL AND i.strike IS NOT NULL
+    GROUP BY i.root, i.expiry, i.strike
+"""
+
+# Changes are NULL for a strike's first appearance of the day
+_STRIKE_CHANGES_SQL = """
+    INSERT OR REPLACE INTO chain_strike_change
+        (root, expiry, snapshot_id, strike, call_oi, put_oi, call_oi_change, put_oi_change)
+    SELECT u.root, u.expiry, ?, u.strike,
+           COALESCE(u.call_oi, s.call_oi), COALESCE(u.put_oi, s.put_oi),
+           COALESCE(u.call_oi, s.call_oi) - s.call_oi, COALESCE(u.put_oi, s.put_oi) - s.put_oi
+    FROM temp.strike_updates u
+    LEFT JOIN chain_strike_state s ON s.root = u.root AND s.expiry = u.expiry AND s.strike = u.strike
+    WHERE (u.call_oi IS NOT NULL AND u.call_oi IS NOT s.call_oi)
+       OR (u.put_oi IS NOT NULL AND u.put_oi IS NOT s.put_oi)
+"""
+
+_APPLY_UPDATES_SQL = """
+    INSERT INTO chain_strike_state (root, expiry, strike, call_oi, put_oi)
+    SELECT root, expiry, strike, call_oi, put_oi FROM temp.strike_updates WHERE true
+    ON CONFLICT (root, expiry, strike) DO UPDATE SET
+        call_oi = COALESCE(excluded.call_oi, call_oi),
+        put_oi = COALESCE(excluded.put_oi, put_oi)
+"""
+
+# Max pain: the strike at which option writers would pay out the least at expiry,
+#   pain(K) = sum over strikes s of call_oi(s) * max(K - s, 0) + put_oi(s) * max(s - K, 0)
+_CHAIN_STATS_SQL = """
+    INSERT OR REPLACE INTO chain_stats
+        (root, expiry, snapshot_id, call_oi, put_oi, pcr, max_call_oi_strike, max_put_oi_strike,
+         max_pain_strike, call_oi_change, put_oi_change, strikes)
+    WITH totals AS (
+        SELECT root, expiry, SUM(call_oi) AS call_oi, SUM(put_oi) AS put_oi, COUNT(*) AS strikes
+        FROM chain_strike_state GROUP BY root, expiry
+    ),
+    ranked AS (
+        SELECT root, expiry, strike,
+               ROW_NUMBER() OVER (PARTITION BY root, expiry ORDER BY call_oi DESC NULLS LAST, strike) AS call_rank,
+               ROW_NUMBER() OVER (PARTITION BY root, expiry ORDER BY put_oi DESC NULLS LAST, strike) AS put_rank
+        FROM chain_strike_state
+    ),
+    -- pain(K) from running sums over the strikes below and above K, O(n log n) per chain
+    payout AS (
+        SELECT root, expiry, strike,
+               strike * SUM(c) OVER below - SUM(c * strike) OVER below
+               + SUM(p * strike) OVER above - strike * SUM(p) OVER above AS pain
+        FROM (SELECT root, expiry, strike, COALESCE(call_oi, 0) AS c, COALESCE(put_oi, 0) AS p
+              FROM chain_strike_state)
+        WINDOW below AS (PARTITION BY root, expiry ORDER BY strike ROWS UNBOUNDED PRECEDING),
+               above AS (PARTITION BY root, expiry ORDER BY strike ROWS BETWEEN CURRENT ROW AND UNBOUNDED FOLLOWING)
+    ),
+    pain AS (
+        SELECT root, expiry, strike,
+               ROW_NUMBER() OVER (PARTITION BY root, expiry ORDER BY pain, strike) AS pain_rank
+        FROM payout
+    ),
+    previous AS (
+        SELECT root, expiry, call_oi, put_oi FROM chain_stats WHERE snapshot_id = ?
+    )
+    SELECT t.root, t.expiry, ?, t.call_oi, t.put_oi,
+           CASE WHEN t.call_oi > 0 THEN 1.0 * t.put_oi / t.call_oi END,
+           mc.strike, mp.strike, px.strike,
+           t.call_oi - p.call_oi, t.put_oi - p.put_oi, t.strikes
+    FROM totals t
+    LEFT JOIN ranked mc ON mc.root = t.root AND mc.expiry = t.expiry AND mc.call_rank = 1
+    LEFT JOIN ranked mp ON mp.root = t.root AND mp.expiry = t.expiry AND mp.put_rank = 1
+    LEFT JOIN pain px ON px.root = t.root AND px.expiry = t.expiry AND px.pain_rank = 1
+    LEFT JOIN previous p ON p.root = t.root AND p.expiry = t.expiry
+"""
+
+
+def _apply_snapshot(conn, snapshot_id, snapshot_time, previous):
+    """Fold one snapshot into the strike state and write its chain_stats rows.
+
+    `previous` is (snapshot_id, snapshot_time) of the last snapshot with stats, or None.
+    """
+    if previous is None or session_start_ms(previous[1]) != session_start_ms(snapshot_time):
+        # New trading day: OI carried forward from yesterday would be stale
+        conn.execute("DELETE FROM chain_strike_state")
+        previous_id = None
+    else:
+        previous_id = previous[0] if previous[0] != snapshot_id else conn.execute(
+            "SELECT max(snapshot_id) FROM chain_stats WHERE snapshot_id < ?", (snapshot_id,)
+        ).fetchone()[0]
+
+    conn.execute("DELETE FROM temp.strike_updates")
+    conn.execute(_STRIKE_UPDATES_SQL, (snapshot_id,))
+    conn.execute(_STRIKE_CHANGES_SQL, (snapshot_id,))
+    conn.execute(_APPLY_UPDATES_SQL)
+    return conn.execute(_CHAIN_STATS_SQL, (previous_id, snapshot_id)).rowcount
+
+
+def update_chain_stats(conn, snapshot_id=None):
+    """Bring the analytics tables up to `snapshot_id` (default: the latest snapshot).
+
+    Snapshots are applied in order, starting after the last one that has stats, so a
+    database that predates these tables is backfilled on the first call. Re-applying
+    the latest snapshot (several sources feeding the same slot) only adds what is new.
+    Returns the number of chain_stats rows written. Does not commit.
+    """
+    conn.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS strike_updates (root TEXT, expiry TEXT, strike INTEGER, call_oi INTEGER, put_oi INTEGER)"
+    )
+    if snapshot_id is None:
+        snapshot_id = conn.execute("SELECT max(snapshot_id) FROM snapshots").fetchone()[0]
+        if snapshot_id is None:
+            return 0
+    previous = conn.execute("""
+        SELECT s.snapshot_id, s.snapshot_time FROM snapshots s
+        WHERE s.snapshot_id = (SELECT max(snapshot_id) FROM chain_stats)
+    """).fetchone()
+    if previous is not None and snapshot_id < previous[0]:
+        print(f"⚠️  Snapshot {snapshot_id} is older than the chain stats ({previous[0]}); run --rebuild.")
+        return 0
+
+    if previous is None:
+        first = 0
+    else:
+        first = previous[0] if snapshot_id == previous[0] else previous[0] + 1
+    pending = conn.execute(
+        "SELECT snapshot_id, snapshot_time FROM snapshots WHERE snapshot_id BETWEEN ? AND ? ORDER BY snapshot_id",
+        (first, snapshot_id),
+    ).fetchall()
+    written = 0
+    for sid, snapshot_time in pending:
+        rows = _apply_snapshot(conn, sid, snapshot_time, previous)
+        if rows > 0:
+            previous = (sid, snapshot_time)
+        written += max(rows, 0)
+    return written
+
+
+def rebuild_chain_stats(conn):
+    """Recompute every analytics table from snapshot_oi. Does not commit."""
+    for table in ("chain_stats", "chain_strike_change", "chain_strike_state"):
+        conn.execute(f"DELETE FROM {table}")
+    return update_chain_stats(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update the per-snapshot chain analytics tables.")
+    parser.add_argument("--snapshot-db", default=dst_db_name)
+    parser.add_argument("--rebuild", action="store_true", help="recompute from scratch")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(args.snapshot_db, isolation_level=None)
+    try:
+        conn.execute("BEGIN")
+        ensure_snapshot_schema(conn)
+        rows = rebuild_chain_stats(conn) if args.rebuild else update_chain_stats(conn)
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    print(f"🚀 {rows} chain_stats rows written in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import numpy as np
+import plotly.graph_objects as go
+
+# Color mapping
+COLORS = {'CE': '#22c55e', 'PE': '#ef4444'}  # Green for CE, Red for PE
+
+# One template for every trace; the last line is filled per bar through customdata
+HOVERTEMPLATE = (
+    "<b>%{customdata[0]} %{customdata[1]}</b><br>"
+    "T1: %{customdata[2]}<br>"
+    "T2: %{customdata[3]}<br>"
+    "%{customdata[4]}"
+    "<extra></extra>"
+)
+
+
+def _bar(name, x, y, base, customdata, marker):
+    return go.Bar(
+        x=x, y=y, base=base, customdata=customdata, name=name,
+        marker=marker, hovertemplate=HOVERTEMPLATE, showlegend=True,
+    )
+
+
+def build_oi_chart(strikes, types, t1_oi, t2_oi):
+    """OI change bars for a chain as a fixed set of six traces.
+
+    Per (strike, type), with t1/t2 the OI at T1/T2:
+      - decrease (t1 >= t2, both non-zero): hollow bar of t1 with a filled bar of t2 inside
+      - otherwise: filled bar of t1, plus a striped bar from t1 up to t2 when OI grew
+    Traces are added hollow → filled → striped so the overlay stacks as before.
+    """
+    strikes = np.asarray(strikes, dtype=np.int64)
+    types = np.asarray(types).astype(str)
+    t1_oi = np.asarray(t1_oi, dtype=np.int64)
+    t2_oi = np.asarray(t2_oi, dtype=np.int64)
+
+    order = np.argsort(strikes, kind='stable')
+    strikes, types, t1_oi, t2_oi = strikes[order], types[order], t1_oi[order], t2_oi[order]
+
+    # Position for CE/PE side by side
+    x_pos = np.char.add(np.char.add(strikes.astype(str), '_'), types)
+    diff = t2_oi - t1_oi
+    decrease = (t1_oi >= t2_oi) & (t1_oi != 0) & (t2_oi != 0)
+    increase = ~decrease & (diff > 0)
+
+    def customdata(mask, detail):
+        return np.column_stack([strikes[mask], types[mask], t1_oi[mask], t2_oi[mask], detail[mask]])
+
+    base_detail = np.char.add('Base OI: ', t2_oi.astype(str))
+    decrease_detail = np.char.add('Decrease: -', (t1_oi - t2_oi).astype(str))
+    increase_detail = np.char.add('Increase: +', diff.astype(str))
+
+    hollow, filled, striped = [], [], []
+    for opt_type, label in (('CE', 'Call'), ('PE', 'Put')):
+        color = COLORS[opt_type]
+        side = types == opt_type
+
+        m = side & decrease
+        hollow.append(_bar(
+            f"{label} Decrease", x_pos[m], t1_oi[m], None, customdata(m, decrease_detail),
+            dict(color='rgba(0,0,0,0)', line=dict(color=color, width=2)),
+        ))
+
+        # Filled bar: t2 inside a decrease, t1 otherwise
+        m = side
+        filled_y = np.where(decrease, t2_oi, t1_oi)
+        filled.append(_bar(
+            f"{label} OI", x_pos[m], filled_y[m], None, customdata(m, base_detail),
+            dict(color=color),
+        ))
+
+        m = side & increase
+        striped.append(_bar(
+            f"{label} Increase", x_pos[m], diff[m], t1_oi[m], customdata(m, increase_detail),
+            dict(color=color, pattern=dict(shape="/", bgcolor="rgba(255,255,255,0.3)", fgcolor=color, size=6)),
+        ))
+
+    return go.Figure(data=hollow + filled + striped)
@@ -0,0 +1,289 @@
+import os
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+
+from symbols import parse_symbols
+
+# Storage schema v2 for market_data.db and snapshot_data.db.
+#
+# Timestamps are INTEGER epoch milliseconds of the exchange wall-clock time, encoded
+# as if it were UTC, so they convert back to the original 'YYYY-MM-DD HH:MM:SS' text
+# without depending on the machine's time zone (SQLite: datetime(ts / 1000, 'unixepoch'),
+# pandas: pd.to_datetime(ts, unit='ms')).
+#
+# snapshot_data.db stores each trading symbol once in `instruments` and each snapshot
+# time once in `snapshots`; `snapshot_oi` rows are just four integers. The v1 layout is
+# still readable through the `oi_snapshot` view, which returns rows as stored: with
+# delta storage that is only the changed rows of non-keyframe snapshots.
+#
+# Keyframe snapshots are read as stored. Other snapshots (opt-in delta storage, see
+# new_db.py) only hold rows whose oi/oi_day_high changed, and an instrument's state at
+# time T is its latest row between the last keyframe at or before T and T
+# (snapshot_queries.load_snapshot_asof). Snapshots written before delta storage are
+# all keyframes, so they read exactly as before.
+#
+# None of these helpers commit: callers run them inside their own transaction.
+
+SCHEMA_VERSION = 2
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+@lru_cache(maxsize=8192)
+def to_epoch_ms(value):
+    """'YYYY-MM-DD HH:MM:SS' (or any ISO-8601 text) -> epoch ms, None if unparseable."""
+    try:
+        return int((datetime.fromisoformat(value) - _EPOCH).total_seconds() * 1000)
+    except (TypeError, ValueError):
+        return None
+
+def datetime_to_epoch_ms(dt):
+    return int((dt.replace(tzinfo=None) - _EPOCH).total_seconds() * 1000)
+
+def epoch_ms_to_str(ms):
+    return (_EPOCH + timedelta(milliseconds=ms)).strftime("%Y-%m-%d %H:%M:%S")
+
+def now_epoch_ms():
+    return datetime_to_epoch_ms(datetime.now())
+
+
+# ---- trading sessions ----
+
+# Sessions roll over at this wall-clock time; anything earlier belongs to the previous
+# day (MCX trades until 23:55, so midnight would split its evening session). Ingest
+# (session_rollover.py), snapshots, chain analytics and every reader split days here.
+SESSION_ROLLOVER = os.environ.get("INGEST_SESSION_ROLLOVER", "06:00")
+_hours, _minutes = (int(part) for part in SESSION_ROLLOVER.split(":"))
+SESSION_OFFSET = timedelta(hours=_hours, minutes=_minutes)
+SESSION_OFFSET_MS = SESSION_OFFSET // timedelta(milliseconds=1)
+DAY_MS = 24 * 60 * 60 * 1000
+
+def session_start_ms(ms):
+    """Epoch ms at which the session containing `ms` started."""
+    return ms - (ms - SESSION_OFFSET_MS) % DAY_MS
+
+def session_date(ms):
+    """The trading day the session containing `ms` belongs to."""
+    return (_EPOCH + timedelta(milliseconds=ms) - SESSION_OFFSET).date()
+
+def session_bounds(day):
+    """[start, end) epoch ms of the session of trading day `day`."""
+    start = datetime_to_epoch_ms(datetime.combine(day, time.min)) + SESSION_OFFSET_MS
+    return start, start + DAY_MS
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def _table_exists(conn, name, kind="table"):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?", (kind, name)
+    ).fetchone() is not None
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+# SQL expression converting v1 TEXT timestamps to v2 epoch ms
+def _text_to_ms_sql(column):
+    return f"CAST(strftime('%s', {column}) AS INTEGER) * 1000"
+
+
+# ---- market_data.db ----
+
+_MARKET_DATA_COLUMNS = """(
+        timestamp INTEGER,
+        exc_timestamp INTEGER,
+        token INTEGER PRIMARY KEY,
+        instrument_token INTEGER,
+        trading_symbol TEXT,
+        ltp REAL,
+        bidprice REAL,
+        bidqty INTEGER,
+        askprice REAL,
+        askqty INTEGER,
+        volume INTEGER,
+        oi INTEGER,
+        oi_day_high INTEGER,
+        oi_day_low INTEGER
+    )"""
+
+MARKET_DATA_DDL = f"CREATE TABLE IF NOT EXISTS market_data {_MARKET_DATA_COLUMNS}"
+
+def create_market_table(conn, name, index_name):
+    """Create an empty market_data-shaped table under another name (session rollover)."""
+    conn.execute(f"CREATE TABLE {name} {_MARKET_DATA_COLUMNS}")
+    conn.execute(f"CREATE INDEX {index_name} ON {name}(timestamp)")
+
+def ensure_market_schema(conn):
+    """Create (or upgrade) market_data to schema v2."""
+    if _table_exists(conn, "market_data") and schema_version(conn) < SCHEMA_VERSION:
+        migrate_market_data(conn)
+    conn.execute(MARKET_DATA_DDL)
+    # Snapshot windows are range scans on timestamp
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_market_data_timestamp ON market_data(timestamp)")
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def migrate_market_data(conn):
+    """Convert a v1 market_data table (TEXT timestamps) in place."""
+    conn.execute("ALTER TABLE market_data RENAME TO market_data_v1")
+    conn.execute("DROP INDEX IF EXISTS idx_token")
+    conn.execute(MARKET_DATA_DDL)
+    conn.execute(f"""
+        INSERT INTO market_data
+        SELECT {_text_to_ms_sql('timestamp')}, {_text_to_ms_sql('exc_timestamp')},
+               token, instrument_token, trading_symbol, ltp, bidprice, bidqty,
+               askprice, askqty, volume, oi, oi_day_high, oi_day_low
+        FROM market_data_v1
+    """)
+    conn.execute("DROP TABLE market_data_v1")
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+# ---- snapshot_data.db ----
+
+SNAPSHOT_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS instruments (
+        symbol_id INTEGER PRIMARY KEY,
+        trading_symbol TEXT NOT NULL UNIQUE,
+        root TEXT,
+        expiry TEXT,
+        strike INTEGER,
+        opt_type TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_instruments_root_expiry ON instruments(root, expiry)",
+    """
+    CREATE TABLE IF NOT EXISTS snapshots (
+        snapshot_id INTEGER PRIMARY KEY,
+        snapshot_time INTEGER NOT NULL UNIQUE,
+        keyframe INTEGER NOT NULL DEFAULT 1
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS snapshot_oi (
+        snapshot_id INTEGER NOT NULL,
+        symbol_id INTEGER NOT NULL,
+        oi INTEGER,
+        oi_day_high INTEGER,
+        PRIMARY KEY (snapshot_id, symbol_id)
+    ) WITHOUT ROWID
+    """,
+    # Per-instrument history (time series of one strike)
+    "CREATE INDEX IF NOT EXISTS idx_snapshot_oi_symbol ON snapshot_oi(symbol_id, snapshot_id)",
+    # v1-compatible read view for existing consumers (rows as stored, see above)
+    """
+    CREATE VIEW IF NOT EXISTS oi_snapshot AS
+    SELECT strftime('%Y-%m-%d %H:%M:%S', s.snapshot_time / 1000, 'unixepoch') AS snapshot_time,
+           i.trading_symbol, o.oi, o.oi_day_high
+    FROM snapshot_oi o
+    JOIN snapshots s ON s.snapshot_id = o.snapshot_id
+    JOIN instruments i ON i.symbol_id = o.symbol_id
+    """,
+    # Chain analytics maintained by chain_analytics.update_chain_stats()
+    """
+    CREATE TABLE IF NOT EXISTS chain_stats (
+        root TEXT NOT NULL,
+        expiry TEXT NOT NULL,
+        snapshot_id INTEGER NOT NULL,
+        call_oi INTEGER,
+        put_oi INTEGER,
+        pcr REAL,
+        max_call_oi_strike INTEGER,
+        max_put_oi_strike INTEGER,
+        max_pain_strike INTEGER,
+        call_oi_change INTEGER,
+        put_oi_change INTEGER,
+        strikes INTEGER,
+        PRIMARY KEY (root, expiry, snapshot_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_chain_stats_snapshot ON chain_stats(snapshot_id)",
+    """
+    CREATE TABLE IF NOT EXISTS chain_strike_change (
+        root TEXT NOT NULL,
+        expiry TEXT NOT NULL,
+        snapshot_id INTEGER NOT NULL,
+        strike INTEGER NOT NULL,
+        call_oi INTEGER,
+        put_oi INTEGER,
+        call_oi_change INTEGER,
+        put_oi_change INTEGER,
+        PRIMARY KEY (root, expiry, snapshot_id, strike)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chain_strike_state (
+        root TEXT NOT NULL,
+        expiry TEXT NOT NULL,
+        strike INTEGER NOT NULL,
+        call_oi INTEGER,
+        put_oi INTEGER,
+        PRIMARY KEY (root, expiry, strike)
+    ) WITHOUT ROWID
+    """,
+)
+
+def ensure_snapshot_schema(conn):
+    """Create (or upgrade) the snapshot tables to schema v2."""
+    if _table_exists(conn, "oi_snapshot") and schema_version(conn) < SCHEMA_VERSION:
+        migrate_snapshot_data(conn)
+        return
+    for ddl in SNAPSHOT_DDL:
+        conn.execute(ddl)
+    if "keyframe" not in _columns(conn, "snapshots"):
+        # Added with delta storage; earlier snapshots stay keyframes
+        conn.execute("ALTER TABLE snapshots ADD COLUMN keyframe INTEGER NOT NULL DEFAULT 1")
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def _instrument_rows(symbols):
+    parts = parse_symbols(symbols)
+    parts['strike'] = parts['strike'].astype('Int64')
+    parts = parts.astype(object).where(parts.notna(), None)
+    return [(s, *row) for s, row in zip(symbols, parts.itertuples(index=False, name=None))]
+
+def register_instruments(conn, symbols):
+    """Add unseen trading symbols to `instruments`, parsing each one exactly once."""
+    known = {row[0] for row in conn.execute("SELECT trading_symbol FROM instruments")}
+    new = sorted({s for s in symbols if s and s not in known})
+    if new:
+        conn.executemany(
+            "INSERT OR IGNORE INTO instruments (trading_symbol, root, expiry, strike, opt_type) VALUES (?, ?, ?, ?, ?)",
+            _instrument_rows(new),
+        )
+    return len(new)
+
+def reparse_instruments(conn):
+    """Re-run the symbol parser over every stored instrument (after parser fixes)."""
+    symbols = [row[0] for row in conn.execute("SELECT trading_symbol FROM instruments")]
+    if symbols:
+        conn.executemany(
+            "UPDATE instruments SET root = ?, expiry = ?, strike = ?, opt_type = ? WHERE trading_symbol = ?",
+            [(*row[1:], row[0]) for row in _instrument_rows(symbols)],
+        )
+    return len(symbols)
+
+def migrate_snapshot_data(conn):
+    """Convert a v1 oi_snapshot table (TEXT time + symbol per row) in place."""
+    has_day_high = "oi_day_high" in _columns(conn, "oi_snapshot")
+    conn.execute("ALTER TABLE oi_snapshot RENAME TO oi_snapshot_v1")
+    conn.execute("DROP INDEX IF EXISTS idx_snapshot_unique")
+    for ddl in SNAPSHOT_DDL:
+        conn.execute(ddl)
+
+    symbols = [row[0] for row in conn.execute("SELECT DISTINCT trading_symbol FROM oi_snapshot_v1")]
+    register_instruments(conn, symbols)
+    conn.execute(f"""
+        INSERT OR IGNORE INTO snapshots (snapshot_time)
+        SELECT DISTINCT {_text_to_ms_sql('snapshot_time')} FROM oi_snapshot_v1
+        WHERE snapshot_time IS NOT NULL
+        ORDER BY 1
+    """)
+    conn.execute(f"""
+        INSERT OR IGNORE INTO snapshot_oi (snapshot_id, symbol_id, oi, oi_day_high)
+        SELECT s.snapshot_id, i.symbol_id, v.oi, {'v.oi_day_high' if has_day_high else 'NULL'}
+        FROM oi_snapshot_v1 v
+        JOIN snapshots s ON s.snapshot_time = {_text_to_ms_sql('v.snapshot_time')}
+        JOIN instruments i ON i.trading_symbol = v.trading_symbol
+    """)
+    conn.execute("DROP TABLE oi_snapshot_v1")
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
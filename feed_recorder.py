@@ -0,0 +1,163 @@
+import bisect
+import os
+import struct
+import time
+import zlib
+
+# Optional faster codec; recordings written with it need it installed to be read back
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Raw feed recordings: one directory per session holding append-only segment files.
+#
+#   seg-00001.dat   compressed blocks, back to back
+#   seg-00001.idx   one fixed-size entry per block: first/last receive time (epoch ns),
+#                   offset and length in the .dat file, message count, codec
+#
+# A block is the concatenation of (recv_ns int64, length uint32, payload) records.
+# The index entry is appended only after its block is on disk, so a crash can leave
+# at most one unindexed tail block, which readers never see.
+
+BLOCK_BYTES = 256 * 1024        # raw bytes per compressed block ...
+BLOCK_SECONDS = 1.0             # ... or at most this much feed time per block
+SEGMENT_BYTES = 64 * 1024 * 1024
+
+CODEC_ZLIB = 0
+CODEC_ZSTD = 1
+
+_RECORD = struct.Struct("<qI")
+_INDEX = struct.Struct("<qqQIIB3x")
+
+
+def _compress(data, codec):
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 1)
+
+def _decompress(data, codec):
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("recording uses zstd; install the zstandard package to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class FeedRecorder:
+    """Appends raw feed messages (bytes) to compressed segments in `directory`."""
+
+    def __init__(self, directory, codec=None):
+        self.directory = directory
+        self.codec = codec if codec is not None else (CODEC_ZSTD if zstandard is not None else CODEC_ZLIB)
+        os.makedirs(directory, exist_ok=True)
+
+        # Continue after the last segment of an existing session
+        existing = sorted(name for name in os.listdir(directory) if name.endswith(".idx"))
+        self._segment = int(existing[-1][4:9]) if existing else 0
+        self._open_segment(new=not existing)
+
+        self._buffer = []
+        self._buffered = 0
+        self._first_ns = self._last_ns = None
+        self.messages = 0
+
+    def _open_segment(self, new=True):
+        if new:
+            self._segment += 1
+        base = os.path.join(self.directory, f"seg-{self._segment:05d}")
+        self._dat = open(base + ".dat", "ab")
+        self._idx = open(base + ".idx", "ab")
+
+    def append(self, payload, recv_ns=None):
+        recv_ns = recv_ns or time.time_ns()
+        if self._first_ns is None:
+            self._first_ns = recv_ns
+        self._last_ns = recv_ns
+        self._buffer.append(_RECORD.pack(recv_ns, len(payload)))
+        self._buffer.append(payload)
+        self._buffered += _RECORD.size + len(payload)
+        self.messages += 1
+        if self._buffered >= BLOCK_BYTES or recv_ns - self._first_ns >= BLOCK_SECONDS * 1e9:
+            self.flush()
+
+    def flush_if_due(self):
+        """Write out a partly filled block once it is BLOCK_SECONDS old (call when the feed is idle)."""
+        if self._first_ns is not None and time.time_ns() - self._first_ns >= BLOCK_SECONDS * 1e9:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        block = _compress(b"".join(self._buffer), self.codec)
+        offset = self._dat.tell()
+        self._dat.write(block)
+        self._dat.flush()
+        count = len(self._buffer) // 2
+        self._idx.write(_INDEX.pack(self._first_ns, self._last_ns, offset, len(block), count, self.codec))
+        self._idx.flush()
+
+        self._buffer.clear()
+        self._buffered = 0
+        self._first_ns = self._last_ns = None
+        if self._dat.tell() >= SEGMENT_BYTES:
+            self._dat.close()
+            self._idx.close()
+            self._open_segment()
+
+    def close(self):
+        self.flush()
+        self._dat.close()
+        self._idx.close()
+
+
+class FeedReader:
+    """Reads a recorded session in receive order, starting anywhere via the block index."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.blocks = []  # (first_ns, last_ns, segment path, offset, length, count, codec)
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".idx"):
+                continue
+            dat_path = os.path.join(directory, name[:-4] + ".dat")
+            with open(os.path.join(directory, name), "rb") as f:
+                data = f.read()
+            usable = len(data) - len(data) % _INDEX.size
+            for first_ns, last_ns, offset, length, count, codec in _INDEX.iter_unpack(data[:usable]):
+                self.blocks.append((first_ns, last_ns, dat_path, offset, length, count, codec))
+        self._last_times = [block[1] for block in self.blocks]
+
+    @property
+    def start_ns(self):
+        return self.blocks[0][0] if self.blocks else None
+
+    @property
+    def end_ns(self):
+        return self.blocks[-1][1] if self.blocks else None
+
+    @property
+    def message_count(self):
+        return sum(block[5] for block in self.blocks)
+
+    def messages(self, start_ns=None):
+        """Yield (recv_ns, payload) for every message received at or after start_ns."""
+        first = bisect.bisect_left(self._last_times, start_ns) if start_ns is not None else 0
+        handles = {}
+        try:
+            for _, _, path, offset, length, _, codec in self.blocks[first:]:
+                f = handles.get(path)
+                if f is None:
+                    f = handles[path] = open(path, "rb")
+                f.seek(offset)
+                data = _decompress(f.read(length), codec)
+                pos = 0
+                while pos < len(data):
+                    recv_ns, size = _RECORD.unpack_from(data, pos)
+                    pos += _RECORD.size
+                    if start_ns is None or recv_ns >= start_ns:
+                        yield recv_ns, data[pos:pos + size]
+                    pos += size
+        finally:
+            for f in handles.values():
+                f.close()
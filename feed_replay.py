@@ -0,0 +1,149 @@
+"""Replay a raw feed recording (see feed_recorder.py).
+
+    python feed_replay.py play recordings/2025-08-05                  # 1x, on tcp://127.0.0.1:4801
+    python feed_replay.py play recordings/2025-08-05 --speed 20 --seek 5:00
+    python feed_replay.py play recordings/2025-08-05 --speed 0        # as fast as possible
+    python feed_replay.py rebuild recordings/2025-08-05 --market-db md.db --snapshot-db snap.db
+    python feed_replay.py info recordings/2025-08-05
+
+`play` republishes the messages over a local PUB socket, paced by their original
+receive times, for the ingestor to consume (TICK_FEED_ADDRESS=tcp://127.0.0.1:4801).
+`rebuild` skips the network: it decodes and upserts in-process, snapshotting each
+3-minute slot as the recording's clock leaves it, so a past day's market_data and
+snapshot tables are rebuilt at decode speed.
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from db_schema import ensure_market_schema
+from feed_recorder import FeedReader
+from insert2 import BATCH_SIZE, upsert_data_batch
+from new_db import fetch_and_snapshot, round_to_3min
+from tcp_pipe import TCP_pipe
+from tick_decoder import TickDecoder
+
+LOCAL_ADDRESS = "tcp://127.0.0.1:4801"
+PROGRESS_INTERVAL = 5.0
+
+
+def parse_offset(text):
+    """'90', '1:30' or '0:01:30' -> seconds."""
+    seconds = 0.0
+    for part in text.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def _fmt_ns(ns):
+    return datetime.fromtimestamp(ns / 1e9).strftime("%Y-%m-%d %H:%M:%S")
+
+def play(reader, pipe, speed=1.0, start_ns=None):
+    """Publish recorded messages; speed is a multiple of real time, 0 for no pacing."""
+    sent = 0
+    feed_start = wall_start = None
+    next_report = time.monotonic() + PROGRESS_INTERVAL
+    for recv_ns, raw in reader.messages(start_ns):
+        if feed_start is None:
+            feed_start, wall_start = recv_ns, time.perf_counter()
+        elif speed:
+            ahead = (recv_ns - feed_start) / 1e9 / speed - (time.perf_counter() - wall_start)
+            if ahead > 0:
+                time.sleep(ahead)
+        pipe.send_raw(raw)
+        sent += 1
+        if time.monotonic() >= next_report:
+            next_report += PROGRESS_INTERVAL
+            print(f"  {_fmt_ns(recv_ns)}  {sent} messages")
+    return sent
+
+def rebuild(reader, market_db, snapshot_db, start_ns=None):
+    """Rebuild market_data and its 3-minute snapshots from a recording. Returns the slot count."""
+    conn = sqlite3.connect(market_db, isolation_level=None)
+    conn.execute("BEGIN")
+    conn.execute("DROP TABLE IF EXISTS market_data")
+    ensure_market_schema(conn)
+    conn.execute("COMMIT")
+    conn.isolation_level = ""  # upsert_data_batch commits itself
+
+    decoder = TickDecoder()
+    pending = {}
+    slot = None
+    slots = 0
+
+    def flush():
+        if pending:
+            upsert_data_batch(conn, list(pending.values()))
+            pending.clear()
+
+    def snapshot(slot):
+        flush()
+        fetch_and_snapshot(slot, market_db, snapshot_db)
+
+    try:
+        for recv_ns, raw in reader.messages(start_ns):
+            message_slot = round_to_3min(datetime.fromtimestamp(recv_ns / 1e9))
+            if slot is not None and message_slot != slot:
+                # The recording's clock left the slot: snapshot it like new_db's scheduler would
+                snapshot(slot)
+                slots += 1
+            slot = message_slot
+
+            for row in decoder.decode_message(raw)[0]:
+                pending[row[2]] = row
+            if len(pending) >= BATCH_SIZE:
+                flush()
+        if slot is not None:
+            snapshot(slot)
+            slots += 1
+    finally:
+        conn.close()
+    return slots
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a raw feed recording.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("play", "rebuild", "info"):
+        p = sub.add_parser(name)
+        p.add_argument("directory", help="session directory written by the recorder")
+        if name != "info":
+            p.add_argument("--seek", type=parse_offset, default=0,
+                           help="start this far into the session ([[H:]M:]S)")
+    sub.choices["play"].add_argument("--address", default=LOCAL_ADDRESS)
+    sub.choices["play"].add_argument("--speed", type=float, default=1.0, help="multiple of real time, 0 = max")
+    sub.choices["rebuild"].add_argument("--market-db", required=True)
+    sub.choices["rebuild"].add_argument("--snapshot-db", required=True)
+    args = parser.parse_args()
+
+    reader = FeedReader(args.directory)
+    if not reader.blocks:
+        print(f"⚠️  No recorded messages in {args.directory}")
+        return
+    print(f"📼 {reader.message_count} messages, {_fmt_ns(reader.start_ns)} → {_fmt_ns(reader.end_ns)}")
+    if args.command == "info":
+        return
+
+    start_ns = reader.start_ns + int(args.seek * 1e9)
+    started = time.perf_counter()
+    if args.command == "play":
+        pipe = TCP_pipe(args.address, mode="pub")
+        time.sleep(0.5)  # let subscribers connect before the first message
+        try:
+            sent = play(reader, pipe, args.speed, start_ns)
+        except KeyboardInterrupt:
+            sent = None
+        finally:
+            pipe.close()
+        if sent is not None:
+            print(f"🚀 Replayed {sent} messages in {time.perf_counter() - started:.1f}s")
+    else:
+        for path in (args.market_db, args.snapshot_db):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        slots = rebuild(reader, args.market_db, args.snapshot_db, start_ns)
+        print(f"🚀 Rebuilt {slots} snapshot slots in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Minimal Prometheus-style metrics for the ingest path (no external client library)
+
+_lock = threading.Lock()
+_registry = []
+
+
+def _fmt_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        _registry.append(self)
+
+    def inc(self, amount=1):
+        with _lock:
+            self.value += amount
+
+    def render(self):
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {self.value}",
+        ]
+
+
+class Gauge:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0.0
+        _registry.append(self)
+
+    def set(self, value):
+        with _lock:
+            self.value = value
+
+    def render(self):
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {self.value}",
+        ]
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        _registry.append(self)
+
+    def observe(self, value):
+        with _lock:
+            self.count += 1
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} histogram",
+        ]
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            lines.append(f"{self.name}_bucket{_fmt_labels({'le': bound})} {cumulative}")
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+def render_metrics():
+    """Return all registered metrics in Prometheus text exposition format."""
+    with _lock:
+        lines = []
+        for metric in _registry:
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve /metrics from a daemon thread. Returns the server (call shutdown() to stop)."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class LogSampler:
+    """Lets at most one log line through every `interval` seconds."""
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self.skipped = 0
+        self._next = 0.0
+
+    def sample(self):
+        """Return the number of suppressed events since the last emit, or None to suppress this one."""
+        now = time.monotonic()
+        if now < self._next:
+            self.skipped += 1
+            return None
+        self._next = now + self.interval
+        skipped, self.skipped = self.skipped, 0
+        return skipped
+
+
+# Ingest metrics
+messages_total = Counter("ingest_messages_total", "ZMQ messages received")
+lines_total = Counter("ingest_lines_total", "Tick lines received")
+parse_errors_total = Counter("ingest_parse_errors_total", "Tick lines that failed to decode")
+rows_written_total = Counter("ingest_rows_written_total", "Coalesced rows upserted into market_data")
+receiver_errors_total = Counter("ingest_receiver_errors_total", "Receiver threads stopped by an exception")
+queue_depth = Gauge("ingest_queue_depth", "Socket drains waiting between receiver and writer")
+drain_size = Histogram(
+    "ingest_drain_messages", "Messages taken per socket drain",
+    (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2000),
+)
+batch_target = Gauge("ingest_batch_target", "Current adaptive flush threshold (pending tokens)")
+backpressure_total = Counter(
+    "ingest_backpressure_total", "Decoder flushes deferred because the writer queue was full",
+)
+batch_size = Histogram(
+    "ingest_batch_size", "Rows per market_data flush",
+    (1, 10, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+flush_seconds = Histogram(
+    "ingest_flush_seconds", "upsert_data_batch latency including commit",
+    (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+last_exchange_timestamp = Gauge(
+    "ingest_last_exchange_timestamp_seconds", "Newest exchange_timestamp written, as unix time",
+)
+exchange_lag_seconds = Gauge(
+    "ingest_exchange_lag_seconds", "Wall clock minus newest exchange_timestamp at last flush",
+)
@@ -0,0 +1,267 @@
+"""Multi-feed ingest: one decoder process per feed, feeding SQLite writer processes.
+
+    python ingest_supervisor.py                              # feeds from ingest_feeds.json
+    python ingest_supervisor.py --feed nse=tcp://192.168.1.40:4801 --feed bse=tcp://192.168.1.40:4802
+    python ingest_supervisor.py --sharded                    # market_data_<feed>.db per feed
+
+ingest_feeds.json:
+
+    {
+        "sharded": false,
+        "feeds": [
+            {"name": "nse", "address": "tcp://192.168.1.40:4801", "socket": {"rcvhwm": 200000}},
+            {"name": "bse", "address": "tcp://192.168.1.40:4802"},
+            {"name": "mcx", "address": "tcp://192.168.1.40:4803"}
+        ]
+    }
+
+Decoder processes subscribe, decode and coalesce ticks to the latest row per token,
+then hand row batches to a writer over a bounded queue. When the writer falls behind
+the queue fills and decoders keep coalescing into their pending batch instead of
+blocking, so memory stays bounded by the number of instruments. By default every feed
+goes to one writer (market_data.db); --sharded gives each feed its own writer and
+database (point new_db.py at them with SNAPSHOT_SOURCES). Crashed processes are
+restarted with exponential backoff. A feed's optional "socket" entry takes the
+options listed in tcp_pipe.SOCKET_OPTIONS.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import signal
+import sqlite3
+import time
+
+import ingest_metrics as metrics
+from insert2 import (
+    BATCH_SIZE, FLUSH_INTERVAL, JSON_BACKEND, METRICS_PORT, db_name, initialize_database,
+    record_exchange_lag, tracker_path, upsert_data_batch,
+)
+from last_value_cache import LastValueCache
+from session_rollover import SessionRollover
+from tcp_pipe import FEED_ADDRESS, TCP_pipe
+from tick_decoder import TickDecoder
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(current_dir, "ingest_feeds.json")
+
+# Row batches buffered per writer before decoders start deferring flushes
+WRITER_QUEUE_BATCHES = 64
+# Restart backoff for crashed processes, doubling up to the maximum
+RESTART_BACKOFF = 1.0
+RESTART_BACKOFF_MAX = 30.0
+# A process that stayed up this long gets its backoff reset
+HEALTHY_AFTER = 60.0
+
+
+def load_feeds(path=CONFIG_PATH):
+    """(feeds, sharded) from a JSON config; a single default feed when the file is missing."""
+    if not os.path.exists(path):
+        return [{"name": "main", "address": FEED_ADDRESS}], False
+    with open(path) as f:
+        config = json.load(f)
+    return config["feeds"], bool(config.get("sharded", False))
+
+def shard_path(name):
+    return os.path.join(os.path.dirname(db_name), f"market_data_{name}.db")
+
+
+# ---- child processes (top-level so they work with the spawn start method) ----
+
+def decoder_main(name, address, batches, stop, socket_options=None):
+    """Subscribe to one feed and send coalesced row batches to `batches`."""
+    # Ctrl+C reaches the whole process group; shutdown is driven by the supervisor
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    pipe = TCP_pipe(address, options=socket_options)
+    decoder = TickDecoder(JSON_BACKEND)
+    pending = {}
+    messages = lines = errors = deferred = 0
+    last_flush = time.monotonic()
+
+    def flush(block=False):
+        nonlocal messages, lines, errors, deferred, last_flush
+        batch = (name, list(pending.values()), messages, lines, errors, deferred)
+        try:
+            if block:
+                batches.put(batch, timeout=5)
+            else:
+                batches.put_nowait(batch)
+        except queue.Full:
+            # Back-pressure: keep coalescing into `pending` and try again next round
+            deferred += 1
+            return
+        pending.clear()
+        messages = lines = errors = deferred = 0
+        last_flush = time.monotonic()
+
+    print(f"📡 [{name}] subscribing to {address}")
+    try:
+        while not stop.is_set():
+            for raw in pipe.drain(timeout=100):
+                rows, bad, line_count = decoder.decode_message(raw)
+                messages += 1
+                lines += line_count
+                errors += len(bad)
+                for row in rows:
+                    pending[row[2]] = row
+            if pending and (len(pending) >= BATCH_SIZE or time.monotonic() - last_flush >= FLUSH_INTERVAL):
+                flush()
+        if pending:
+            flush(block=True)
+    finally:
+        pipe.close()
+
+def writer_main(path, batches, stop, metrics_port):
+    """Upsert row batches from `batches` into one market_data database until stopped and drained."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    initialize_database(path=path)
+    conn = sqlite3.connect(path)
+    lvc = LastValueCache(os.path.splitext(path)[0] + ".lvc", writer=True)
+    # Each database rolls over to a new session on its own (see session_rollover.py)
+    rollover = SessionRollover(path, tracker_path(path), lvc)
+    metrics_server = metrics.start_metrics_server(metrics_port) if metrics_port else None
+    print(f"💾 Writing to {path}")
+
+    try:
+        while True:
+            if rollover.due():
+                rollover.begin(conn)
+            try:
+                name, rows, messages, lines, errors, deferred = batches.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                # The supervisor sets `stop` only after the decoders' last batches are in
+                if stop.is_set():
+                    break
+                continue
+
+            metrics.messages_total.inc(messages)
+            metrics.lines_total.inc(lines)
+            metrics.parse_errors_total.inc(errors)
+            metrics.backpressure_total.inc(deferred)
+            if rows:
+                start = time.perf_counter()
+                upsert_data_batch(conn, rows, rollover.table)
+                metrics.flush_seconds.observe(time.perf_counter() - start)
+                metrics.batch_size.observe(len(rows))
+                metrics.rows_written_total.inc(len(rows))
+                if rollover.staging:
+                    rollover.switch(conn, rows)
+                else:
+                    lvc.update(rows)
+                record_exchange_lag(rows)
+    finally:
+        if metrics_server:
+            metrics_server.shutdown()
+        conn.close()
+        lvc.close()
+        rollover.close()
+
+
+# ---- supervisor ----
+
+class ManagedProcess:
+    """A child process that is restarted with backoff whenever it dies unexpectedly."""
+
+    def __init__(self, label, target, args):
+        self.label = label
+        self.target = target
+        self.args = args
+        self.process = None
+        self.restarts = 0
+        self.backoff = RESTART_BACKOFF
+        self.started_at = 0.0
+        self.restart_at = None
+
+    def start(self):
+        self.process = mp.Process(target=self.target, args=self.args, name=self.label, daemon=False)
+        self.process.start()
+        self.started_at = time.monotonic()
+
+    def check(self):
+        now = time.monotonic()
+        if self.process.is_alive():
+            if now - self.started_at >= HEALTHY_AFTER:
+                self.backoff = RESTART_BACKOFF
+            return
+        if self.restart_at is None:
+            print(f"❌ {self.label} exited with code {self.process.exitcode}; restarting in {self.backoff:.0f}s")
+            self.restart_at = now + self.backoff
+            self.backoff = min(self.backoff * 2, RESTART_BACKOFF_MAX)
+        elif now >= self.restart_at:
+            self.restart_at = None
+            self.restarts += 1
+            self.start()
+
+    def join(self, timeout):
+        self.process.join(timeout)
+        if self.process.is_alive():
+            print(f"⚠️  {self.label} did not stop in time, terminating")
+            self.process.terminate()
+            self.process.join()
+
+
+def run(feeds, sharded=False):
+    decoders_stop = mp.Event()
+    writers_stop = mp.Event()
+
+    if sharded:
+        targets = {feed["name"]: (shard_path(feed["name"]), mp.Queue(WRITER_QUEUE_BATCHES)) for feed in feeds}
+    else:
+        shared = (db_name, mp.Queue(WRITER_QUEUE_BATCHES))
+        targets = {feed["name"]: shared for feed in feeds}
+
+    writers = []
+    for i, (path, batches) in enumerate(dict.fromkeys(targets.values())):
+        port = METRICS_PORT + i if METRICS_PORT else 0
+        writers.append(ManagedProcess(
+            f"writer:{os.path.basename(path)}", writer_main, (path, batches, writers_stop, port),
+        ))
+    decoders = [
+        ManagedProcess(
+            f"decoder:{feed['name']}", decoder_main,
+            (feed["name"], feed["address"], targets[feed["name"]][1], decoders_stop, feed.get("socket")),
+        )
+        for feed in feeds
+    ]
+
+    for child in writers + decoders:
+        child.start()
+    print(f"🚀 Ingesting {len(decoders)} feed(s) into {len(writers)} database(s)")
+
+    try:
+        while True:
+            time.sleep(1.0)
+            for child in writers + decoders:
+                child.check()
+    except KeyboardInterrupt:
+        print("Terminating the stream...")
+    finally:
+        # Decoders first so their last batches reach the writers, then the writers drain.
+        # A second Ctrl+C must not cut this short and leave the writers running.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        decoders_stop.set()
+        for child in decoders:
+            child.join(timeout=10)
+        writers_stop.set()
+        for child in writers:
+            child.join(timeout=30)
+        restarts = sum(child.restarts for child in writers + decoders)
+        print(f"Stopped ({restarts} restart(s) during the session).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one decoder process per feed plus SQLite writer processes.")
+    parser.add_argument("--config", default=CONFIG_PATH, help="JSON feed list (see module docstring)")
+    parser.add_argument("--feed", action="append", metavar="NAME=ADDRESS", help="feed endpoint; overrides the config")
+    parser.add_argument("--sharded", action="store_true", help="one market_data_<feed>.db per feed")
+    args = parser.parse_args()
+
+    feeds, sharded = load_feeds(args.config)
+    if args.feed:
+        feeds = [dict(zip(("name", "address"), spec.split("=", 1))) for spec in args.feed]
+    run(feeds, sharded or args.sharded)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,19 @@
+import json
 import sqlite3
-import zmq
 import time
 import os
 import sys
 from datetime import datetime
-import json
+import queue
+import threading
+
+from tick_decoder import TickDecoder
+import ingest_metrics as metrics
+from last_value_cache import LastValueCache
+from feed_recorder import FeedRecorder
+from tcp_pipe import FEED_ADDRESS, TCP_pipe
+from db_schema import ensure_market_schema, now_epoch_ms
+from session_rollover import SessionRollover
 
 # Get the directory of the current script
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -15,77 +24,69 @@ base_dir = os.path.abspath(os.path.join(current_dir, ".."))
 # Add the directory containing 'paths' to sys.path
 sys.path.append(base_dir)
 
-# File to track the last run date
+# File to track the session day held in market_data (see session_rollover.py)
 DATE_TRACKER_FILE = os.path.join(base_dir, "last_run_date.txt") 
 
-# Database name with folder path
-db_name = os.path.join(current_dir, "market_data.db")
+# Database name with folder path (INGEST_DB_PATH points a benchmark/test run elsewhere)
+default_db_name = os.path.join(current_dir, "market_data.db")
+db_name = os.environ.get("INGEST_DB_PATH") or default_db_name
 
-def initialize_database(reset=False):
-    """Initialize the database. Drops table if reset=True."""
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
+# Memory-mapped last-value table mirroring market_data for other processes
+lvc_path = os.path.splitext(db_name)[0] + ".lvc"
 
-    if reset:
-        cursor.execute("DROP TABLE IF EXISTS market_data")
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS market_data (
-            timestamp TEXT,
-            exc_timestamp TEXT,
-            token INTEGER PRIMARY KEY,
-            instrument_token INTEGER,
-            trading_symbol TEXT,
-            ltp REAL,
-            bidprice REAL,
-            bidqty INTEGER,
-            askprice REAL,
-            askqty INTEGER,
-            volume INTEGER,
-            oi INTEGER,
-            oi_day_high INTEGER,
-            oi_day_low INTEGER
-        )
-    """)
+# Tick feed to subscribe to, and socket options on top of tcp_pipe.DEFAULT_SUB_OPTIONS,
+# e.g. TICK_SOCKET_OPTIONS='{"rcvhwm": 200000, "rcvbuf": 4194304}'
+feed_address = os.environ.get("TICK_FEED_ADDRESS") or FEED_ADDRESS
+SOCKET_OPTIONS = json.loads(os.environ.get("TICK_SOCKET_OPTIONS") or "{}")
 
-    conn.commit()
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_token ON market_data(token);")
-    conn.close()
+# When set, every raw message is also recorded under <dir>/<date>/ (see feed_recorder.py)
+RECORD_DIR = os.environ.get("TICK_RECORD_DIR") or None
 
-# Check last run date and decide if a reset is needed
-current_date = datetime.today().strftime('%Y_%m_%d')
+# Writer flushes when this many distinct tokens are pending ...
+BATCH_SIZE = 500
+# ... or when this many seconds have passed since the last flush
+FLUSH_INTERVAL = 0.5
+# While the writer has a backlog the token threshold doubles up to this, so a burst
+# is committed in a few large transactions instead of many small ones
+MAX_BATCH_SIZE = 50000
+# Socket drains (lists of raw messages) buffered between the receiver thread and the writer
+QUEUE_MAXSIZE = 1000
+# JSON backend for tick decoding: None picks the fastest installed (orjson, msgspec, json)
+JSON_BACKEND = os.environ.get("TICK_JSON_BACKEND") or None
 
-reset_db = False  # Default: Do not reset the DB
+# Local Prometheus /metrics endpoint (0 disables it)
+METRICS_PORT = int(os.environ.get("INGEST_METRICS_PORT", "9108"))
+# Print at most one sampled tick / parse error every this many seconds
+TICK_LOG_INTERVAL = 5.0
 
-if os.path.exists(DATE_TRACKER_FILE):
-    with open(DATE_TRACKER_FILE, 'r') as file:
-        last_run_date = file.read().strip()
-    if last_run_date != current_date:
-        reset_db = True  # Reset the DB since the date changed
-else:
-    reset_db = True  # No file exists, assume first run
+decoder = TickDecoder(JSON_BACKEND)
+tick_log = metrics.LogSampler(TICK_LOG_INTERVAL)
+error_log = metrics.LogSampler(TICK_LOG_INTERVAL)
 
-# Initialize the database (drop table if reset_db=True)
-initialize_database(reset=reset_db)
+def initialize_database(path=None):
+    """Initialize the database (schema v2, see db_schema.py). New sessions replace the
+    table through session_rollover.py, never here."""
+    path = path or db_name
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("BEGIN")
+    ensure_market_schema(conn)
 
-def to_float_or_none(value):
-    try:
-        return float(value) if value is not None else None
-    except:
-        return None
+    conn.execute("COMMIT")
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.close()
 
-def to_int_or_none(value):
-    try:
-        return int(value) if value is not None else None
-    except:
-        return None
+def tracker_path(path=None):
+    """Session tracker for a database; other databases (shards, test runs) keep theirs alongside."""
+    path = path or db_name
+    if os.path.abspath(path) == default_db_name:
+        return DATE_TRACKER_FILE
+    return os.path.splitext(path)[0] + "_last_run_date.txt"
 
 # Batch upsert function to efficiently insert or update database records
-def upsert_data_batch(conn, chunks):
+def upsert_data_batch(conn, chunks, table="market_data"):
     cursor = conn.cursor()
-    query = """
-    INSERT INTO market_data (
+    query = f"""
+    INSERT INTO {table} (
         timestamp, exc_timestamp, token, instrument_token, trading_symbol,
         ltp, bidprice, bidqty, askprice, askqty,
         volume, oi, oi_day_high, oi_day_low
@@ -112,83 +113,162 @@ def upsert_data_batch(conn, chunks):
     conn.commit()
     
 
-# Wrapper for ZeroMQ TCP communication
-class TCP_pipe:
-    def __init__(self, address="tcp://192.168.1.40:4801", mode="sub"):
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.SUB if mode == "sub" else zmq.PUB)
-        if mode == "sub":
-            self.socket.connect(address)
-            self.socket.setsockopt_string(zmq.SUBSCRIBE, "")
-        elif mode == "pub":
-            self.socket.bind(address)
-
-    def send(self, message):
-        self.socket.send_string(message)
-
-    def poll(self, timeout=1000):
-        poller = zmq.Poller()
-        poller.register(self.socket, zmq.POLLIN)
-        socks = dict(poller.poll(timeout))
-        return socks.get(self.socket) == zmq.POLLIN
-
-    def recv(self):
-        message = self.socket.recv_string()
-        return message.strip().split("\n")
-
-    def close(self):
-        self.socket.close()
-        self.context.term()
+# Receiver stage: drain the socket as fast as possible and hand raw messages to the writer.
+# An exception stops the writer too: it is logged, kept in `failures` and stop_event is set.
+def receive_stream(datastream, raw_queue, stop_event, recorder=None, failures=None):
+    try:
+        while not stop_event.is_set():
+            messages = datastream.drain(timeout=100)
+            if messages:
+                metrics.drain_size.observe(len(messages))
+                if recorder is not None:
+                    for raw in messages:
+                        recorder.append(raw)
+                raw_queue.put(messages)
+            elif recorder is not None:
+                recorder.flush_if_due()
+    except Exception as e:
+        print(f"❌ Receiver stopped: {e!r}")
+        metrics.receiver_errors_total.inc()
+        if failures is not None:
+            failures.append(e)
+        stop_event.set()
+
+# Parse one raw ZMQ message (newline-separated JSON bytes) into market_data rows
+def parse_message(raw):
+    parsed_batch, errors, line_count = decoder.decode_message(raw)
+    metrics.messages_total.inc()
+    metrics.lines_total.inc(line_count)
+
+    if parsed_batch:
+        skipped = tick_log.sample()
+        if skipped is not None:
+            print(f"{parsed_batch[-1]} (+{skipped} messages since last sample)")
+    if errors:
+        metrics.parse_errors_total.inc(len(errors))
+        skipped = error_log.sample()
+        if skipped is not None:
+            line, e = errors[-1]
+            print(f"Error parsing tick: {line}, error: {e} ({len(errors)} in message, +{skipped} suppressed)")
+    return parsed_batch
+
+# Publish lag of the newest exchange_timestamp in a flushed batch against wall clock
+def record_exchange_lag(rows):
+    newest = max((row[1] for row in rows if row[1]), default=None)
+    if newest is None:
+        return
+    # exc_timestamp is exchange wall-clock epoch ms; compare against local wall clock
+    lag = (now_epoch_ms() - newest) / 1000
+    metrics.last_exchange_timestamp.set(time.time() - lag)
+    metrics.exchange_lag_seconds.set(lag)
 
 # Extract data from the stream and update the database
-def extract_ltp_from_stream_to_db():
-    datastream = TCP_pipe()
+def extract_ltp_from_stream_to_db(stop=None):
+    """Run until interrupted, or until the optional `stop` event is set."""
+    # A new session (also one that started while we were down) is rolled over in the
+    # loop below, with the previous day's table staying readable until then
+    initialize_database()
+
+    datastream = TCP_pipe(feed_address, options=SOCKET_OPTIONS)
     conn = sqlite3.connect(db_name)
-    batch_data = []
-    batch_size = 100
+    lvc = LastValueCache(lvc_path, writer=True)
+    rollover = SessionRollover(db_name, tracker_path(), lvc)
+    recorder = None
+    if RECORD_DIR:
+        recorder = FeedRecorder(os.path.join(RECORD_DIR, datetime.today().strftime('%Y-%m-%d')))
+        print(f"🎙 Recording raw feed to {recorder.directory}")
+    raw_queue = queue.Queue(maxsize=QUEUE_MAXSIZE)
+    stop_event = threading.Event()
+    receiver_failures = []
+    receiver = threading.Thread(
+        target=receive_stream, args=(datastream, raw_queue, stop_event, recorder, receiver_failures), daemon=True
+    )
+
+    # Pending rows keyed by token: only the latest tick per token is upserted on flush
+    batch_data = {}
+    batch_size = BATCH_SIZE
+    last_flush = time.monotonic()
+
+    def flush():
+        nonlocal last_flush
+        if batch_data:
+            rows = list(batch_data.values())
+            start = time.perf_counter()
+            upsert_data_batch(conn, rows, rollover.table)
+            metrics.flush_seconds.observe(time.perf_counter() - start)
+            metrics.batch_size.observe(len(rows))
+            metrics.rows_written_total.inc(len(rows))
+            if rollover.staging:
+                rollover.switch(conn, rows)
+            else:
+                lvc.update(rows)
+            record_exchange_lag(rows)
+            batch_data.clear()
+        last_flush = time.monotonic()
+
+    metrics_server = metrics.start_metrics_server(METRICS_PORT) if METRICS_PORT else None
 
     try:
-        while True:
-            if datastream.poll():
-                tick = datastream.recv()
-                parsed_batch = []
-                for line in tick:
-                    try:
-                        data = json.loads(line)
-                        print(data)
-                        #exit(0)
-                        parsed_batch.append((
-                            data.get("last_trade_time") or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                            data.get("exchange_timestamp") or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                            int(data["exchange_token"]),
-                            int(data["instrument_token"]),
-                            data.get("trading_symbol"),
-                            to_float_or_none(data.get("last_price")),
-                            to_float_or_none(data.get("bid_depth", [{}])[0].get("price")),
-                            to_int_or_none(data.get("bid_depth", [{}])[0].get("quantity")),
-                            to_float_or_none(data.get("ask_depth", [{}])[0].get("price")),
-                            to_int_or_none(data.get("ask_depth", [{}])[0].get("quantity")),
-                            to_float_or_none(data.get("volume")),
-                            to_int_or_none(data.get("oi")),
-                            to_int_or_none(data.get("oi_day_high")),
-                            to_int_or_none(data.get("oi_day_low"))
-                        ))
-                    except Exception as e:
-                        print(f"Error parsing tick: {line}, error: {e}")
-
-                if parsed_batch:
-                    upsert_data_batch(conn, parsed_batch)
+        receiver.start()
+        while stop is None or not stop.is_set():
+            if receiver_failures:
+                # Nothing more will arrive; the final flush below still writes what did
+                raise RuntimeError(f"receiver thread failed: {receiver_failures[0]!r}") from receiver_failures[0]
+            if rollover.due():
+                # Last rows of the old session go to the old table
+                flush()
+                rollover.begin(conn)
+            try:
+                messages = raw_queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                messages = ()
+
+            for raw in messages:
+                for row in parse_message(raw):
+                    batch_data[row[2]] = row
+
+            # Adaptive batching: commit less often while drains are queueing up behind us,
+            # fall back to the base size once caught up
+            backlog = raw_queue.qsize()
+            if backlog:
+                batch_size = min(batch_size * 2, MAX_BATCH_SIZE)
+            else:
+                batch_size = max(BATCH_SIZE, batch_size // 2)
+            metrics.queue_depth.set(backlog)
+            metrics.batch_target.set(batch_size)
+
+            if len(batch_data) >= batch_size or time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                flush()
 
     except KeyboardInterrupt:
         print("Terminating the stream...")
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
+        stop_event.set()
+        receiver.join(timeout=2)
+        # Drain anything the receiver already accepted before the final flush
+        while True:
+            try:
+                messages = raw_queue.get_nowait()
+            except queue.Empty:
+                break
+            for raw in messages:
+                for row in parse_message(raw):
+                    batch_data[row[2]] = row
         if batch_data:
-            upsert_data_batch(conn, batch_data)
-            print(f"Final batch of {len(batch_data)} rows processed.")
+            final_rows = len(batch_data)
+            flush()
+            print(f"Final batch of {final_rows} rows processed.")
+        if metrics_server:
+            metrics_server.shutdown()
         datastream.close()
         conn.close()
+        lvc.close()
+        rollover.close()
+        if recorder is not None:
+            recorder.close()
+            print(f"🎙 Recorded {recorder.messages} messages.")
 
 if __name__ == "__main__":
     extract_ltp_from_stream_to_db()
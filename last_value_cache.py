@@ -0,0 +1,186 @@
+import os
+import time
+
+import numpy as np
+
+# Fixed-layout last-value table of the live chain, kept in a memory-mapped file so
+# other processes can read it as zero-copy NumPy views without touching SQLite.
+#
+# File layout: 64-byte header (8 x int64) followed by `capacity` records of RECORD_DTYPE.
+# The writer bumps `seq` to an odd value before touching records and back to even
+# afterwards (seqlock); readers retry until they see the same even value on both sides.
+#
+# The header also names the trading session the records mirror (date ordinal, 0: none)
+# and whether they hold every row of that session's market_data table. The writer
+# reloads the table at startup and at each rollover (session_rollover.py), so a reader
+# that finds both set for its session never needs to open market_data.db.
+
+MAGIC = 0x4F49_4C56_4332  # "OILVC2"
+HEADER_SLOTS = 8
+HEADER_BYTES = HEADER_SLOTS * 8
+H_MAGIC, H_CAPACITY, H_COUNT, H_SEQ, H_UPDATED_NS, H_SESSION, H_COMPLETE = range(7)
+
+DEFAULT_CAPACITY = 20000
+NULL_INT = -1
+SYMBOL_BYTES = 32
+
+RECORD_DTYPE = np.dtype([
+    ("token", "<i8"),
+    ("instrument_token", "<i8"),
+    ("trading_symbol", f"S{SYMBOL_BYTES}"),
+    ("timestamp", "<i8"),       # last_trade_time, epoch ms (see db_schema.py)
+    ("exc_timestamp", "<i8"),   # exchange_timestamp, epoch ms
+    ("ltp", "<f8"),
+    ("bidprice", "<f8"),
+    ("bidqty", "<i8"),
+    ("askprice", "<f8"),
+    ("askqty", "<i8"),
+    ("volume", "<f8"),
+    ("oi", "<i8"),
+    ("oi_day_high", "<i8"),
+    ("oi_day_low", "<i8"),
+])
+
+
+def _f(value):
+    return np.nan if value is None else value
+
+def _i(value):
+    return NULL_INT if value is None else value
+
+
+class LastValueCache:
+    """token -> latest tick, backed by a memory-mapped file.
+
+    Open with writer=True in the ingestor (creates the file if needed); every other
+    process opens it read-only and uses view()/snapshot()/read().
+    """
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY, writer=False):
+        self.path = path
+        self.writer = writer
+        size = HEADER_BYTES + capacity * RECORD_DTYPE.itemsize
+
+        if writer:
+            fresh = not os.path.exists(path) or os.path.getsize(path) != size
+            if fresh:
+                with open(path, "wb") as f:
+                    f.truncate(size)
+            self._mm = np.memmap(path, dtype=np.uint8, mode="r+", shape=(size,))
+        else:
+            self._mm = np.memmap(path, dtype=np.uint8, mode="r")
+
+        self.header = np.ndarray((HEADER_SLOTS,), dtype="<i8", buffer=self._mm, offset=0)
+        if writer and (fresh or self.header[H_MAGIC] != MAGIC):
+            self.header[:] = 0
+            self.header[H_CAPACITY] = capacity
+            self.header[H_MAGIC] = MAGIC
+        if self.header[H_MAGIC] != MAGIC:
+            raise ValueError(f"{path} is not a last-value cache file")
+
+        self.capacity = int(self.header[H_CAPACITY])
+        self.records = np.ndarray((self.capacity,), dtype=RECORD_DTYPE, buffer=self._mm, offset=HEADER_BYTES)
+
+        # Writer-side token -> slot index, rebuilt from whatever is already in the file
+        self._slots = {}
+        if writer:
+            count = int(self.header[H_COUNT])
+            self._slots = {int(t): i for i, t in enumerate(self.records["token"][:count])}
+        self._full_warned = False
+
+    # ---- writer ----
+
+    def update(self, rows):
+        """Apply market_data rows (the 14-column tuples written by upsert_data_batch)."""
+        header = self.header
+        records = self.records
+        slots = self._slots
+        count = int(header[H_COUNT])
+
+        header[H_SEQ] += 1  # odd: write in progress
+        try:
+            for (ts, exc_ts, token, instrument_token, symbol, ltp, bidprice, bidqty,
+                 askprice, askqty, volume, oi, oi_day_high, oi_day_low) in rows:
+                slot = slots.get(token)
+                if slot is None:
+                    if count >= self.capacity:
+                        header[H_COMPLETE] = 0
+                        if not self._full_warned:
+                            print(f"⚠️  Last-value cache full ({self.capacity} tokens); new tokens are not cached.")
+                            self._full_warned = True
+                        continue
+                    slot = slots[token] = count
+                    count += 1
+                records[slot] = (
+                    token, _i(instrument_token), (symbol or "").encode()[:SYMBOL_BYTES],
+                    _i(ts), _i(exc_ts),
+                    _f(ltp), _f(bidprice), _i(bidqty), _f(askprice), _i(askqty),
+                    _f(volume), _i(oi), _i(oi_day_high), _i(oi_day_low),
+                )
+            header[H_COUNT] = count
+            header[H_UPDATED_NS] = time.time_ns()
+        finally:
+            header[H_SEQ] += 1  # even: consistent
+
+    def clear(self):
+        """Drop every cached token."""
+        self.header[H_SEQ] += 1
+        self.header[H_COUNT] = 0
+        self.header[H_SESSION] = 0
+        self.header[H_COMPLETE] = 0
+        self._slots.clear()
+        self.header[H_SEQ] += 1
+
+    def reset(self, session, rows):
+        """Mirror a whole market_data table: its session day (or None) and all its rows."""
+        self.clear()
+        self.header[H_COMPLETE] = 1
+        self.update(rows)
+        self.header[H_SEQ] += 1
+        self.header[H_SESSION] = session.toordinal() if session else 0
+        self.header[H_SEQ] += 1
+
+    def flush(self):
+        self._mm.flush()
+
+    # ---- readers ----
+
+    @property
+    def count(self):
+        return int(self.header[H_COUNT])
+
+    @property
+    def updated_at(self):
+        return self.header[H_UPDATED_NS] / 1e9
+
+    def mirrors(self, session):
+        """True if the records hold every market_data row of trading day `session`."""
+        header = self.header
+        return bool(header[H_COMPLETE]) and int(header[H_SESSION]) == session.toordinal()
+
+    def view(self):
+        """Zero-copy view of the populated records. May be torn while the writer is active."""
+        return self.records[:self.count]
+
+    def read(self, fn, max_spins=10000):
+        """Run fn(view) under the seqlock and return its result once it saw a consistent table."""
+        header = self.header
+        for _ in range(max_spins):
+            seq = int(header[H_SEQ])
+            if seq & 1:
+                time.sleep(0)
+                continue
+            result = fn(self.records[:int(header[H_COUNT])])
+            if int(header[H_SEQ]) == seq:
+                return result
+        raise TimeoutError("last-value cache kept changing while reading")
+
+    def snapshot(self):
+        """Consistent copy of the populated records."""
+        return self.read(np.copy)
+
+    def close(self):
+        if self.writer:
+            self._mm.flush()
+        # The mapping is released once no views into it remain
+        self.header = self.records = self._mm = None
@@ -1,317 +1,289 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
-import re
 import datetime
-import plotly.graph_objects as go
-from collections import defaultdict
 import numpy as np
 
-st.set_page_config(layout="wide")
-st.title("📊 OI Change Visualizer")
+from chart_builder import build_oi_chart
+from oi_engine import bucket_time, sort_expiries, time_to_ms
+from oi_matrix import ChainMatrix
+from snapshot_queries import day_bounds_for, latest_day_bounds, snapshot_days
+from snapshot_store import SnapshotStore
+from stage_timer import PROFILE_STAGES, StageTimer
 
-# Load snapshot data
+# Past days archived to Parquet (archive.py); needs pyarrow
+try:
+    import archive
+except ImportError:
+    archive = None
 
-def load_data(path):
-    conn = sqlite3.connect(path)
-    df = pd.read_sql_query("SELECT snapshot_time as timestamp, trading_symbol, oi FROM oi_snapshot", conn)
-    conn.close()
-    return df
+st.set_page_config(layout="wide")
+st.title("📊 OI Change Visualizer")
 
 db_path = "snapshot_data.db"
-df = load_data(db_path)
-
-# Clean timestamp
-df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-df = df.dropna(subset=['timestamp', 'trading_symbol', 'oi'])
-df['oi'] = pd.to_numeric(df['oi'], errors='coerce')
-df = df.dropna(subset=['oi'])
-
-# Extract symbol, expiry, strike, type
-def extract_parts(symbol):
-    # Determine option type
-    opt_type = 'CE' if 'CE' in symbol else 'PE' if 'PE' in symbol else 'FUT'
-    clean_symbol = symbol.replace('CE', '').replace('PE', '').replace('FUT', '')
-
-    # Case 1: MDD format (like SENSEX2580588500 → SYMBOL + YY + MDD + STRIKE)
-    match_mdd_strike = re.match(r'^([A-Z]+)(\d{2})(\d)(\d{2})(\d+)$', clean_symbol)
-    if match_mdd_strike:
-        root = match_mdd_strike.group(1)        # e.g., SENSEX
-        # year = match_mdd_strike.group(2)      # optional
-        month = int(match_mdd_strike.group(3))  # M
-        day = int(match_mdd_strike.group(4))    # DD
-        strike = int(match_mdd_strike.group(5)) # Strike
-        expiry = f"{day:02d}-{month:02d}"       # Format: DD-MM
-        return root, expiry, strike, opt_type
-
-    # Case 2: BANKEX25AUG65500 → SYMBOL + DD + MMM + STRIKE
-    match_ddmmm_strike = re.match(r'^([A-Z]+)(\d{2})([A-Z]{3})(\d+)$', clean_symbol)
-    if match_ddmmm_strike:
-        root = match_ddmmm_strike.group(1)
-        day = int(match_ddmmm_strike.group(2))
-        month_str = match_ddmmm_strike.group(3).title()
-        strike = int(match_ddmmm_strike.group(4))
-        expiry = f"{day:02d}-{month_str}"
-        return root, expiry, strike, opt_type
-
-    # Case 3: CRUDEOILM25JUL → SYMBOL + DD + MMM (no strike)
-    match_ddmmm = re.match(r'^([A-Z]+)(\d{2})([A-Z]{3})$', clean_symbol)
-    if match_ddmmm:
-        root = match_ddmmm.group(1)
-        day = int(match_ddmmm.group(2))
-        month_str = match_ddmmm.group(3).title()
-        expiry = f"{day:02d}-{month_str}"
-        return root, expiry, None, opt_type
-
-    # Default return if no match
-    return None, None, None, opt_type
-
-df[['symbol', 'expiry', 'strike', 'type']] = df['trading_symbol'].apply(lambda x: pd.Series(extract_parts(x)))
-df = df.dropna(subset=['symbol', 'expiry', 'strike'])
 
-# Filters
-symbols = sorted(df['symbol'].unique())
-
-col1, col2 = st.columns([1, 1])
-with col1:
-    selected_symbol = st.selectbox("Select Symbol", symbols)
-expiries = sorted(
-    df[df['symbol'] == selected_symbol]['expiry'].dropna().unique(),
-    key=lambda x: pd.to_datetime(x, format='%d-%m') if re.match(r'\d{2}-\d{2}', x) else pd.to_datetime(x, format='%d-%b')
-)
-with col2:
-    selected_expiry = st.selectbox("Select Expiry", expiries)
+# One store for every session in this process: each chain's day is read from SQLite
+# once and pivoted into a (time × instrument) matrix, new snapshots are folded into it
+# as they land, and slider moves below are NumPy lookups on it (see snapshot_store.py)
+@st.cache_resource(show_spinner=False)
+def get_store(path):
+    return SnapshotStore(path)
+
+store = get_store(db_path)
+# Where this rerun spends its time; shown in the Performance panel under the chart
+page_timings = StageTimer(profile=st.session_state.get("profile_stages", PROFILE_STAGES))
+try:
+    with page_timings.stage("days"), store.pool.connection() as conn:
+        live_days = snapshot_days(conn)
+        latest_bounds = latest_day_bounds(conn)
+except RuntimeError as e:
+    st.error(str(e))
+    st.stop()
 
+# Archived days are immutable files; the archive version only changes on re-archiving
+@st.cache_data(show_spinner=False, max_entries=16)
+def get_archived_catalog(archive_version, day):
+    return archive.load_archived_catalog(day)
 
-filtered = df[(df['symbol'] == selected_symbol) & (df['expiry'] == selected_expiry)]
-filtered['rounded_time'] = filtered['timestamp'].dt.floor('3min')
-filtered = filtered.dropna(subset=['rounded_time'])
+@st.cache_resource(show_spinner=False, max_entries=32)
+def get_archived_chain_matrix(archive_version, day, symbol, expiry):
+    return ChainMatrix.from_frame(archive.load_archived_chain(day, symbol, expiry))
 
-available_times = sorted(filtered['rounded_time'].dt.time.unique())
-if not available_times:
-    st.error("No available times in the data for selected symbol/expiry.")
+archived_days = archive.archived_days() if archive is not None else []
+available_days = sorted(set(live_days) | set(archived_days))
+if not available_days:
+    st.error("No snapshots found in the database yet.")
     st.stop()
 
-min_time = available_times[0]
-max_time = available_times[-1]
-
-# Time Range Slider
-t1, t2 = st.slider(
-    "Select Time Range (T1 and T2)",
-    min_value=min_time, max_value=max_time,
-    value=(min_time, max_time),
-    step=datetime.timedelta(minutes=3),
-    format="HH:mm"
+selected_day = st.date_input(
+    "Date", value=available_days[-1], min_value=available_days[0], max_value=available_days[-1]
 )
-
-# Map: time → {trading_symbol → oi}
-time_oi_map = defaultdict(dict)
-for row in filtered.itertuples():
-    time = row.rounded_time.time()
-    time_oi_map[time][row.trading_symbol] = row.oi
-
-def find_nearest_time(time_dict, target, find_min=True):
-    time_keys = sorted(time_dict.keys())
-    for t in time_keys if find_min else reversed(time_keys):
-        if (t >= target if find_min else t <= target):
-            return t
-    return None
-
-t1_key = find_nearest_time(time_oi_map, t1, find_min=True)
-t2_key = find_nearest_time(time_oi_map, t2, find_min=False)
-
-if not t1_key or not t2_key:
-    st.warning("No data available for selected time range.")
+if selected_day not in available_days:
+    st.warning(f"No snapshots for {selected_day:%d %b %Y}.")
     st.stop()
 
-t1_data = time_oi_map[t1_key]
-t2_data = time_oi_map[t2_key]
-# Collect all strikes available in t1 and t2 data
-strike_set = set()
-for symbol in set(t1_data.keys()).union(set(t2_data.keys())):
-    _, _, strike, opt_type = extract_parts(symbol)
-    if strike is not None:
-        strike_set.add(strike)
-
-if not strike_set:
-    st.warning("No strike values found in the selected time range.")
-    st.stop()
+day_bounds = day_bounds_for(selected_day)
+# Days still in the live database are read from it; older ones from their Parquet file
+from_archive = selected_day not in live_days
+is_latest_day = day_bounds == latest_bounds
 
-min_strike = int(min(strike_set))
-max_strike = int(max(strike_set))
+with page_timings.stage("catalog"):
+    if from_archive:
+        catalog = get_archived_catalog(archive.archive_version(selected_day), selected_day)
+    else:
+        catalog = store.catalog(day_bounds)
 
-# Add Strike Range Slider
-st1, st2 = st.slider(
-    "Select Strike Range",
-    min_value=min_strike,
-    max_value=max_strike,
-    value=(min_strike, max_strike),
-    step=100
-)
+# Filters
+symbols = sorted(catalog['symbol'].unique())
 
-# Build comparison: {(strike, type): (t1_oi, t2_oi)}
-# Build comparison: {(strike, type): (t1_oi, t2_oi)}
-comparison = {}
-all_symbols = set(t1_data.keys()).union(set(t2_data.keys()))
-for symbol in all_symbols:
-    try:
-        _, _, strike, opt_type = extract_parts(symbol)
-
-        # ✅ Filter based on selected strike range
-        if strike is not None and st1 <= strike <= st2:
-            t1_oi = t1_data.get(symbol, 0)
-            t2_oi = t2_data.get(symbol, 0)
-            comparison[(strike, opt_type)] = (t1_oi, t2_oi)
-    except:
-        continue
-
-# ✅ Optional: Show info message if only one strike is selected
-if st1 == st2:
-    st.info(f"Only one strike ({st1}) selected. Try widening the range for a better view.")
-
-
-# Process data according to your exact conditions
-def process_oi_data(comparison_data):
-    """Process data according to exact conditions specified"""
-    chart_data = []
-    
-    for (strike, opt_type), (t1_oi, t2_oi) in comparison_data.items():
-        chart_data.append({
-            'strike': strike,
-            'type': opt_type,
-            't1_oi': t1_oi,
-            't2_oi': t2_oi,
-            'condition': 'decrease' if t1_oi >= t2_oi else 'increase'
-        })
-    
-    return sorted(chart_data, key=lambda x: x['strike'])
-
-chart_data = process_oi_data(comparison)
-
-# Create Chart with exact conditions
-fig = go.Figure()
-
-# Color mapping
-colors = {'CE': '#22c55e', 'PE': '#ef4444'}  # Green for CE, Red for PE
-
-# Track legend items to avoid duplicates
-legend_added = {
-    'call_filled': False,
-    'put_filled': False,
-    'call_striped': False,
-    'put_striped': False,
-    'call_hollow': False,
-    'put_hollow': False
-}
-
-for item in chart_data:
-    strike = item['strike']
-    opt_type = item['type']
-    t1_oi = item['t1_oi']
-    t2_oi = item['t2_oi']
-    color = colors[opt_type]
-    
-    # Position for CE/PE side by side
-    x_pos = f"{strike}_{opt_type}"
-    
-    # CONDITION 1: t1_oi >= t2_oi (OI Decrease)
-    if t1_oi >= t2_oi and t1_oi != 0 and t2_oi != 0:
-        # 1. Generate empty bar of t1_oi size (hollow with colored border)
-        fig.add_trace(go.Bar(
-            x=[x_pos],
-            y=[t1_oi],
-            name=f"{'Call' if opt_type == 'CE' else 'Put'} Decrease",
-            marker=dict(
-                color='rgba(0,0,0,0)',  # Transparent fill
-                line=dict(color=color, width=2)  # Colored border
-            ),
-            showlegend=not legend_added[f"{'call' if opt_type == 'CE' else 'put'}_hollow"],
-            hovertemplate=f"<b>{strike} {opt_type}</b><br>" +
-                         f"T1: {t1_oi}<br>" +
-                         f"T2: {t2_oi}<br>" +
-                         f"Decrease: -{t1_oi - t2_oi}<br>" +
-                         "<extra></extra>"
-        ))
-        legend_added[f"{'call' if opt_type == 'CE' else 'put'}_hollow"] = True
-        
-        # 2. Fill the empty bar till t2_oi with striped pattern
-        if t2_oi > 0:
-            fig.add_trace(go.Bar(
-            x=[x_pos],
-            y=[t2_oi],
-            name=f"{'Call' if opt_type == 'CE' else 'Put'} OI",
-            marker_color=color,
-            showlegend=not legend_added[f"{'call' if opt_type == 'CE' else 'put'}_filled"],
-            hovertemplate=f"<b>{strike} {opt_type}</b><br>" +
-                         f"T1: {t1_oi}<br>" +
-                         f"T2: {t2_oi}<br>" +
-                         f"Base OI: {t2_oi}<br>" +
-                         "<extra></extra>"
-        ))
-        legend_added[f"{'call' if opt_type == 'CE' else 'put'}_filled"] = True
-    
-    # CONDITION 2: t1_oi < t2_oi (OI Increase)
-    else:
-        # 1. Generate completely filled bar of t2_oi size
-        fig.add_trace(go.Bar(
-            x=[x_pos],
-            y=[t1_oi],
-            name=f"{'Call' if opt_type == 'CE' else 'Put'} OI",
-            marker_color=color,
-            showlegend=not legend_added[f"{'call' if opt_type == 'CE' else 'put'}_filled"],
-            hovertemplate=f"<b>{strike} {opt_type}</b><br>" +
-                         f"T1: {t1_oi}<br>" +
-                         f"T2: {t2_oi}<br>" +
-                         f"Base OI: {t2_oi}<br>" +
-                         "<extra></extra>"
-        ))
-        legend_added[f"{'call' if opt_type == 'CE' else 'put'}_filled"] = True
-        
-        # 2. Add the difference (t2_oi - t1_oi) on top with striped pattern
-        diff = t2_oi - t1_oi
-        if diff > 0:
-            fig.add_trace(go.Bar(
-                x=[x_pos],
-                y=[diff],
-                base=[t1_oi],  # Stack on top of the filled bar
-                name=f"{'Call' if opt_type == 'CE' else 'Put'} Increase",
-                marker=dict(
-                    color=color,
-                    pattern=dict(
-                        shape="/",  # Diagonal stripes
-                        bgcolor="rgba(255,255,255,0.3)",
-                        fgcolor=color,
-                        size=6
-                    )
-                ),
-                showlegend=not legend_added[f"{'call' if opt_type == 'CE' else 'put'}_striped"],
-                hovertemplate=f"<b>{strike} {opt_type}</b><br>" +
-                             f"Increase: +{diff}<br>" +
-                             f"T1: {t1_oi} → T2: {t2_oi}<br>" +
-                             "<extra></extra>"
-            ))
-            legend_added[f"{'call' if opt_type == 'CE' else 'put'}_striped"] = True
-
-chart_data = process_oi_data(comparison)
-
-# Update layout
-fig.update_layout(
-    title=f"<b>{selected_symbol} OI Change Analysis</b><br>" +
-          f"<sub>From {t1_key.strftime('%H:%M')} to {t2_key.strftime('%H:%M')} on {selected_expiry}</sub>",
-    xaxis_title="Strikes",
-    yaxis_title="Call / Put OI",
-    height=700,
-    bargap=0.3,
-    barmode='overlay',
-    xaxis=dict(
-        tickangle=-45,
-        categoryorder='category ascending'
-    ),
-    showlegend=False,
-    hovermode='closest'
-)
+col1, col2 = st.columns([1, 1])
+with col1:
+    selected_symbol = st.selectbox("Select Symbol", symbols)
+expiries = sort_expiries(catalog[catalog['symbol'] == selected_symbol]['expiry'].dropna().unique())
+with col2:
+    selected_expiry = st.selectbox("Select Expiry", expiries)
 
-st.plotly_chart(fig, use_container_width=True)
+# Live mode re-runs only the chart fragment below on a timer, pulling just the
+# snapshots that landed since the previous run
+live_col1, live_col2 = st.columns([1, 1])
+with live_col1:
+    live = st.toggle(
+        "Live", disabled=not is_latest_day,
+        help="Follow new snapshots as they land; T2 stays on the latest one. Only for the newest day.",
+    ) and is_latest_day
+with live_col2:
+    refresh_seconds = st.number_input("Refresh every (s)", min_value=5, max_value=600, value=30, step=5, disabled=not live)
+
+def read_chain_matrix(symbol, expiry, live, timings):
+    if live:
+        with store.pool.connection() as conn:
+            new_day = latest_day_bounds(conn) != day_bounds
+        if new_day:
+            # A new trading day started, so the catalog above is stale as well
+            st.rerun()
+    # The shared matrix and precomputed analytics (chain_analytics.py), both brought up
+    # to the latest snapshot by whichever session asks first
+    return store.chain(day_bounds, symbol, expiry, timings)
+
+def stats_at(stats, bucket_ms):
+    # The chain's analytics row as of a snapshot time (carried forward), or None
+    pos = stats['snapshot_time'].searchsorted(bucket_ms, side='right') - 1
+    return stats.iloc[pos] if pos >= 0 else None
+
+def draw_summary(stats, t1_ms, t2_ms):
+    row1, row2 = stats_at(stats, t1_ms), stats_at(stats, t2_ms)
+    if row2 is None:
+        return
+
+    def delta(column, fmt="{:+,.0f}"):
+        # Change since T1
+        if row1 is None or pd.isna(row1[column]) or pd.isna(row2[column]):
+            return None
+        return fmt.format(row2[column] - row1[column])
+
+    def value(column, fmt="{:,.0f}"):
+        return "–" if pd.isna(row2[column]) else fmt.format(row2[column])
+
+    cols = st.columns(6)
+    cols[0].metric("Call OI", value('call_oi'), delta('call_oi'))
+    cols[1].metric("Put OI", value('put_oi'), delta('put_oi'))
+    cols[2].metric("PCR", value('pcr', "{:.2f}"), delta('pcr', "{:+.2f}"))
+    cols[3].metric("Max Pain", value('max_pain_strike', "{:.0f}"))
+    cols[4].metric("Max Call OI Strike", value('max_call_oi_strike', "{:.0f}"))
+    cols[5].metric("Max Put OI Strike", value('max_put_oi_strike', "{:.0f}"))
+
+def draw_trends(stats):
+    with st.expander("Intraday trend"):
+        trend = stats.assign(time=pd.to_datetime(stats['snapshot_time'], unit='ms')).set_index('time')
+        col1, col2 = st.columns(2)
+        with col1:
+            st.caption("Total OI")
+            st.line_chart(trend[['call_oi', 'put_oi']].rename(columns={'call_oi': 'Call OI', 'put_oi': 'Put OI'}),
+                          color=["#22c55e", "#ef4444"])
+        with col2:
+            st.caption("PCR and max pain")
+            st.line_chart(trend[['pcr']].rename(columns={'pcr': 'PCR'}))
+            st.line_chart(trend[['max_pain_strike']].rename(columns={'max_pain_strike': 'Max pain'}))
+
+def draw_performance(page_timings, chart_timings):
+    with st.expander("Performance"):
+        rows = [
+            (part, "· " * depth + name, ms)
+            for part, timings in (("page", page_timings), ("chart", chart_timings))
+            for name, depth, ms in timings.rows()
+        ]
+        st.dataframe(
+            pd.DataFrame(rows, columns=["part", "stage", "ms"]),
+            hide_index=True, column_config={"ms": st.column_config.NumberColumn(format="%.1f")},
+        )
+        # The chart is a fragment: live refreshes re-run only it, so the page row can be older
+        st.caption(f"Page {page_timings.total_ms:.0f} ms (last full rerun) · chart {chart_timings.total_ms:.0f} ms")
+        st.toggle("Profile with cProfile", key="profile_stages", value=PROFILE_STAGES,
+                  help="Capture a cProfile of the stages above from the next rerun on.")
+        for part, timings in (("Page", page_timings), ("Chart", chart_timings)):
+            report = timings.profile_report()
+            if report:
+                st.caption(part)
+                st.code(report, language=None)
+
+def draw_chain(matrix, stats, symbol, expiry, live, timings):
+    available_times = [bucket_time(t) for t in matrix.times]
+    if not available_times:
+        st.error("No available times in the data for selected symbol/expiry.")
+        return
+
+    min_time = available_times[0]
+    max_time = available_times[-1]
+
+    if live:
+        # T2 is pinned to the latest snapshot; only T1 is picked
+        t2 = max_time
+        if min_time < max_time:
+            t1 = st.slider(
+                "Select T1 (T2 follows the latest snapshot)",
+                min_value=min_time, max_value=max_time,
+                value=min_time,
+                step=datetime.timedelta(minutes=3),
+                format="HH:mm"
+            )
+        else:
+            t1 = min_time
+    else:
+        # Time Range Slider
+        t1, t2 = st.slider(
+            "Select Time Range (T1 and T2)",
+            min_value=min_time, max_value=max_time,
+            value=(min_time, max_time),
+            step=datetime.timedelta(minutes=3),
+            format="HH:mm"
+        )
+
+    with timings.stage("select"):
+        i1 = matrix.nearest_index(time_to_ms(day_bounds, t1), find_min=True)
+        i2 = matrix.nearest_index(time_to_ms(day_bounds, t2), find_min=False)
+
+    if i1 is None or i2 is None:
+        st.warning("No data available for selected time range.")
+        return
+
+    t1_key = available_times[i1]
+    t2_key = available_times[i2]
+
+    if stats is not None and not stats.empty:
+        with timings.stage("summary"):
+            draw_summary(stats, matrix.times[i1], matrix.times[i2])
+
+    # Collect all strikes available in t1 and t2 data
+    strikes_present = matrix.strikes[matrix.present(i1, i2)]
+
+    if not len(strikes_present):
+        st.warning("No strike values found in the selected time range.")
+        return
+
+    min_strike = int(strikes_present.min())
+    max_strike = int(strikes_present.max())
+
+    # Add Strike Range Slider
+    st1, st2 = st.slider(
+        "Select Strike Range",
+        min_value=min_strike,
+        max_value=max_strike,
+        value=(min_strike, max_strike),
+        step=100
+    )
+
+    # Build comparison: (strike, type) → (t1_oi, t2_oi) as parallel arrays
+    with timings.stage("compare"):
+        strikes, types, t1_oi, t2_oi = matrix.compare(i1, i2, st1, st2)
+
+    # ✅ Optional: Show info message if only one strike is selected
+    if st1 == st2:
+        st.info(f"Only one strike ({st1}) selected. Try widening the range for a better view.")
+
+
+    # Fixed set of six traces (call/put × hollow/filled/striped), see chart_builder.py
+    with timings.stage("traces"):
+        fig = build_oi_chart(strikes, types, t1_oi, t2_oi)
+
+    # Update layout
+    fig.update_layout(
+        title=f"<b>{symbol} OI Change Analysis</b><br>" +
+              f"<sub>From {t1_key.strftime('%H:%M')} to {t2_key.strftime('%H:%M')} on {expiry}</sub>",
+        xaxis_title="Strikes",
+        yaxis_title="Call / Put OI",
+        height=700,
+        bargap=0.3,
+        barmode='overlay',
+        xaxis=dict(
+            tickangle=-45,
+            categoryorder='category ascending'
+        ),
+        showlegend=False,
+        hovermode='closest',
+        # Keep zoom and hover state across live refreshes
+        uirevision=f"{symbol}|{expiry}"
+    )
+
+    # Serializes the figure for the browser
+    with timings.stage("plotly"):
+        st.plotly_chart(fig, use_container_width=True, key="oi_chart")
+
+    if stats is not None and not stats.empty:
+        with timings.stage("trends"):
+            draw_trends(stats)
+
+def render_chain(symbol, expiry, live, page_timings):
+    timings = StageTimer(profile=st.session_state.get("profile_stages", PROFILE_STAGES))
+    with timings.stage("chain"):
+        if from_archive:
+            # Archived days carry no precomputed analytics
+            matrix = get_archived_chain_matrix(archive.archive_version(selected_day), selected_day, symbol, expiry)
+            stats = None
+        else:
+            matrix, stats = read_chain_matrix(symbol, expiry, live, timings)
+    draw_chain(matrix, stats, symbol, expiry, live, timings)
+    draw_performance(page_timings, timings)
+
+st.fragment(render_chain, run_every=refresh_seconds if live else None)(selected_symbol, selected_expiry, live, page_timings)
 
 st.markdown("---")
 
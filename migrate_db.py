@@ -0,0 +1,81 @@
+"""Convert market_data.db / snapshot_data.db to storage schema v2 (see db_schema.py).
+
+    python migrate_db.py                 # migrate both databases next to this script
+    python migrate_db.py --status        # only report schema versions and sizes
+    python migrate_db.py --snapshot-db other.db --no-backup
+
+The running ingestor and snapshotter upgrade their files automatically on start; this
+command is for converting copies/archives offline, with a .v1.bak backup by default.
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+
+import db_schema
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def _describe(path):
+    if not os.path.exists(path):
+        return f"{path}: missing"
+    conn = sqlite3.connect(path)
+    try:
+        version = db_schema.schema_version(conn)
+    finally:
+        conn.close()
+    return f"{path}: schema v{max(version, 1)}, {os.path.getsize(path) / 1024:.0f} KiB"
+
+
+def migrate(path, ensure, backup=True):
+    if not os.path.exists(path):
+        print(f"⚠️  {path} not found, skipping.")
+        return
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        if db_schema.schema_version(conn) >= db_schema.SCHEMA_VERSION:
+            print(f"✅ {path} is already at schema v{db_schema.SCHEMA_VERSION}.")
+            return
+        if backup:
+            # Fold any WAL content into the main file before copying it
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            shutil.copy2(path, path + ".v1.bak")
+            print(f"💾 Backup written to {path}.v1.bak")
+
+        before = os.path.getsize(path)
+        conn.execute("BEGIN")
+        ensure(conn)
+        conn.execute("COMMIT")
+        conn.execute("VACUUM")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    after = os.path.getsize(path)
+    print(f"🚀 {path} migrated: {before / 1024:.0f} KiB → {after / 1024:.0f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate OI databases to storage schema v2.")
+    parser.add_argument("--market-db", default=os.path.join(current_dir, "market_data.db"))
+    parser.add_argument("--snapshot-db", default=os.path.join(current_dir, "snapshot_data.db"))
+    parser.add_argument("--status", action="store_true", help="report schema versions without changing anything")
+    parser.add_argument("--no-backup", action="store_true", help="do not keep a .v1.bak copy")
+    args = parser.parse_args()
+
+    if args.status:
+        print(_describe(args.market_db))
+        print(_describe(args.snapshot_db))
+        return
+
+    migrate(args.market_db, db_schema.ensure_market_schema, backup=not args.no_backup)
+    migrate(args.snapshot_db, db_schema.ensure_snapshot_schema, backup=not args.no_backup)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,71 +1,356 @@
 import sqlite3
-import pandas as pd
+import os
 from datetime import datetime, timedelta
 import time
 
+import numpy as np
+import zmq
+
+from chain_analytics import update_chain_stats
+from db_schema import (
+    datetime_to_epoch_ms, ensure_snapshot_schema, register_instruments, reparse_instruments,
+    session_date, session_start_ms,
+)
+from last_value_cache import NULL_INT, LastValueCache
+from snapshot_events import build_event, encode, open_publisher
+from snapshot_queries import keyframe_time
+from stage_timer import PROFILE_STAGES, StageTimer, log_record
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_db_name = os.path.join(current_dir, "market_data.db")
+dst_db_name = os.path.join(current_dir, "snapshot_data.db")
+
+# Sharded ingest (ingest_supervisor.py --sharded) writes one market_data file per feed;
+# list them here, separated by os.pathsep, to snapshot all of them
+src_db_names = [p for p in os.environ.get("SNAPSHOT_SOURCES", "").split(os.pathsep) if p] or [src_db_name]
+
+# "full" stores every row that ticked during the slot (all snapshots are keyframes), so
+# the v1 `oi_snapshot` view reads as it always did. "delta" (opt-in) stores only rows
+# whose oi/oi_day_high changed since the previous snapshot of the day, plus a keyframe
+# with every instrument's state each KEYFRAME_EVERY snapshots; it is much smaller, but
+# only readers that reassemble as-of state (snapshot_queries, ChainMatrix) see full
+# snapshots: through `oi_snapshot`, non-keyframe slots hold just the changed rows.
+SNAPSHOT_STORAGE = os.environ.get("SNAPSHOT_STORAGE", "full")
+KEYFRAME_EVERY = 20  # hourly
+
+# Take each source's latest values from its last-value cache (<market_data>.lvc, written
+# by insert2.py / ingest_supervisor.py) rather than SQLite while the cache mirrors the
+# slot's session; "0" always reads market_data
+SNAPSHOT_USE_LVC = os.environ.get("SNAPSHOT_USE_LVC", "1") == "1"
+
+SNAPSHOT_INTERVAL = timedelta(minutes=3)
+# Wait this long past a boundary so the ingestor's last flush of the slot has landed
+SNAPSHOT_DELAY = 1.0
+# Never replay more than this many missed slots after a stall/suspend
+MAX_CATCHUP_SLOTS = 20
+
 def round_to_3min(dt):
     minute = dt.minute - (dt.minute % 3)
     return dt.replace(minute=minute, second=0, microsecond=0)
 
-def fetch_and_snapshot():
-    now = datetime.now()
-    snapshot_start = round_to_3min(now)
-    snapshot_end = snapshot_start + timedelta(minutes=3) - timedelta(seconds=1)
+def _keyframe_due(conn, snapshot_time):
+    """A delta-mode snapshot is a keyframe if it is the day's first or KEYFRAME_EVERY have passed."""
+    day_start = session_start_ms(snapshot_time)
+    last = conn.execute(
+        "SELECT max(snapshot_time) FROM snapshots WHERE keyframe = 1 AND snapshot_time >= ? AND snapshot_time < ?",
+        (day_start, snapshot_time),
+    ).fetchone()[0]
+    if last is None:
+        return True
+    since = conn.execute(
+        "SELECT count(*) FROM snapshots WHERE snapshot_time >= ? AND snapshot_time < ?", (last, snapshot_time)
+    ).fetchone()[0]
+    return since >= KEYFRAME_EVERY
+
+def _load_previous_state(conn, snapshot_time):
+    """temp.previous_state: every instrument's stored state just before snapshot_time, same day."""
+    day_start = session_start_ms(snapshot_time)
+    conn.execute("DROP TABLE IF EXISTS temp.previous_state")
+    conn.execute("""
+        CREATE TEMP TABLE previous_state AS
+        SELECT o.symbol_id, o.oi, o.oi_day_high, max(s.snapshot_time) AS as_of
+        FROM snapshots s
+        JOIN snapshot_oi o ON o.snapshot_id = s.snapshot_id
+        WHERE s.snapshot_time >= ? AND s.snapshot_time < ?
+        GROUP BY o.symbol_id
+    """, (max(keyframe_time(conn, snapshot_time - 1), day_start), snapshot_time))
+
+def _open_cache(src_path, session):
+    """The source's last-value cache, if it mirrors the source's market_data for trading
+    day `session` (see last_value_cache.py); None otherwise."""
+    path = os.path.splitext(src_path)[0] + ".lvc"
+    if not os.path.exists(path):
+        return None
+    try:
+        lvc = LastValueCache(path)
+    except (OSError, ValueError):
+        return None
+    if not lvc.mirrors(session):
+        lvc.close()
+        return None
+    return lvc
+
+# market_data rows with their symbol_id, shaped like temp.latest_values
+_MARKET_DATA_SOURCE = """(
+    SELECT i.symbol_id, m.timestamp, m.oi, m.oi_day_high
+    FROM src.market_data m
+    JOIN instruments i ON i.trading_symbol = m.trading_symbol
+)"""
+
+# trading_symbol -> symbol_id per snapshot database file, for the cache path: ids never
+# change once assigned, so only symbols not seen before are looked up in SQLite
+_symbol_ids = {}
+
+def _known_ids(path):
+    st = os.stat(path)
+    return _symbol_ids.setdefault((os.path.abspath(path), st.st_dev, st.st_ino), {})
+
+class _CacheChanged(Exception):
+    """The cache rolled over to another session while a snapshot was reading it."""
+
+def _stage_cached_values(conn, lvc, session, window, known_ids):
+    """temp.latest_values: symbol_id, timestamp, oi, oi_day_high of the cached rows
+    updated within `window`. Symbols missing from `known_ids` are looked up (and
+    registered if unseen); returns those new trading_symbol -> symbol_id entries."""
+    def select(records):
+        return lvc.mirrors(session), records[(records["timestamp"] >= window[0]) & (records["timestamp"] <= window[1])]
+    try:
+        mirrored, rows = lvc.read(select)
+    except TimeoutError:
+        mirrored = False
+    if not mirrored:
+        raise _CacheChanged()
+
+    symbols = rows["trading_symbol"].astype(str).tolist()
+    missing = list({s for s in symbols if s not in known_ids})
+    learned = {}
+    if missing:
+        register_instruments(conn, missing)
+        learned = dict(conn.execute(
+            f"SELECT trading_symbol, symbol_id FROM instruments WHERE trading_symbol IN ({','.join('?' * len(missing))})",
+            missing,
+        ))
+    ids = [known_ids.get(s) or learned.get(s) for s in symbols]
+
+    conn.execute("DROP TABLE IF EXISTS temp.latest_values")
+    conn.execute("CREATE TEMP TABLE latest_values (symbol_id INTEGER, timestamp INTEGER, oi INTEGER, oi_day_high INTEGER)")
+    conn.executemany(
+        f"INSERT INTO temp.latest_values VALUES (?, ?, nullif(?, {NULL_INT}), nullif(?, {NULL_INT}))",
+        zip(ids, rows["timestamp"].tolist(), rows["oi"].tolist(), rows["oi_day_high"].tolist()),
+    )
+    return learned
+
+def fetch_and_snapshot(snapshot_start=None, src_path=None, dst_path=None, storage=None, publisher=None,
+                       use_cache=None):
+    """Copy market_data rows updated within one 3-minute slot into snapshot_oi.
+
+    Defaults to the slot containing now and the databases next to this script. Runs as
+    a single INSERT ... SELECT over an attached market_data.db, in one transaction
+    (schema v2, see db_schema.py) that also updates the chain analytics tables
+    (chain_analytics.py). `storage` is "delta" or "full" (default SNAPSHOT_STORAGE).
+    With a `publisher` (snapshot_events.open_publisher()) a snapshot-ready event goes
+    out once the transaction has committed. While the source's last-value cache mirrors
+    its market_data (default SNAPSHOT_USE_LVC), rows come from the cache instead and
+    market_data.db is not opened at all.
+    """
+    storage = storage or SNAPSHOT_STORAGE
+    src_path = src_path or src_db_name
+    use_cache = SNAPSHOT_USE_LVC if use_cache is None else use_cache
+    if snapshot_start is None:
+        snapshot_start = round_to_3min(datetime.now())
+    snapshot_end = snapshot_start + SNAPSHOT_INTERVAL - timedelta(seconds=1)
 
     start_str = snapshot_start.strftime("%Y-%m-%d %H:%M:%S")
     end_str = snapshot_end.strftime("%Y-%m-%d %H:%M:%S")
 
     print(f"\n⏱ Snapshot range: {start_str} to {end_str}")
 
-    # Connect to source DB
-    src_conn = sqlite3.connect("market_data.db")
-    query = f"""
-        SELECT timestamp, trading_symbol, oi, oi_day_high
-        FROM market_data
-        WHERE timestamp >= '{start_str}' AND timestamp <= '{end_str}'
-    """
-    df = pd.read_sql_query(query, src_conn)
-    src_conn.close()
-
-    if df.empty:
-        print("⚠️  No data found in this window.")
-        return
-
-    print(f"✅ Found {len(df)} records. Saving snapshot...")
-
-    # Connect to destination DB
-    dst_conn = sqlite3.connect("snapshot_data.db")
-    dst_conn.execute("""
-        CREATE TABLE IF NOT EXISTS oi_snapshot (
-            snapshot_time TEXT,
-            trading_symbol TEXT,
-            oi INTEGER,
-            oi_day_high INTEGER
-        )
-    """)
-    dst_conn.execute("""
-        CREATE UNIQUE INDEX IF NOT EXISTS idx_snapshot_unique
-        ON oi_snapshot (snapshot_time, trading_symbol)
-    """)
-
-    # Insert rows (skip duplicates)
-    for row in df.itertuples():
-        dst_conn.execute(
-            "INSERT OR IGNORE INTO oi_snapshot (snapshot_time, trading_symbol, oi, oi_day_high) VALUES (?, ?, ?, ?)",
-            (snapshot_start.strftime("%Y-%m-%d %H:%M:%S"), row.trading_symbol, row.oi, row.oi_day_high)
-        )
-
-    dst_conn.commit()
-    dst_conn.close()
-    print("🚀 Snapshot saved successfully!")
-
-print("📡 Running snapshot fetch every 3 minutes using time.time()...")
-
-interval = 3 * 60
-next_run = time.time()
-
-while True:
-    now = time.time()
-    if now >= next_run:
-        fetch_and_snapshot()
-        next_run += interval
+    # Per-stage timings, one structured line per cycle (stage_timer.py)
+    timings = StageTimer(profile=PROFILE_STAGES)
+    started = time.perf_counter()
+    bounds = (datetime_to_epoch_ms(snapshot_start), datetime_to_epoch_ms(snapshot_end))
+    session = session_date(bounds[0])
+    lvc = _open_cache(src_path, session) if use_cache else None
+    latest = "temp.latest_values" if lvc is not None else "src.market_data"
+    source = latest if lvc is not None else _MARKET_DATA_SOURCE
+    dst_conn = sqlite3.connect(dst_path or dst_db_name, isolation_level=None)
+    cache_changed = False
+    try:
+        with timings.stage("open"):
+            # Dashboard readers (snapshot_store.py) must not hold up the commit below, nor it them.
+            # The mode sticks to the file; this is a no-op once set.
+            dst_conn.execute("PRAGMA main.journal_mode=WAL")
+            if lvc is None:
+                dst_conn.execute("ATTACH DATABASE ? AS src", (src_path,))
+            dst_conn.execute("BEGIN")
+            ensure_snapshot_schema(dst_conn)
+
+        # Another source may already have written this slot; keep its kind
+        existing = dst_conn.execute(
+            "SELECT snapshot_id, keyframe FROM snapshots WHERE snapshot_time = ?", (bounds[0],)
+        ).fetchone()
+        if existing:
+            snapshot_id, keyframe = existing
+        else:
+            keyframe = storage == "full" or _keyframe_due(dst_conn, bounds[0])
+            snapshot_id = dst_conn.execute(
+                "INSERT INTO snapshots (snapshot_time, keyframe) VALUES (?, ?)", (bounds[0], int(keyframe))
+            ).lastrowid
+        # A delta-mode keyframe takes every row updated so far today, not just this slot's
+        window = (session_start_ms(bounds[0]), bounds[1]) if keyframe and storage != "full" else bounds
+
+        with timings.stage("register"):
+            if lvc is not None:
+                known_ids = _known_ids(dst_path or dst_db_name)
+                learned = _stage_cached_values(dst_conn, lvc, session, window, known_ids)
+            else:
+                # Symbols seen for the first time get parsed into the instrument dictionary
+                new_symbols = [row[0] for row in dst_conn.execute("""
+                    SELECT DISTINCT m.trading_symbol
+                    FROM src.market_data m
+                    LEFT JOIN instruments i ON i.trading_symbol = m.trading_symbol
+                    WHERE m.timestamp BETWEEN ? AND ? AND i.symbol_id IS NULL
+                """, window)]
+                register_instruments(dst_conn, new_symbols)
+
+        if storage != "full":
+            with timings.stage("previous_state"):
+                _load_previous_state(dst_conn, bounds[0])
+
+        with timings.stage("insert"):
+            if storage == "full":
+                cursor = dst_conn.execute(f"""
+                    INSERT OR IGNORE INTO snapshot_oi (snapshot_id, symbol_id, oi, oi_day_high)
+                    SELECT ?, m.symbol_id, m.oi, m.oi_day_high
+                    FROM {source} m
+                    WHERE m.timestamp BETWEEN ? AND ?
+                """, (snapshot_id, *bounds))
+                inserted = cursor.rowcount
+            elif keyframe:
+                # Everything that ticked today so far, then the stored state of the rest
+                inserted = dst_conn.execute(f"""
+                    INSERT OR IGNORE INTO snapshot_oi (snapshot_id, symbol_id, oi, oi_day_high)
+                    SELECT ?, m.symbol_id, m.oi, m.oi_day_high
+                    FROM {source} m
+                    WHERE m.timestamp BETWEEN ? AND ?
+                """, (snapshot_id, *window)).rowcount
+                inserted += dst_conn.execute("""
+                    INSERT OR IGNORE INTO snapshot_oi (snapshot_id, symbol_id, oi, oi_day_high)
+                    SELECT ?, symbol_id, oi, oi_day_high FROM temp.previous_state
+                """, (snapshot_id,)).rowcount
+            else:
+                # Only rows whose OI differs from the state as of the previous snapshot
+                inserted = dst_conn.execute(f"""
+                    INSERT OR IGNORE INTO snapshot_oi (snapshot_id, symbol_id, oi, oi_day_high)
+                    SELECT ?, m.symbol_id, m.oi, m.oi_day_high
+                    FROM {source} m
+                    LEFT JOIN temp.previous_state p ON p.symbol_id = m.symbol_id
+                    WHERE m.timestamp BETWEEN ? AND ?
+                      AND (p.symbol_id IS NULL OR p.oi IS NOT m.oi OR p.oi_day_high IS NOT m.oi_day_high)
+                """, (snapshot_id, *bounds)).rowcount
+
+        with timings.stage("chain_stats"):
+            # Chain totals, PCR, max pain etc. for this slot, folded in from the previous one
+            update_chain_stats(dst_conn, snapshot_id)
+        event = None
+        if publisher:
+            with timings.stage("event"):
+                # Read inside the transaction so the event matches what is committed
+                event = build_event(dst_conn, snapshot_id, inserted, src_path)
+        with timings.stage("commit"):
+            dst_conn.execute("COMMIT")
+        if lvc is not None:
+            # Only ids that are now committed
+            known_ids.update(learned)
+    except _CacheChanged:
+        dst_conn.execute("ROLLBACK")
+        cache_changed = True
+    except Exception:
+        if dst_conn.in_transaction:
+            dst_conn.execute("ROLLBACK")
+        raise
+    finally:
+        dst_conn.close()
+        if lvc is not None:
+            lvc.close()
+
+    if cache_changed:
+        print("⚠️  Last-value cache rolled over mid-snapshot; reading market_data instead.")
+        return fetch_and_snapshot(snapshot_start, src_path, dst_path, storage, publisher, use_cache=False)
+
+    if event is not None:
+        with timings.stage("publish"):
+            try:
+                publisher.send(encode(event))
+            except zmq.ZMQError as e:
+                print(f"⚠️  Snapshot event not sent: {e}")
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    kind = "keyframe" if keyframe else "delta"
+    line = timings.record(
+        snapshot_time=start_str, source=os.path.basename(src_path), storage=storage,
+        keyframe=bool(keyframe), latest_values=latest, rows=max(inserted, 0),
+    )
+    print(f"📊 {line}")
+    log_record(line)
+    report = timings.profile_report()
+    if report:
+        print(report)
+
+    if inserted <= 0:
+        print(f"⚠️  No new data in this window ({kind}). ({elapsed_ms:.1f} ms)")
+        return 0
+
+    print(f"🚀 Snapshot saved successfully! {inserted} records ({kind}) in {elapsed_ms:.1f} ms")
+    return inserted
+
+def refresh_instrument_master():
+    """Re-parse the stored instrument dictionary so parser fixes reach existing symbols."""
+    conn = sqlite3.connect(dst_db_name, isolation_level=None)
+    try:
+        conn.execute("BEGIN")
+        ensure_snapshot_schema(conn)
+        count = reparse_instruments(conn)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    print(f"📚 Instrument master refreshed ({count} symbols).")
+
+def run_scheduler():
+    """Snapshot every completed 3-minute slot, sleeping until the next wall-clock boundary."""
+    print("📡 Running snapshot fetch at every 3-minute boundary...")
+    refresh_instrument_master()
+    # Subscribers (snapshot_events.SnapshotEvents) learn about each snapshot as it commits
+    publisher = open_publisher()
+    if publisher:
+        print("🔔 Publishing snapshot events (snapshot_events.py)")
+
+    # Start with the most recently completed slot
+    last_done = round_to_3min(datetime.now()) - 2 * SNAPSHOT_INTERVAL
+
+    while True:
+        boundary = round_to_3min(datetime.now())
+        # Slots that have fully closed since the last run; the current one is still open
+        pending = []
+        slot = last_done + SNAPSHOT_INTERVAL
+        while slot < boundary:
+            pending.append(slot)
+            slot += SNAPSHOT_INTERVAL
+
+        if len(pending) > MAX_CATCHUP_SLOTS:
+            print(f"⚠️  Skipping {len(pending) - MAX_CATCHUP_SLOTS} missed slots.")
+            pending = pending[-MAX_CATCHUP_SLOTS:]
+
+        for slot in pending:
+            for src in src_db_names:
+                try:
+                    fetch_and_snapshot(slot, src, publisher=publisher)
+                except sqlite3.Error as e:
+                    print(f"❌ Snapshot for {slot:%H:%M} from {src} failed: {e}")
+            last_done = slot
+
+        next_run = boundary + SNAPSHOT_INTERVAL
+        time.sleep(max(0.0, (next_run - datetime.now()).total_seconds()) + SNAPSHOT_DELAY)
+
+if __name__ == "__main__":
+    run_scheduler()
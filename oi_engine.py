@@ -0,0 +1,306 @@
+"""Headless OI change engine: the dashboard's T1 → T2 comparison for every chain at once.
+
+    python oi_engine.py                                    # newest day, first → last snapshot
+    python oi_engine.py --date 2025-08-04 --t1 09:15 --t2 15:27
+    python oi_engine.py --summary chains.csv --strikes strikes.parquet
+
+No Streamlit involved, so a cron job can screen every chain after each snapshot:
+
+    change = load_oi_change(conn, latest_day_bounds(conn), t1_ms)
+    change.summary        # one row per (root, expiry): totals, PCR, buildup/unwinding strikes
+    change.strikes        # one row per instrument: t1_oi, t2_oi, change, pct_change
+    expiries, strikes, grid = change.heatmap("NIFTY", "PE")
+
+T1 and T2 are matched to each chain's own 3-minute snapshot buckets like the dashboard
+does (first bucket at or after T1, last at or before T2), so a chain whose snapshots
+stop early is compared as of its last one; a chain with no bucket on either side is
+left out. Missing OI on one side counts as 0.
+"""
+import argparse
+import os
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from db_schema import DAY_MS, SESSION_OFFSET_MS
+from oi_matrix import BUCKET_MS
+from snapshot_queries import (
+    connect_readonly, day_bounds_for, keyframe_time, load_chains_slice, snapshot_days, snapshot_times,
+)
+
+# Past days archived to Parquet (archive.py); needs pyarrow
+try:
+    import archive
+except ImportError:
+    archive = None
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+db_path = os.path.join(current_dir, "snapshot_data.db")
+
+CHAIN_KEYS = ["root", "expiry"]
+_SIDES = (("CE", "call"), ("PE", "put"))
+
+
+def expiry_sort_key(expiry):
+    # Weekly expiries are 'DD-MM', monthly ones 'DD-Mon' (symbols.py)
+    if re.match(r'\d{2}-\d{2}', expiry):
+        return pd.to_datetime(expiry, format='%d-%m')
+    return pd.to_datetime(expiry, format='%d-%b')
+
+def sort_expiries(expiries):
+    """Expiries in date order."""
+    return sorted(expiries, key=expiry_sort_key)
+
+def bucket_time(bucket_ms):
+    """Wall-clock time of an epoch-ms value (see db_schema.py)."""
+    return pd.Timestamp(int(bucket_ms), unit='ms').time()
+
+def time_to_ms(day_bounds, t):
+    """Epoch ms of wall-clock time `t` in the session starting at day_bounds[0]; times
+    before the session rollover fall on the next calendar day."""
+    ms = day_bounds[0] - SESSION_OFFSET_MS + (t.hour * 3600 + t.minute * 60 + t.second) * 1000
+    return ms if ms >= day_bounds[0] else ms + DAY_MS
+
+def select_buckets(times, t1_ms=None, t2_ms=None):
+    """(b1, b2): the first bucket at or after t1_ms and the last at or before t2_ms among
+    the buckets of `times` (epoch ms). None defaults to the first/last bucket; either
+    result is None when nothing matches."""
+    times = np.asarray(times, dtype=np.int64)
+    buckets = np.unique(times - times % BUCKET_MS)
+    if not len(buckets):
+        return None, None
+    i1 = 0 if t1_ms is None else int(np.searchsorted(buckets, t1_ms, side='left'))
+    i2 = len(buckets) - 1 if t2_ms is None else int(np.searchsorted(buckets, t2_ms, side='right')) - 1
+    b1 = int(buckets[i1]) if i1 < len(buckets) else None
+    b2 = int(buckets[i2]) if i2 >= 0 else None
+    return b1, b2
+
+
+_NO_BUCKET_MIN = np.iinfo(np.int64).min
+_NO_BUCKET_MAX = np.iinfo(np.int64).max
+
+def _chain_buckets(buckets, chains, count, t1_ms, t2_ms):
+    # Per chain, like ChainMatrix.nearest_index over that chain's own buckets: the first
+    # at or after t1_ms and the last at or before t2_ms (_NO_BUCKET_MAX/_MIN: none)
+    b1 = np.full(count, _NO_BUCKET_MAX, dtype=np.int64)
+    b2 = np.full(count, _NO_BUCKET_MIN, dtype=np.int64)
+    after = buckets >= t1_ms if t1_ms is not None else np.ones(len(buckets), dtype=bool)
+    before = buckets <= t2_ms if t2_ms is not None else np.ones(len(buckets), dtype=bool)
+    np.minimum.at(b1, chains[after], buckets[after])
+    np.maximum.at(b2, chains[before], buckets[before])
+    return b1, b2
+
+def _state_at(buckets, keyframes, order, codes, chains, oi, count, chain_bucket):
+    # Like a ChainMatrix row: the latest value per instrument since the last keyframe
+    # bucket at or before its chain's `chain_bucket` (or since the chain's first row)
+    target = chain_bucket[chains]
+    upto = buckets <= target
+    start = np.full(len(chain_bucket), _NO_BUCKET_MAX, dtype=np.int64)
+    np.minimum.at(start, chains, buckets)
+    np.maximum.at(start, chains[keyframes & upto], buckets[keyframes & upto])
+    rows = order[upto[order] & (buckets[order] >= start[chains[order]])]
+    state = np.full(count, np.nan)
+    # Rows are in snapshot_time order, so the latest assignment per instrument wins
+    state[codes[rows]] = oi[rows]
+    return state
+
+def summarize(strikes):
+    """Per-chain summary of a strikes frame (see OIChange), from one groupby over it."""
+    columns = CHAIN_KEYS + [
+        f"{side}_{column}" for side in ("call", "put") for column in ("oi_t1", "oi_t2", "oi_change")
+    ] + ["pcr_t1", "pcr_t2"] + [
+        f"{side}_{kind}_strike" for kind in ("buildup", "unwinding") for side in ("call", "put")
+    ]
+    if strikes.empty:
+        return pd.DataFrame(columns=columns)
+
+    grouped = strikes.groupby(CHAIN_KEYS + ["type"])
+    totals = grouped[["t1_oi", "t2_oi", "change"]].sum().unstack("type", fill_value=0)
+    summary = pd.DataFrame(index=totals.index)
+    for opt_type, side in _SIDES:
+        for column, name in (("t1_oi", "oi_t1"), ("t2_oi", "oi_t2"), ("change", "oi_change")):
+            summary[f"{side}_{name}"] = totals[column][opt_type] if opt_type in totals[column] else 0
+    for t in ("t1", "t2"):
+        calls, puts = summary[f"call_oi_{t}"], summary[f"put_oi_{t}"]
+        summary[f"pcr_{t}"] = (puts / calls.where(calls > 0)).astype(float)
+
+    # Strikes with the largest OI added / shed per side; NaN when no strike moved that way
+    for kind, rows, sign in (("buildup", grouped["change"].idxmax(), 1), ("unwinding", grouped["change"].idxmin(), -1)):
+        top = strikes.loc[rows].set_index(CHAIN_KEYS + ["type"])
+        top_strike = top["strike"].where(top["change"] * sign > 0).unstack("type").reindex(columns=["CE", "PE"])
+        for opt_type, side in _SIDES:
+            summary[f"{side}_{kind}_strike"] = top_strike[opt_type]
+    return summary.reset_index()[columns]
+
+
+class OIChange:
+    """T1 → T2 OI change of every option chain in a day.
+
+    t1, t2   the requested times, epoch ms (None: each chain's first/last snapshot)
+    strikes  one row per instrument present at either of its chain's buckets:
+             trading_symbol, root, expiry, strike, type, t1_oi, t2_oi, change,
+             pct_change (NaN when t1_oi is 0)
+    summary  one row per (root, expiry): the chain's T1 and T2 buckets (epoch ms),
+             call/put OI at both and their change, PCR at both, and the strikes with
+             the largest buildup and unwinding per side
+    """
+
+    def __init__(self, t1, t2, strikes, buckets):
+        self.t1 = t1
+        self.t2 = t2
+        self.strikes = strikes
+        # buckets: root, expiry, t1, t2 of every compared chain
+        summary = summarize(strikes)
+        self.summary = buckets.merge(summary, on=CHAIN_KEYS)[CHAIN_KEYS + ["t1", "t2"] + list(summary.columns[2:])]
+
+    @classmethod
+    def from_frame(cls, df, t1=None, t2=None):
+        """Build from load_chains_slice() rows covering each chain's buckets, back to the
+        keyframe the earlier one's state starts at."""
+        if df.empty:
+            return cls(t1, t2, pd.DataFrame(columns=[
+                "trading_symbol", *CHAIN_KEYS, "strike", "type", "t1_oi", "t2_oi", "change", "pct_change",
+            ]), pd.DataFrame(columns=CHAIN_KEYS + ["t1", "t2"]))
+
+        snapshot_time = df['snapshot_time'].to_numpy(dtype=np.int64)
+        buckets = snapshot_time - snapshot_time % BUCKET_MS
+        order = np.argsort(snapshot_time, kind='stable')
+        keyframes = df['keyframe'].to_numpy(dtype=bool) if 'keyframe' in df else np.ones(len(df), dtype=bool)
+        codes, symbols = pd.factorize(df['trading_symbol'])
+        chains = df.groupby(CHAIN_KEYS, sort=False).ngroup().to_numpy()
+        chain_count = int(chains.max()) + 1
+        oi = df['oi'].to_numpy(dtype=np.float64)
+
+        b1, b2 = _chain_buckets(buckets, chains, chain_count, t1, t2)
+        matched = (b1 != _NO_BUCKET_MAX) & (b2 != _NO_BUCKET_MIN)
+        t1_oi = _state_at(buckets, keyframes, order, codes, chains, oi, len(symbols), b1)
+        t2_oi = _state_at(buckets, keyframes, order, codes, chains, oi, len(symbols), b2)
+
+        # Per-instrument metadata, taken from each symbol's first row
+        first = np.unique(codes, return_index=True)[1]
+        present = (~np.isnan(t1_oi) | ~np.isnan(t2_oi)) & matched[chains[first]]
+        t1_oi = np.nan_to_num(t1_oi[present]).astype(np.int64)
+        t2_oi = np.nan_to_num(t2_oi[present]).astype(np.int64)
+        strikes = df.iloc[first[present]][["trading_symbol", *CHAIN_KEYS, "strike", "type"]].reset_index(drop=True)
+        strikes["strike"] = strikes["strike"].astype(np.int64)
+        strikes["t1_oi"] = t1_oi
+        strikes["t2_oi"] = t2_oi
+        strikes["change"] = t2_oi - t1_oi
+        with np.errstate(divide='ignore', invalid='ignore'):
+            strikes["pct_change"] = np.where(t1_oi > 0, 100.0 * (t2_oi - t1_oi) / t1_oi, np.nan)
+        strikes = strikes.sort_values([*CHAIN_KEYS, "strike", "type"], ignore_index=True)
+
+        first_row = np.unique(chains, return_index=True)[1][matched]
+        chain_buckets = df.iloc[first_row][CHAIN_KEYS].reset_index(drop=True)
+        chain_buckets["t1"] = b1[matched]
+        chain_buckets["t2"] = b2[matched]
+        return cls(t1, t2, strikes, chain_buckets)
+
+    def chain(self, root, expiry):
+        """(strikes, types, t1_oi, t2_oi) of one chain, like ChainMatrix.compare()."""
+        rows = self.strikes[(self.strikes["root"] == root) & (self.strikes["expiry"] == expiry)]
+        return (rows["strike"].to_numpy(), rows["type"].to_numpy(dtype='<U3'),
+                rows["t1_oi"].to_numpy(), rows["t2_oi"].to_numpy())
+
+    def heatmap(self, root, opt_type="CE", value="change"):
+        """(expiries, strikes, grid) for one root's calls or puts: grid[e, s] is `value`
+        (a strikes column) for expiries[e] and strikes[s], NaN where there is no such option."""
+        rows = self.strikes[(self.strikes["root"] == root) & (self.strikes["type"] == opt_type)]
+        expiries = sort_expiries(rows["expiry"].unique())
+        strikes = np.unique(rows["strike"].to_numpy())
+        grid = np.full((len(expiries), len(strikes)), np.nan)
+        e_idx = pd.Index(expiries).get_indexer(rows["expiry"])
+        s_idx = np.searchsorted(strikes, rows["strike"].to_numpy())
+        grid[e_idx, s_idx] = rows[value].to_numpy(dtype=np.float64)
+        return expiries, strikes, grid
+
+
+def load_oi_change(conn, day_bounds, t1_ms=None, t2_ms=None):
+    """OIChange for a day in a snapshot database, or None when T1/T2 match no chain's
+    snapshots. Rows before the keyframe the earliest T1 bucket starts from are not read."""
+    start = day_bounds[0]
+    if t1_ms is not None and (t2_ms is None or t1_ms <= t2_ms):
+        # No chain's T1 bucket is earlier than the first bucket of the day at or after T1
+        b1, _ = select_buckets(snapshot_times(conn, *day_bounds), t1_ms)
+        if b1 is None:
+            return None
+        start = keyframe_time(conn, b1 + BUCKET_MS - 1)
+        start -= start % BUCKET_MS
+    change = OIChange.from_frame(load_chains_slice(conn, start, day_bounds[1]), t1_ms, t2_ms)
+    return change if len(change.summary) else None
+
+def load_archived_oi_change(day, t1_ms=None, t2_ms=None, archive_dir=None):
+    """OIChange for an archived day (archive.py), or None when T1/T2 match no chain's snapshots."""
+    rows = archive.load_archived_chains(day, archive_dir or archive.ARCHIVE_DIR)
+    change = OIChange.from_frame(rows, t1_ms, t2_ms)
+    return change if len(change.summary) else None
+
+
+def write_frame(df, path):
+    """Write to CSV, or Parquet for a .parquet path (needs pyarrow), replacing the file atomically."""
+    tmp_path = path + ".tmp"
+    if path.endswith(".parquet"):
+        df.to_parquet(tmp_path, index=False)
+    else:
+        df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def _clock(value):
+    return datetime.strptime(value, "%H:%M").time()
+
+def _clock_range(buckets):
+    first, last = f"{bucket_time(buckets.min()):%H:%M}", f"{bucket_time(buckets.max()):%H:%M}"
+    return first if first == last else f"{first}–{last}"
+
+def main():
+    parser = argparse.ArgumentParser(description="T1 → T2 OI change of every option chain in a day.")
+    parser.add_argument("--snapshot-db", default=db_path)
+    parser.add_argument("--date", type=lambda v: datetime.strptime(v, "%Y-%m-%d").date(),
+                        help="YYYY-MM-DD; default: the newest day, live or archived")
+    parser.add_argument("--t1", type=_clock, help="HH:MM; default: the day's first snapshot")
+    parser.add_argument("--t2", type=_clock, help="HH:MM; default: the day's last snapshot")
+    parser.add_argument("--summary", metavar="PATH", help="per-chain summary (.csv or .parquet)")
+    parser.add_argument("--strikes", metavar="PATH", help="per-instrument changes (.csv or .parquet)")
+    args = parser.parse_args()
+
+    conn = connect_readonly(args.snapshot_db)
+    try:
+        live_days = snapshot_days(conn)
+        archived_days = archive.archived_days() if archive is not None else []
+        day = args.date or max(live_days + archived_days, default=None)
+        if day is None:
+            print("⚠️  No snapshots found.")
+            return
+        bounds = day_bounds_for(day)
+        t1_ms = time_to_ms(bounds, args.t1) if args.t1 else None
+        t2_ms = time_to_ms(bounds, args.t2) if args.t2 else None
+        if day in live_days:
+            change = load_oi_change(conn, bounds, t1_ms, t2_ms)
+        elif day in archived_days:
+            change = load_archived_oi_change(day, t1_ms, t2_ms)
+        else:
+            print(f"⚠️  No snapshots for {day}.")
+            return
+    finally:
+        conn.close()
+
+    if change is None:
+        print(f"⚠️  No snapshots in the selected time range on {day}.")
+        return
+    # Chains are compared at their own buckets, so T1/T2 may differ between chains
+    print(f"🚀 {day} {_clock_range(change.summary.t1)} → {_clock_range(change.summary.t2)}: "
+          f"{len(change.summary)} chains, {len(change.strikes)} instruments")
+    if args.summary:
+        write_frame(change.summary, args.summary)
+        print(f"💾 Summary → {args.summary}")
+    if args.strikes:
+        write_frame(change.strikes, args.strikes)
+        print(f"💾 Strikes → {args.strikes}")
+    if not (args.summary or args.strikes):
+        print(change.summary.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+BUCKET_MS = 3 * 60 * 1000
+
+
+def _forward_fill(oi, keyframes, start=1):
+    """Fill gaps in non-keyframe buckets from the bucket before, in place, from `start` on."""
+    for t in range(max(start, 1), len(oi)):
+        if not keyframes[t]:
+            row = oi[t]
+            missing = np.isnan(row)
+            row[missing] = oi[t - 1, missing]
+
+
+class ChainMatrix:
+    """One option chain pivoted into a dense (time bucket × instrument) OI matrix.
+
+    times    int64[T]   3-minute bucket starts, epoch ms, ascending
+    symbols  object[N]  trading symbols
+    strikes  int64[N]
+    types    str[N]     'CE' / 'PE'
+    oi       float64[T, N], NaN where the instrument has no value in that bucket
+    keyframes bool[T]   buckets holding a keyframe snapshot (see db_schema.py)
+
+    Values are forward-filled into later buckets up to the next keyframe, so each row
+    is the chain's state as of that bucket even when only changed rows were stored.
+    last_snapshot_time is the newest raw snapshot_time folded in, so callers can ask
+    the database for later rows only and extend() the matrix with them.
+    """
+
+    def __init__(self, times, symbols, strikes, types, oi, last_snapshot_time=None, keyframes=None):
+        self.times = times
+        self.symbols = symbols
+        self.strikes = strikes
+        self.types = types
+        self.oi = oi
+        self.last_snapshot_time = last_snapshot_time
+        self.keyframes = keyframes if keyframes is not None else np.ones(len(times), dtype=bool)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build from rows with snapshot_time (epoch ms), trading_symbol, strike, type, oi
+        and optionally keyframe (missing: every snapshot is a keyframe)."""
+        if df.empty:
+            return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=object),
+                       np.empty(0, dtype=np.int64), np.empty(0, dtype='<U3'), np.empty((0, 0)))
+
+        snapshot_time = df['snapshot_time'].to_numpy(dtype=np.int64)
+        buckets = snapshot_time - snapshot_time % BUCKET_MS
+        # Within a bucket the latest snapshot wins, like the old per-time dict did
+        order = np.argsort(snapshot_time, kind='stable')
+
+        times, t_idx = np.unique(buckets, return_inverse=True)
+        s_idx, symbols = pd.factorize(df['trading_symbol'])
+
+        oi = np.full((len(times), len(symbols)), np.nan)
+        oi[t_idx[order], s_idx[order]] = df['oi'].to_numpy(dtype=np.float64)[order]
+
+        keyframes = np.ones(len(times), dtype=bool)
+        if 'keyframe' in df:
+            keyframes[:] = False
+            keyframes[t_idx[df['keyframe'].to_numpy(dtype=bool)]] = True
+        _forward_fill(oi, keyframes)
+
+        # Per-instrument metadata, taken from each symbol's first row
+        first = np.unique(s_idx, return_index=True)[1]
+        strikes = df['strike'].to_numpy()[first].astype(np.int64)
+        types = df['type'].to_numpy()[first].astype('<U3')
+        return cls(times, np.asarray(symbols, dtype=object), strikes, types, oi, int(snapshot_time.max()), keyframes)
+
+    def extend(self, df):
+        """Return a matrix with newer rows (same columns as from_frame) folded in."""
+        if df.empty:
+            return self
+        new = ChainMatrix.from_frame(df)
+        if not len(self.times):
+            return new
+
+        # Unseen instruments become new columns; existing ones keep their position
+        col_of = {symbol: i for i, symbol in enumerate(self.symbols)}
+        added = [j for j, symbol in enumerate(new.symbols) if symbol not in col_of]
+        symbols = np.concatenate([self.symbols, new.symbols[added]])
+        strikes = np.concatenate([self.strikes, new.strikes[added]])
+        types = np.concatenate([self.types, new.types[added]])
+        for j in added:
+            col_of[new.symbols[j]] = len(col_of)
+
+        times = np.union1d(self.times, new.times)
+        oi = np.full((len(times), len(symbols)), np.nan)
+        old_rows = np.searchsorted(times, self.times)
+        oi[old_rows, :len(self.symbols)] = self.oi
+        keyframes = np.zeros(len(times), dtype=bool)
+        keyframes[old_rows] = self.keyframes
+
+        # Newer rows win inside a shared bucket, but only where they have a value
+        rows = np.searchsorted(times, new.times)
+        cols = np.array([col_of[symbol] for symbol in new.symbols])
+        keyframes[rows] |= new.keyframes
+        block = oi[np.ix_(rows, cols)]
+        oi[np.ix_(rows, cols)] = np.where(np.isnan(new.oi), block, new.oi)
+        # Carry the existing state into the new buckets
+        _forward_fill(oi, keyframes, start=int(rows.min()))
+
+        return ChainMatrix(times, symbols, strikes, types, oi,
+                           max(self.last_snapshot_time, new.last_snapshot_time), keyframes)
+
+    def truncate(self, bucket_ms):
+        """Return a matrix without the buckets at or after bucket_ms, to extend() with them
+        read again."""
+        keep = int(np.searchsorted(self.times, bucket_ms, side='left'))
+        return ChainMatrix(self.times[:keep], self.symbols, self.strikes, self.types, self.oi[:keep],
+                           bucket_ms - 1, self.keyframes[:keep])
+
+    def nearest_index(self, target_ms, find_min=True):
+        """First bucket >= target (find_min) or last bucket <= target; None if there is none."""
+        if find_min:
+            i = np.searchsorted(self.times, target_ms, side='left')
+            return int(i) if i < len(self.times) else None
+        i = np.searchsorted(self.times, target_ms, side='right') - 1
+        return int(i) if i >= 0 else None
+
+    def present(self, i1, i2):
+        """Instruments with a value (stored or carried forward) at either bucket."""
+        return ~np.isnan(self.oi[i1]) | ~np.isnan(self.oi[i2])
+
+    def compare(self, i1, i2, min_strike=None, max_strike=None):
+        """(strikes, types, t1_oi, t2_oi) for instruments present at either bucket within the strike range.
+
+        Missing OI on one side counts as 0.
+        """
+        mask = self.present(i1, i2)
+        if min_strike is not None:
+            mask &= self.strikes >= min_strike
+        if max_strike is not None:
+            mask &= self.strikes <= max_strike
+        t1_oi = np.nan_to_num(self.oi[i1, mask]).astype(np.int64)
+        t2_oi = np.nan_to_num(self.oi[i2, mask]).astype(np.int64)
+        return self.strikes[mask], self.types[mask], t1_oi, t2_oi
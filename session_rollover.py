@@ -0,0 +1,194 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from db_schema import SESSION_OFFSET, create_market_table
+
+# Yesterday's final market_data is saved to Parquet after the rollover (needs pyarrow)
+try:
+    from archive import archive_market_data
+except ImportError:
+    archive_market_data = None
+
+# Trading-day rollover for a running ingest writer.
+#
+# When the session changes, the writer starts a new table next to market_data and
+# sends its upserts there; the first commit into it also swaps the tables in one
+# transaction:
+#
+#   market_data       -> market_data_prev   (handed to a background archiver, then dropped)
+#   market_data_next  -> market_data
+#
+# Readers (new_db.py, the last-value cache) see yesterday's table until the new one
+# holds the new session's first rows, never an empty or half-built one. The session
+# day of the live table is kept in a tracker file, so a restart mid-session neither
+# wipes the table nor misses a rollover that happened while the ingestor was down.
+
+LIVE_TABLE = "market_data"
+NEXT_TABLE = "market_data_next"
+PREV_TABLE = "market_data_prev"
+LIVE_INDEX = "idx_market_data_timestamp"
+NEXT_INDEX = "idx_market_data_next_timestamp"
+
+TRACKER_FORMAT = "%Y_%m_%d"
+
+
+def session_day(now=None):
+    """The trading day `now` (default: the current time) belongs to (db_schema.SESSION_ROLLOVER)."""
+    return ((now or datetime.now()) - SESSION_OFFSET).date()
+
+def read_tracker(path):
+    """Session day recorded in a tracker file, or None."""
+    try:
+        with open(path) as f:
+            return datetime.strptime(f.read().strip(), TRACKER_FORMAT).date()
+    except (OSError, ValueError):
+        return None
+
+def write_tracker(path, day):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(day.strftime(TRACKER_FORMAT))
+    os.replace(tmp_path, path)
+
+
+def _has_rows(conn, table):
+    try:
+        return conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is not None
+    except sqlite3.OperationalError:
+        return False
+
+def _live_rows(conn):
+    # In upsert_data_batch()'s column order, as LastValueCache.update() takes them
+    return conn.execute(f"""
+        SELECT timestamp, exc_timestamp, token, instrument_token, trading_symbol, ltp, bidprice,
+               bidqty, askprice, askqty, volume, oi, oi_day_high, oi_day_low
+        FROM {LIVE_TABLE}
+    """).fetchall()
+
+def archive_previous(path):
+    """Save market_data_prev to the Parquet archive and drop it. Returns the archived day."""
+    if archive_market_data is None:
+        print("⚠️  pyarrow not installed: keeping market_data_prev until the next rollover")
+        return None
+    day, rows = archive_market_data(path, table_name=PREV_TABLE)
+    if day is not None:
+        print(f"📦 Archived {rows} market_data rows for {day}")
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute(f"DROP TABLE IF EXISTS {PREV_TABLE}")
+    finally:
+        conn.close()
+    return day
+
+
+class SessionRollover:
+    """Decides which table a market_data writer upserts into and swaps at session change.
+
+    Use from the writer's thread, with the writer's connection:
+
+        rollover = SessionRollover(path, tracker_path, lvc)
+        if rollover.due():           # once per loop; flush pending rows first
+            rollover.begin(conn)
+        upsert_data_batch(conn, rows, rollover.table)
+        if rollover.staging:
+            rollover.switch(conn, rows)   # also refills the cache
+        else:
+            lvc.update(rows)
+    """
+
+    def __init__(self, path, tracker_path, lvc=None):
+        self.path = path
+        self.tracker_path = tracker_path
+        self.lvc = lvc
+        self.session = read_tracker(tracker_path)
+        self.staging = False
+        self.archiver = None
+        conn = sqlite3.connect(path)
+        try:
+            leftover = _has_rows(conn, PREV_TABLE)
+            if lvc is not None:
+                # Whatever the file held, it now mirrors the live table exactly
+                lvc.reset(self.session, _live_rows(conn))
+        finally:
+            conn.close()
+        if leftover:
+            # The last run stopped before its archiver finished
+            self._start_archiver()
+
+    @property
+    def table(self):
+        return NEXT_TABLE if self.staging else LIVE_TABLE
+
+    def due(self):
+        return not self.staging and self.session != session_day()
+
+    def begin(self, conn):
+        """Start the new session in market_data_next; the live table stays as it is."""
+        day = session_day()
+        if self.session is None and not _has_rows(conn, LIVE_TABLE):
+            # Nothing from an earlier session to keep around: write straight to market_data
+            self._adopt(day)
+            if self.lvc is not None:
+                self.lvc.reset(day, [])
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # A leftover from a run that stopped mid-rollover holds only a few rows
+            conn.execute(f"DROP TABLE IF EXISTS {NEXT_TABLE}")
+            create_market_table(conn, NEXT_TABLE, NEXT_INDEX)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self.staging = True
+        print(f"🌅 Session {day} started; building market_data for it alongside {self.session or 'the old table'}")
+
+    def switch(self, conn, rows):
+        """Swap the tables now that the new one has its first `rows`."""
+        if not self.staging or not rows:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if _has_rows(conn, PREV_TABLE):
+                print("⚠️  Dropping an unarchived market_data_prev from an earlier rollover")
+            conn.execute(f"DROP TABLE IF EXISTS {PREV_TABLE}")
+            # Index names stay with their table, so give the live index its usual name back
+            conn.execute(f"DROP INDEX IF EXISTS {LIVE_INDEX}")
+            conn.execute(f"ALTER TABLE {LIVE_TABLE} RENAME TO {PREV_TABLE}")
+            conn.execute(f"ALTER TABLE {NEXT_TABLE} RENAME TO {LIVE_TABLE}")
+            conn.execute(f"DROP INDEX {NEXT_INDEX}")
+            conn.execute(f"CREATE INDEX {LIVE_INDEX} ON {LIVE_TABLE}(timestamp)")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self.staging = False
+        if self.lvc is not None:
+            # The cache mirrors the live table, which now holds only the new session
+            self.lvc.reset(session_day(), rows)
+        previous = self.session
+        self._adopt(session_day())
+        print(f"🔁 market_data switched to session {self.session}; archiving {previous or 'the previous table'}")
+        self._start_archiver()
+
+    def _adopt(self, day):
+        self.session = day
+        write_tracker(self.tracker_path, day)
+
+    def _start_archiver(self):
+        # Off the ingest thread; it only reads market_data_prev and then drops it
+        self.archiver = threading.Thread(target=self._archive, name="market-data-archiver", daemon=True)
+        self.archiver.start()
+
+    def _archive(self):
+        try:
+            archive_previous(self.path)
+        except Exception as e:
+            print(f"⚠️  Archiving the previous session failed: {e}")
+
+    def close(self, timeout=30):
+        """Wait for a running archiver (daemon thread) before the process exits."""
+        if self.archiver is not None:
+            self.archiver.join(timeout)
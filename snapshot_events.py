@@ -0,0 +1,142 @@
+"""Snapshot-ready events published by new_db.py after each committed snapshot.
+
+    python snapshot_events.py                        # print events as they arrive
+    python snapshot_events.py --address tcp://10.0.0.5:4810
+
+One JSON message per fetch_and_snapshot() call, sent over TCP_pipe(mode="pub") on
+SNAPSHOT_EVENTS_ADDRESS:
+
+    {"type": "snapshot", "snapshot_id": 72, "snapshot_time": 1752247260000,
+     "time": "2025-07-11 18:09:00", "keyframe": false, "rows": 123, "source": "market_data.db",
+     "underlyings": {"SENSEX": {"call_oi": ..., "put_oi": ..., "pcr": ...,
+                                "expiries": {"15-07": {<chain_stats columns>}}}},
+     "payload": {"columns": ["trading_symbol", "oi", "oi_day_high"], "rows": [[...], ...]}}
+
+snapshot_time is epoch ms as stored (db_schema.py). "payload" is only present when
+SNAPSHOT_EVENTS_PAYLOAD=1 and holds the rows stored for the snapshot; with delta
+storage apply them over the previous state, starting over at a keyframe. ZMQ PUB
+drops messages for slow or absent subscribers, so treat events as a wake-up signal
+and fall back to snapshot_queries for anything missed (compare snapshot_id).
+"""
+import argparse
+import json
+import os
+
+import zmq
+
+from db_schema import epoch_ms_to_str
+from tcp_pipe import TCP_pipe
+
+# Empty disables publishing
+EVENTS_ADDRESS = os.environ.get("SNAPSHOT_EVENTS_ADDRESS", "tcp://127.0.0.1:4810")
+INCLUDE_PAYLOAD = os.environ.get("SNAPSHOT_EVENTS_PAYLOAD", "") == "1"
+
+_CHAIN_COLUMNS = (
+    "call_oi", "put_oi", "pcr", "max_call_oi_strike", "max_put_oi_strike", "max_pain_strike",
+    "call_oi_change", "put_oi_change",
+)
+
+
+def build_event(conn, snapshot_id, rows, source=None, payload=INCLUDE_PAYLOAD):
+    """The event for one snapshot, read from `conn` (call before committing so it matches)."""
+    snapshot_time, keyframe = conn.execute(
+        "SELECT snapshot_time, keyframe FROM snapshots WHERE snapshot_id = ?", (snapshot_id,)
+    ).fetchone()
+
+    underlyings = {}
+    for root, expiry, *values in conn.execute(f"""
+        SELECT root, expiry, {', '.join(_CHAIN_COLUMNS)} FROM chain_stats
+        WHERE snapshot_id = ? ORDER BY root, expiry
+    """, (snapshot_id,)):
+        summary = underlyings.setdefault(root, {"call_oi": 0, "put_oi": 0, "expiries": {}})
+        chain = dict(zip(_CHAIN_COLUMNS, values))
+        summary["expiries"][expiry] = chain
+        summary["call_oi"] += chain["call_oi"] or 0
+        summary["put_oi"] += chain["put_oi"] or 0
+    for summary in underlyings.values():
+        summary["pcr"] = summary["put_oi"] / summary["call_oi"] if summary["call_oi"] else None
+
+    event = {
+        "type": "snapshot",
+        "snapshot_id": snapshot_id,
+        "snapshot_time": snapshot_time,
+        "time": epoch_ms_to_str(snapshot_time),
+        "keyframe": bool(keyframe),
+        "rows": rows,
+        "source": source and os.path.basename(source),
+        "underlyings": underlyings,
+    }
+    if payload:
+        event["payload"] = {
+            "columns": ["trading_symbol", "oi", "oi_day_high"],
+            "rows": conn.execute("""
+                SELECT i.trading_symbol, o.oi, o.oi_day_high
+                FROM snapshot_oi o JOIN instruments i ON i.symbol_id = o.symbol_id
+                WHERE o.snapshot_id = ?
+            """, (snapshot_id,)).fetchall(),
+        }
+    return event
+
+def encode(event):
+    return json.dumps(event, separators=(",", ":"))
+
+
+def open_publisher(address=EVENTS_ADDRESS):
+    """A PUB socket for events, or None when publishing is disabled or the address
+    cannot be bound (events are optional; snapshots go on without them)."""
+    if not address:
+        return None
+    try:
+        return TCP_pipe(address, mode="pub")
+    except zmq.ZMQError as e:
+        print(f"⚠️  Snapshot events disabled: cannot bind {address}: {e}")
+        return None
+
+
+class SnapshotEvents:
+    """Subscriber side: yields decoded events from a new_db.py publisher."""
+
+    def __init__(self, address=EVENTS_ADDRESS):
+        # Events are small and rare; the default deep receive queue is not needed
+        self.pipe = TCP_pipe(address, mode="sub", options={"rcvhwm": 1000})
+
+    def next(self, timeout=1000):
+        """The next event, or None if none arrives within `timeout` ms."""
+        if not self.pipe.poll(timeout):
+            return None
+        return json.loads(self.pipe.recv_raw())
+
+    def drain(self):
+        """Every event already queued, oldest first, without waiting."""
+        return [json.loads(raw) for raw in self.pipe.drain(timeout=0)]
+
+    def close(self):
+        self.pipe.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print snapshot-ready events from new_db.py.")
+    parser.add_argument("--address", default=EVENTS_ADDRESS or "tcp://127.0.0.1:4810")
+    args = parser.parse_args()
+
+    events = SnapshotEvents(args.address)
+    print(f"📡 Listening on {args.address}")
+    try:
+        while True:
+            event = events.next()
+            if event is None:
+                continue
+            totals = ", ".join(
+                f"{root} PCR {s['pcr']:.2f}" if s["pcr"] is not None else root
+                for root, s in event["underlyings"].items()
+            )
+            kind = "keyframe" if event["keyframe"] else "delta"
+            print(f"🔔 {event['time']}  #{event['snapshot_id']} {event['rows']} rows ({kind})  {totals}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        events.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from db_schema import (
+    DAY_MS, SCHEMA_VERSION, SESSION_OFFSET_MS, schema_version, session_bounds, session_date, session_start_ms,
+)
+
+# Narrow read queries against the v2 snapshot schema (see db_schema.py). Each one is
+# answered from indexes: instruments(root, expiry), snapshots(snapshot_time),
+# snapshot_oi's (snapshot_id, symbol_id) primary key and its (symbol_id, snapshot_id) index.
+
+# Days are trading sessions, split at db_schema.SESSION_ROLLOVER rather than midnight
+
+CHAIN_STATS_COLUMNS = [
+    "snapshot_time", "call_oi", "put_oi", "pcr", "max_call_oi_strike", "max_put_oi_strike",
+    "max_pain_strike", "call_oi_change", "put_oi_change",
+]
+
+
+def connect_readonly(path, check_same_thread=True):
+    # check_same_thread=False for pooled connections handed from thread to thread
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=check_same_thread)
+    if schema_version(conn) < SCHEMA_VERSION:
+        conn.close()
+        raise RuntimeError(f"{path} uses the v1 layout; run `python migrate_db.py` first.")
+    return conn
+
+def data_version(conn, path):
+    """Changes whenever snapshot rows are written or the file is replaced; use it as a cache key.
+
+    (st_dev, st_ino, newest snapshot_id, its row count): with several sources
+    (new_db.SNAPSHOT_SOURCES) later ones add rows to a snapshot that already exists.
+    """
+    st = os.stat(path)
+    latest, rows = conn.execute("""
+        SELECT s.snapshot_id, (SELECT count(*) FROM snapshot_oi o WHERE o.snapshot_id = s.snapshot_id)
+        FROM snapshots s ORDER BY s.snapshot_id DESC LIMIT 1
+    """).fetchone() or (None, 0)
+    return st.st_dev, st.st_ino, latest, rows
+
+def latest_day_bounds(conn):
+    """[start, end) epoch ms of the newest trading day that has snapshots, or None."""
+    latest = conn.execute("SELECT max(snapshot_time) FROM snapshots").fetchone()[0]
+    if latest is None:
+        return None
+    start = session_start_ms(latest)
+    return start, start + DAY_MS
+
+def day_bounds_for(day):
+    """[start, end) epoch ms of a trading day's session."""
+    return session_bounds(day)
+
+def snapshot_days(conn):
+    """Trading days that have snapshots, oldest first."""
+    rows = conn.execute(
+        "SELECT DISTINCT snapshot_time - (snapshot_time - ?) % ? FROM snapshots ORDER BY 1",
+        (SESSION_OFFSET_MS, DAY_MS),
+    ).fetchall()
+    return [session_date(row[0]) for row in rows]
+
+def load_catalog(conn, day_bounds):
+    """Distinct (symbol, expiry) option chains with at least one snapshot row in the day."""
+    return pd.read_sql_query("""
+        SELECT DISTINCT i.root AS symbol, i.expiry
+        FROM snapshots s
+        JOIN snapshot_oi o ON o.snapshot_id = s.snapshot_id
+        JOIN instruments i ON i.symbol_id = o.symbol_id
+        WHERE s.snapshot_time >= ? AND s.snapshot_time < ?
+          AND i.root IS NOT NULL AND i.expiry IS NOT NULL AND i.strike IS NOT NULL
+    """, conn, params=day_bounds)
+
+def _keyframe_column(conn, alias="s"):
+    # Databases the snapshotter has not upgraded yet have no keyframe column: all keyframes
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(snapshots)")}
+    return f"{alias}.keyframe" if "keyframe" in columns else "1"
+
+def load_chain_slice(conn, symbol, expiry, start_ms, end_ms):
+    """Chain rows with start_ms <= snapshot_time < end_ms, oldest first.
+
+    With delta storage only changed rows are stored; `keyframe` tells ChainMatrix where
+    forward-filling has to restart.
+    """
+    return pd.read_sql_query(f"""
+        SELECT s.snapshot_time, i.trading_symbol, i.strike, i.opt_type AS type, o.oi,
+               {_keyframe_column(conn)} AS keyframe
+        FROM instruments i
+        JOIN snapshot_oi o ON o.symbol_id = i.symbol_id
+        JOIN snapshots s ON s.snapshot_id = o.snapshot_id
+        WHERE i.root = ? AND i.expiry = ? AND i.strike IS NOT NULL AND o.oi IS NOT NULL
+          AND o.snapshot_id IN (
+              SELECT snapshot_id FROM snapshots WHERE snapshot_time >= ? AND snapshot_time < ?
+          )
+        ORDER BY s.snapshot_time
+    """, conn, params=(symbol, expiry, start_ms, end_ms))
+
+def load_chains_slice(conn, start_ms, end_ms):
+    """Like load_chain_slice, but every option chain at once, with root and expiry columns."""
+    return pd.read_sql_query(f"""
+        SELECT s.snapshot_time, i.trading_symbol, i.root, i.expiry, i.strike, i.opt_type AS type, o.oi,
+               {_keyframe_column(conn)} AS keyframe
+        FROM snapshots s
+        JOIN snapshot_oi o ON o.snapshot_id = s.snapshot_id
+        JOIN instruments i ON i.symbol_id = o.symbol_id
+        WHERE s.snapshot_time >= ? AND s.snapshot_time < ?
+          AND i.root IS NOT NULL AND i.expiry IS NOT NULL AND i.strike IS NOT NULL AND o.oi IS NOT NULL
+        ORDER BY s.snapshot_time
+    """, conn, params=(int(start_ms), int(end_ms)))
+
+def snapshot_times(conn, start_ms, end_ms):
+    """snapshot_time of every snapshot with start_ms <= snapshot_time < end_ms, ascending."""
+    rows = conn.execute(
+        "SELECT snapshot_time FROM snapshots WHERE snapshot_time >= ? AND snapshot_time < ? ORDER BY snapshot_time",
+        (int(start_ms), int(end_ms)),
+    ).fetchall()
+    return np.array([row[0] for row in rows], dtype=np.int64)
+
+def keyframe_time(conn, snapshot_time):
+    """Where forward-filling for a state as of snapshot_time starts: the last keyframe at
+    or before it, but never before the start of its trading day."""
+    snapshot_time = int(snapshot_time)  # NumPy integers do not bind as SQLite integers
+    day_start = session_start_ms(snapshot_time)
+    latest = conn.execute(
+        f"SELECT max(snapshot_time) FROM snapshots s WHERE {_keyframe_column(conn)} = 1 AND snapshot_time <= ?",
+        (snapshot_time,),
+    ).fetchone()[0]
+    return max(latest or day_start, day_start)
+
+def load_snapshot_asof(conn, snapshot_time, symbol=None, expiry=None):
+    """Every instrument's state as of snapshot_time, forward-filled from the last keyframe.
+
+    Columns: trading_symbol, root, expiry, strike, type, oi, oi_day_high and as_of, the
+    snapshot_time of the row each value came from. Optionally one chain only.
+    """
+    snapshot_time = int(snapshot_time)
+    chain_filter, params = "", [keyframe_time(conn, snapshot_time), snapshot_time]
+    if symbol is not None:
+        chain_filter += " AND i.root = ?"
+        params.append(symbol)
+    if expiry is not None:
+        chain_filter += " AND i.expiry = ?"
+        params.append(expiry)
+    # SQLite takes the bare columns of a max() aggregate from the row holding the max
+    return pd.read_sql_query(f"""
+        SELECT i.trading_symbol, i.root, i.expiry, i.strike, i.opt_type AS type,
+               o.oi, o.oi_day_high, max(s.snapshot_time) AS as_of
+        FROM snapshots s
+        JOIN snapshot_oi o ON o.snapshot_id = s.snapshot_id
+        JOIN instruments i ON i.symbol_id = o.symbol_id
+        WHERE s.snapshot_time BETWEEN ? AND ?{chain_filter}
+        GROUP BY o.symbol_id
+    """, conn, params=params)
+
+def load_chain_stats(conn, symbol, expiry, start_ms, end_ms):
+    """The chain's per-snapshot analytics (chain_analytics.py), oldest first; empty if not built yet."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chain_stats'").fetchone() is None:
+        return pd.DataFrame(columns=CHAIN_STATS_COLUMNS)
+    return pd.read_sql_query(f"""
+        SELECT s.snapshot_time, {', '.join('c.' + c for c in CHAIN_STATS_COLUMNS[1:])}
+        FROM chain_stats c
+        JOIN snapshots s ON s.snapshot_id = c.snapshot_id
+        WHERE c.root = ? AND c.expiry = ? AND s.snapshot_time >= ? AND s.snapshot_time < ?
+        ORDER BY s.snapshot_time
+    """, conn, params=(symbol, expiry, start_ms, end_ms))
@@ -0,0 +1,188 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+
+from oi_matrix import BUCKET_MS, ChainMatrix
+from snapshot_queries import (
+    connect_readonly, data_version, load_catalog, load_chain_slice, load_chain_stats,
+)
+from stage_timer import StageTimer
+
+# One store per dashboard process, shared by every browser session (main.py keeps it in
+# st.cache_resource). Each chain's day is read from SQLite and pivoted once; a new
+# snapshot is folded in once, from its own rows, by whichever session asks first, and
+# every session is handed the same read-only ChainMatrix. Reads go through a small pool
+# of read-only connections; new_db.py keeps snapshot_data.db in WAL mode, so they never
+# wait for a snapshot commit and never delay one.
+
+# Read-only connections shared by all sessions
+READERS = int(os.environ.get("SNAPSHOT_READERS", "4"))
+# Chains (one trading day of one root/expiry) kept in memory, least recently used first out
+MAX_CHAINS = int(os.environ.get("SNAPSHOT_STORE_CHAINS", "64"))
+
+
+def _file_identity(path):
+    st = os.stat(path)
+    return st.st_dev, st.st_ino
+
+
+class ReadOnlyPool:
+    """Up to `size` read-only connections to one database, one thread at a time each.
+
+    Connections to a file that has since been replaced (migrate_db.py) are closed
+    instead of being handed out again.
+    """
+
+    def __init__(self, path, size=READERS):
+        self.path = path
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._identity = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, timeout=30):
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No free connection to {self.path} after {timeout}s")
+        try:
+            identity = _file_identity(self.path)
+            with self._lock:
+                if identity != self._identity:
+                    stale, self._idle = self._idle, []
+                    self._identity = identity
+                else:
+                    stale = []
+                conn = self._idle.pop() if self._idle else None
+            for old in stale:
+                old.close()
+            if conn is None:
+                conn = connect_readonly(self.path, check_same_thread=False)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                reuse = identity == self._identity
+                if reuse:
+                    self._idle.append(conn)
+            if not reuse:
+                conn.close()
+            self._slots.release()
+
+
+def _freeze(matrix):
+    # Shared by every session: nobody may write into it (ChainMatrix.extend copies)
+    for array in (matrix.times, matrix.symbols, matrix.strikes, matrix.types, matrix.oi, matrix.keyframes):
+        array.flags.writeable = False
+    return matrix
+
+def _compact(df, columns):
+    # Few distinct strings repeated on every row: store them as categoricals
+    return df.astype({column: "category" for column in columns})
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.value = None
+
+
+class SnapshotStore:
+    """Chain matrices, chain analytics and catalogs of snapshot_data.db for all sessions.
+
+    chain() and catalog() bring an entry up to the database's latest snapshot: a
+    replaced file is read again from scratch, otherwise only snapshots newer than the
+    entry are read. Concurrent callers for the same entry wait for one load instead
+    of each doing their own. Returned objects are shared; treat them as read-only.
+    """
+
+    def __init__(self, path, readers=READERS, max_chains=MAX_CHAINS):
+        self.path = path
+        self.pool = ReadOnlyPool(path, readers)
+        self.max_chains = max_chains
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            self._entries.move_to_end(key)
+            chains = [k for k in self._entries if k[0] == "chain"]
+            for stale in chains[:-self.max_chains]:
+                del self._entries[stale]
+            return entry
+
+    def chain(self, day_bounds, symbol, expiry, timings=None):
+        """(ChainMatrix, chain_stats frame) of one chain over a day.
+
+        `timings` (a stage_timer.StageTimer) gets the time spent reading rows, pivoting
+        them and reading the analytics.
+        """
+        timings = timings or StageTimer()
+        entry = self._entry(("chain", day_bounds, symbol, expiry))
+        with entry.lock, self.pool.connection() as conn:
+            version = data_version(conn, self.path)
+            if entry.version is None or entry.version[:2] != version[:2]:
+                since = day_bounds[0]
+                matrix, stats = None, None
+            elif entry.version[2:] != version[2:]:
+                matrix, stats = entry.value
+                if matrix.last_snapshot_time is None:
+                    since = day_bounds[0]
+                else:
+                    # Another source may have added rows to the newest snapshot since: read
+                    # its bucket again and replace it
+                    since = matrix.last_snapshot_time - matrix.last_snapshot_time % BUCKET_MS
+                    matrix = matrix.truncate(since)
+            else:
+                return entry.value
+
+            with timings.stage("chain_query"):
+                rows = load_chain_slice(conn, symbol, expiry, since, day_bounds[1])
+            with timings.stage("chain_pivot"):
+                matrix = ChainMatrix.from_frame(rows) if matrix is None else matrix.extend(rows)
+            with timings.stage("chain_stats"):
+                if stats is None:
+                    stats = load_chain_stats(conn, symbol, expiry, *day_bounds)
+                else:
+                    # The newest snapshot's stats are rewritten when another source adds to it
+                    newest = int(stats['snapshot_time'].iloc[-1]) if len(stats) else day_bounds[0]
+                    new_stats = load_chain_stats(conn, symbol, expiry, newest, day_bounds[1])
+                    stats = stats[stats['snapshot_time'] < newest]
+                    if not new_stats.empty:
+                        stats = new_stats if stats.empty else pd.concat([stats, new_stats], ignore_index=True)
+            # Replaced, never modified: sessions still drawing the previous one keep it intact
+            entry.value = (_freeze(matrix), stats)
+            entry.version = version
+            return entry.value
+
+    def catalog(self, day_bounds):
+        """Distinct (symbol, expiry) chains with rows in the day (snapshot_queries.load_catalog)."""
+        entry = self._entry(("catalog", day_bounds))
+        with entry.lock, self.pool.connection() as conn:
+            version = data_version(conn, self.path)
+            if entry.version == version:
+                return entry.value[0]
+            newest = conn.execute(
+                "SELECT max(snapshot_time) FROM snapshots WHERE snapshot_time >= ? AND snapshot_time < ?", day_bounds
+            ).fetchone()[0]
+            if entry.version is None or entry.version[:2] != version[:2] or entry.value[1] is None:
+                catalog = load_catalog(conn, day_bounds)
+            else:
+                catalog, loaded_until = entry.value
+                # From the newest snapshot on, which may have gained rows from another source
+                new = load_catalog(conn, (loaded_until, day_bounds[1]))
+                if not new.empty:
+                    catalog = pd.concat([catalog.astype(object), new]).drop_duplicates(ignore_index=True)
+            entry.value = (_compact(catalog, ["symbol", "expiry"]), newest)
+            entry.version = version
+            return entry.value[0]
@@ -0,0 +1,94 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+from contextlib import contextmanager
+
+# Named wall-clock timers for the stages of one dashboard rerun or one snapshot cycle,
+# with an optional cProfile capture of everything that runs inside them:
+#
+#     timings = StageTimer(profile=PROFILE_STAGES)
+#     with timings.stage("query"):
+#         ...
+#     timings.as_dict()           # {"query": 12.31, ...} in ms, in the order stages ran
+#     timings.profile_report()    # pstats text, or None without profiling
+#
+# Stages may nest; a nested stage is also counted in its parent, and only top-level
+# stages add up to total_ms. A stage that runs more than once accumulates.
+
+# STAGE_PROFILE=1 turns on cProfile for the snapshotter and, by default, the dashboard
+PROFILE_STAGES = os.environ.get("STAGE_PROFILE", "") == "1"
+# Append one JSON line per snapshot cycle here (new_db.py); empty: stdout only
+TIMINGS_LOG = os.environ.get("STAGE_TIMINGS_LOG", "")
+
+
+class StageTimer:
+    """Milliseconds spent per named stage, optionally profiled with cProfile."""
+
+    def __init__(self, profile=False):
+        self.stages = {}   # name -> ms
+        self.depths = {}   # name -> nesting depth of its first run
+        self.profiler = cProfile.Profile() if profile else None
+        self._depth = 0
+        self._profiling = False
+
+    @contextmanager
+    def stage(self, name):
+        outermost = self._depth == 0
+        if outermost and self.profiler is not None:
+            try:
+                self.profiler.enable()
+                self._profiling = True
+            except ValueError:
+                # Another profiler is active in this thread (Python 3.12+); time only
+                pass
+        self.depths.setdefault(name, self._depth)
+        self.stages.setdefault(name, 0.0)
+        self._depth += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self._depth -= 1
+            self.stages[name] += elapsed
+            if outermost and self._profiling:
+                self.profiler.disable()
+                self._profiling = False
+
+    @property
+    def total_ms(self):
+        return sum(ms for name, ms in self.stages.items() if self.depths[name] == 0)
+
+    def as_dict(self):
+        return {name: round(ms, 2) for name, ms in self.stages.items()}
+
+    def rows(self):
+        """(name, depth, ms) per stage, in the order the stages first ran."""
+        return [(name, self.depths[name], ms) for name, ms in self.stages.items()]
+
+    def profile_report(self, limit=25, sort="cumulative"):
+        """The top `limit` functions of the profiled stages, or None without profiling."""
+        if self.profiler is None:
+            return None
+        out = io.StringIO()
+        try:
+            pstats.Stats(self.profiler, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        except TypeError:
+            # Nothing was profiled (pstats has no data to load)
+            return None
+        return out.getvalue()
+
+    def record(self, **fields):
+        """One structured line (JSON) with `fields`, the stages and their total."""
+        return json.dumps({**fields, "stages_ms": self.as_dict(), "total_ms": round(self.total_ms, 2)},
+                          separators=(",", ":"), default=str)
+
+
+def log_record(line, path=TIMINGS_LOG):
+    """Append a record() line to the timings log, if one is configured."""
+    if path:
+        with open(path, "a") as f:
+            f.write(line + "\n")
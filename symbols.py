@@ -0,0 +1,59 @@
+import re
+
+import pandas as pd
+
+# Trading symbol formats, matched as one anchored pattern. The option type is taken
+# from the suffix only, so roots that happen to contain 'CE'/'PE' parse correctly.
+#
+#   weekly:  SENSEX2580588500CE  → ROOT + YY + M + DD + STRIKE + CE/PE  (M: 1-9, O, N, D)
+#   monthly: BANKEX25AUG65500PE  → ROOT + DD + MMM + STRIKE + CE/PE
+#   future:  CRUDEOILM25JULFUT   → ROOT + DD + MMM + FUT
+SYMBOL_PATTERN = (
+    r'^(?:'
+    r'(?P<w_root>[A-Z]+)(?P<w_year>\d{2})(?P<w_month>[1-9OND])(?P<w_day>\d{2})(?P<w_strike>\d+)(?P<w_type>CE|PE)'
+    r'|'
+    r'(?P<m_root>[A-Z][A-Z0-9]*?)(?P<m_day>\d{2})(?P<m_month>[A-Z]{3})'
+    r'(?:(?P<m_strike>\d+)(?P<m_type>CE|PE)|(?P<f_type>FUT))'
+    r')$'
+)
+_SYMBOL_RE = re.compile(SYMBOL_PATTERN)
+
+_WEEKLY_MONTHS = {str(m): f"{m:02d}" for m in range(1, 10)}
+_WEEKLY_MONTHS.update({'O': '10', 'N': '11', 'D': '12'})
+
+PART_COLUMNS = ['symbol', 'expiry', 'strike', 'type']
+
+
+# Extract symbol, expiry, strike, type
+def extract_parts(symbol):
+    m = _SYMBOL_RE.match(symbol)
+    if m is None:
+        opt_type = symbol[-2:] if symbol.endswith(('CE', 'PE')) else 'FUT'
+        return None, None, None, opt_type
+
+    if m['w_root']:
+        expiry = f"{m['w_day']}-{_WEEKLY_MONTHS[m['w_month']]}"  # Format: DD-MM
+        return m['w_root'], expiry, int(m['w_strike']), m['w_type']
+
+    expiry = f"{m['m_day']}-{m['m_month'].title()}"              # Format: DD-Mon
+    if m['f_type']:
+        return m['m_root'], expiry, None, 'FUT'
+    return m['m_root'], expiry, int(m['m_strike']), m['m_type']
+
+
+def parse_symbols(trading_symbols):
+    """Vectorized extract_parts: Series of trading symbols -> DataFrame[symbol, expiry, strike, type]."""
+    s = pd.Series(trading_symbols, dtype=object)
+    m = s.str.extract(SYMBOL_PATTERN)
+    weekly = m['w_root'].notna()
+
+    weekly_expiry = m['w_day'] + '-' + m['w_month'].map(_WEEKLY_MONTHS)
+    monthly_expiry = m['m_day'] + '-' + m['m_month'].str.title()
+
+    fallback_type = s.str[-2:].where(s.str.endswith(('CE', 'PE')), 'FUT')
+    return pd.DataFrame({
+        'symbol': m['w_root'].where(weekly, m['m_root']),
+        'expiry': weekly_expiry.where(weekly, monthly_expiry),
+        'strike': pd.to_numeric(m['w_strike'].where(weekly, m['m_strike'])),
+        'type': m['w_type'].fillna(m['m_type']).fillna(m['f_type']).fillna(fallback_type),
+    }, index=s.index)
@@ -0,0 +1,113 @@
+import time
+
+import zmq
+
+# Default tick feed; override per process where a different endpoint is needed
+FEED_ADDRESS = "tcp://192.168.1.40:4801"
+
+# Socket options settable by name from config (TICK_SOCKET_OPTIONS, ingest_feeds.json)
+SOCKET_OPTIONS = {
+    "rcvhwm": zmq.RCVHWM,
+    "sndhwm": zmq.SNDHWM,
+    "rcvbuf": zmq.RCVBUF,
+    "sndbuf": zmq.SNDBUF,
+    "linger": zmq.LINGER,
+    "tcp_keepalive": zmq.TCP_KEEPALIVE,
+    "tcp_keepalive_idle": zmq.TCP_KEEPALIVE_IDLE,
+    "tcp_keepalive_intvl": zmq.TCP_KEEPALIVE_INTVL,
+    "tcp_keepalive_cnt": zmq.TCP_KEEPALIVE_CNT,
+}
+# A market-open burst must not overflow ZMQ's default 1000-message queue, and a
+# silently dead TCP connection should be noticed within about a minute
+DEFAULT_SUB_OPTIONS = {
+    "rcvhwm": 100000,
+    "tcp_keepalive": 1,
+    "tcp_keepalive_idle": 30,
+    "tcp_keepalive_intvl": 10,
+    "tcp_keepalive_cnt": 3,
+}
+
+# drain() budget per call: stop after this many messages, bytes or seconds
+DRAIN_MAX_MESSAGES = 2000
+DRAIN_MAX_BYTES = 16 * 1024 * 1024
+DRAIN_MAX_SECONDS = 0.05
+
+
+def split_message(raw):
+    """Raw feed message -> list of tick JSON lines (bytes)."""
+    return raw.strip().split(b"\n")
+
+
+# Wrapper for ZeroMQ TCP communication
+class TCP_pipe:
+    def __init__(self, address=FEED_ADDRESS, mode="sub", options=None):
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB if mode == "sub" else zmq.PUB)
+        # Options must be set before connect/bind to apply to the connection
+        settings = dict(DEFAULT_SUB_OPTIONS) if mode == "sub" else {}
+        settings.update(options or {})
+        for name, value in settings.items():
+            if name not in SOCKET_OPTIONS:
+                raise ValueError(f"Unknown socket option '{name}' (have: {', '.join(SOCKET_OPTIONS)})")
+            self.socket.setsockopt(SOCKET_OPTIONS[name], int(value))
+
+        try:
+            if mode == "sub":
+                self.socket.connect(address)
+                self.socket.setsockopt_string(zmq.SUBSCRIBE, "")
+            elif mode == "pub":
+                self.socket.bind(address)
+        except zmq.ZMQError:
+            # e.g. the address is already in use: do not leak the socket and context
+            self.close()
+            raise
+
+        # One poller for the socket's lifetime
+        self._poller = zmq.Poller()
+        self._poller.register(self.socket, zmq.POLLIN)
+
+    def send(self, message):
+        self.socket.send_string(message)
+
+    def send_raw(self, data):
+        self.socket.send(data)
+
+    def poll(self, timeout=1000):
+        return bool(self._poller.poll(timeout))
+
+    def recv_raw(self):
+        """The next message as received (bytes)."""
+        return self.socket.recv()
+
+    def recv(self):
+        return [line.decode() for line in split_message(self.recv_raw())]
+
+    def drain(self, timeout=100, max_messages=DRAIN_MAX_MESSAGES, max_bytes=DRAIN_MAX_BYTES,
+              max_seconds=DRAIN_MAX_SECONDS):
+        """Wait up to `timeout` ms for a message, then take everything already queued.
+
+        Returns a list of raw messages (bytes), empty on timeout. Reading stops early
+        once the message, byte or time budget is used up, so callers stay responsive
+        during a burst; the rest is picked up by the next call.
+        """
+        if not self._poller.poll(timeout):
+            return []
+        socket = self.socket
+        first = socket.recv()
+        messages = [first]
+        size = len(first)
+        deadline = time.perf_counter() + max_seconds
+        while len(messages) < max_messages and size < max_bytes:
+            try:
+                raw = socket.recv(zmq.NOBLOCK)
+            except zmq.Again:
+                break
+            messages.append(raw)
+            size += len(raw)
+            if time.perf_counter() >= deadline:
+                break
+        return messages
+
+    def close(self):
+        self.socket.close()
+        self.context.term()
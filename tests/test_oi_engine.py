@@ -0,0 +1,79 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from oi_engine import OIChange
+from oi_matrix import BUCKET_MS, ChainMatrix
+
+DAY = 1752192000000  # 2025-07-11 00:00 (wall clock as UTC, see db_schema.py)
+
+
+def _rows(root, expiry, bucket_oi, keyframes):
+    # bucket_oi: {bucket index: {strike: (ce_oi, pe_oi)}}
+    rows = []
+    for bucket, strikes in bucket_oi.items():
+        for strike, pair in strikes.items():
+            for opt_type, oi in zip(("CE", "PE"), pair):
+                rows.append({
+                    "snapshot_time": DAY + bucket * BUCKET_MS + 1000,
+                    "trading_symbol": f"{root}{expiry}{strike}{opt_type}",
+                    "root": root, "expiry": expiry, "strike": strike, "type": opt_type,
+                    "oi": oi, "keyframe": bucket in keyframes,
+                })
+    return rows
+
+
+def _frame():
+    # NIFTY keeps trading to bucket 5; SENSEX's last snapshot is bucket 2. Delta storage:
+    # keyframes at 0 and 4, in between only changed rows.
+    nifty = _rows("NIFTY", "17-07", {
+        0: {25000: (100, 200), 25100: (300, 400)},
+        1: {25000: (150, 200)},
+        3: {25100: (350, 380)},
+        4: {25000: (160, 210), 25100: (350, 380)},
+        5: {25000: (170, 210)},
+    }, keyframes={0, 4})
+    sensex = _rows("SENSEX", "15-07", {
+        0: {82000: (1000, 2000), 82100: (500, 600)},
+        2: {82000: (1200, 2100)},
+    }, keyframes={0, 4})
+    return pd.DataFrame(nifty + sensex).sort_values("snapshot_time", ignore_index=True)
+
+
+def _expected(df, root, expiry, t1, t2):
+    matrix = ChainMatrix.from_frame(df[(df.root == root) & (df.expiry == expiry)])
+    i1, i2 = matrix.nearest_index(t1), matrix.nearest_index(t2, find_min=False)
+    strikes, types, t1_oi, t2_oi = matrix.compare(i1, i2)
+    order = np.lexsort((types, strikes))
+    return matrix.times[i1], matrix.times[i2], [np.asarray(a)[order] for a in (strikes, types, t1_oi, t2_oi)]
+
+
+def test_chains_are_compared_at_their_own_last_snapshot():
+    df = _frame()
+    t1, t2 = DAY, DAY + 5 * BUCKET_MS
+    change = OIChange.from_frame(df, t1, t2)
+
+    for root, expiry in (("NIFTY", "17-07"), ("SENSEX", "15-07")):
+        b1, b2, expected = _expected(df, root, expiry, t1, t2)
+        row = change.summary[(change.summary.root == root) & (change.summary.expiry == expiry)].iloc[0]
+        assert (row.t1, row.t2) == (b1, b2)
+        got = change.chain(root, expiry)
+        order = np.lexsort((got[1], got[0]))
+        for want, have in zip(expected, got):
+            assert np.array_equal(want, np.asarray(have)[order])
+
+    sensex = change.summary.set_index("root").loc["SENSEX"]
+    assert sensex.t2 == DAY + 2 * BUCKET_MS
+    # Carried forward from SENSEX's own snapshots, not read as 0 at NIFTY's last bucket
+    assert sensex.call_oi_t2 == 1200 + 500
+    assert sensex.call_oi_change == 200
+
+
+def test_chain_without_a_bucket_in_range_is_left_out():
+    change = OIChange.from_frame(_frame(), DAY + 3 * BUCKET_MS, DAY + 5 * BUCKET_MS)
+    assert list(change.summary.root) == ["NIFTY"]
+    assert set(change.strikes.root) == {"NIFTY"}
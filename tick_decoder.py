@@ -0,0 +1,161 @@
+import json
+
+from db_schema import now_epoch_ms, to_epoch_ms
+
+# Optional fast JSON backends, picked in this order when available
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _available_backends():
+    backends = {}
+    if orjson is not None:
+        backends["orjson"] = orjson.loads
+    if msgspec is not None:
+        backends["msgspec"] = msgspec.json.Decoder().decode
+    backends["json"] = json.loads
+    return backends
+
+BACKENDS = _available_backends()
+DEFAULT_BACKEND = next(iter(BACKENDS))
+
+_EMPTY_LEVEL = {}
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _best_level(depth):
+    # First depth level, or an empty dict when the side is missing/empty
+    if depth and type(depth) is list:
+        level = depth[0]
+        if type(level) is dict:
+            return level
+    return _EMPTY_LEVEL
+
+
+class TickDecoder:
+    """Decodes a ZMQ message (list of JSON lines) into market_data rows.
+
+    Timestamps come out as epoch ms (schema v2); the tick's own time text is used
+    when present, otherwise one local 'now' per message.
+    """
+
+    def __init__(self, backend=None):
+        backend = backend or DEFAULT_BACKEND
+        if backend not in BACKENDS:
+            raise ValueError(f"JSON backend '{backend}' is not available (have: {', '.join(BACKENDS)})")
+        self.backend = backend
+        self.loads = BACKENDS[backend]
+
+    def decode(self, lines):
+        """Return (rows, errors) where errors is a list of (line, exception).
+
+        Lines may be str or bytes.
+        """
+        loads = self.loads
+        errors = []
+
+        # Decode the whole message in one call; fall back to per-line on a bad line
+        try:
+            sep, open_, close = (b",", b"[", b"]") if lines and type(lines[0]) is bytes else (",", "[", "]")
+            items = loads(open_ + sep.join(lines) + close)
+            pairs = zip(lines, items)
+        except Exception:
+            pairs = None
+
+        if pairs is None:
+            decoded = []
+            for line in lines:
+                try:
+                    decoded.append((line, loads(line)))
+                except Exception as e:
+                    errors.append((line, e))
+            pairs = decoded
+
+        return self._rows(pairs, errors), errors
+
+    def decode_message(self, raw):
+        """decode() straight from a raw feed message (newline-separated JSON bytes).
+
+        Returns (rows, errors, line_count). The message is only split into lines when
+        it fails to parse as a whole.
+        """
+        body = raw.strip()
+        line_count = body.count(b"\n") + 1 if body else 0
+        try:
+            items = self.loads(b"[" + body.replace(b"\n", b",") + b"]")
+        except Exception:
+            rows, errors = self.decode(body.split(b"\n") if body else [])
+            return rows, errors, line_count
+        errors = []
+        # No per-line text here; a bad tick is reported by its decoded value
+        return self._rows(zip(items, items), errors), errors, line_count
+
+    def _rows(self, pairs, errors):
+        rows = []
+        append = rows.append
+        now_ms = None
+
+        for line, data in pairs:
+            try:
+                get = data.get
+                ltt = get("last_trade_time")
+                exc_ts = get("exchange_timestamp")
+                ltt = to_epoch_ms(ltt) if ltt else None
+                exc_ts = to_epoch_ms(exc_ts) if exc_ts else None
+                if ltt is None or exc_ts is None:
+                    if now_ms is None:
+                        now_ms = now_epoch_ms()
+                    ltt = ltt or now_ms
+                    exc_ts = exc_ts or now_ms
+
+                bid = _best_level(get("bid_depth"))
+                ask = _best_level(get("ask_depth"))
+
+                ltp = get("last_price")
+                bid_price = bid.get("price")
+                bid_qty = bid.get("quantity")
+                ask_price = ask.get("price")
+                ask_qty = ask.get("quantity")
+                volume = get("volume")
+                oi = get("oi")
+                oi_high = get("oi_day_high")
+                oi_low = get("oi_day_low")
+
+                append((
+                    ltt,
+                    exc_ts,
+                    int(data["exchange_token"]),
+                    int(data["instrument_token"]),
+                    get("trading_symbol"),
+                    ltp if ltp is None or type(ltp) is float else _to_float(ltp),
+                    bid_price if bid_price is None or type(bid_price) is float else _to_float(bid_price),
+                    bid_qty if bid_qty is None or type(bid_qty) is int else _to_int(bid_qty),
+                    ask_price if ask_price is None or type(ask_price) is float else _to_float(ask_price),
+                    ask_qty if ask_qty is None or type(ask_qty) is int else _to_int(ask_qty),
+                    volume if volume is None or type(volume) is float else _to_float(volume),
+                    oi if oi is None or type(oi) is int else _to_int(oi),
+                    oi_high if oi_high is None or type(oi_high) is int else _to_int(oi_high),
+                    oi_low if oi_low is None or type(oi_low) is int else _to_int(oi_low),
+                ))
+            except Exception as e:
+                errors.append((line, e))
+
+        return rows